@@ -1,5 +1,8 @@
 """Action that can be undone."""
 
+from enum import Enum
+
+from rich.style import Style
 from textual.geometry import Offset, Region
 
 from textual_paint.ansi_art_document import AnsiArtDocument, Selection
@@ -12,8 +15,9 @@ class Action:
     In either case, the action stores image data in sub_image_before.
     The image data from _after_ the action is not stored, because the Action exists only for undoing.
 
-    TODO: In the future it would be more efficient to use a mask for the region update,
-    to store only modified pixels, and use RLE compression on the mask and image data.
+    TODO: In the future it would be more efficient to store only the modified pixels
+    (`mask` limits which pixels are restored, but the whole region is stored),
+    and use RLE compression on the mask and image data.
 
     NOTE: Not to be confused with Textual's `class Action(Event)`, or the type of law suit.
     Indeed, Textual's actions are used significantly in this application, with action_* methods,
@@ -38,6 +42,12 @@ class Action:
         self.sub_image_before: AnsiArtDocument|None = None
         """The image data from the region of the document before modification."""
 
+        self.mask: list[list[bool]]|None = None
+        """Which cells within the region were modified, if not all of them. Coordinates are relative to the region.
+
+        Only these cells are restored when undoing, e.g. for the Fill With Color tool.
+        """
+
         self.cursor_position_before: Offset|None = None
         """The cursor position before the action was performed. (This may be generalized into a Selection state in the future to hold textbox contents.)"""
 
@@ -60,9 +70,189 @@ class Action:
         if self.is_full_update:
             target_document.copy(self.sub_image_before)
         else:
-            target_document.copy_region(self.sub_image_before, target_region=self.region)
+            target_document.copy_region(self.sub_image_before, target_region=self.region, mask=self.mask)
+        self.restore_cursor(target_document)
+
+    def restore_cursor(self, target_document: AnsiArtDocument) -> None:
+        """Restores the text cursor, if there was one before the action."""
         if self.cursor_position_before:
             target_document.selection = Selection(Region.from_offset(self.cursor_position_before, (1, 1)))
             target_document.selection.textbox_mode = True
             target_document.selection.cursor_mode = True
             target_document.selection.copy_from_document(target_document)
+
+    def inverse(self, document: AnsiArtDocument, name: str) -> 'Action':
+        """Returns an action that reverts undoing this action, capturing the current state of the document.
+
+        This is used to create redo actions from undo actions, and vice versa.
+        """
+        region = Region(0, 0, document.width, document.height) if self.is_full_update else self.region
+        action = Action(name, region)
+        action.is_full_update = self.is_full_update
+        action.mask = self.mask
+        action.update(document)
+        return action
+
+
+class Transform(Enum):
+    """An exactly invertible operation on the whole document, or a region for `invert`."""
+    flip_horizontal = 1
+    flip_vertical = 2
+    rotate = 3
+    invert = 4
+
+
+class TransformAction(Action):
+    """An action for an exactly invertible transform, like flipping, rotating, or inverting colors.
+
+    Rather than storing image data, it records the operation, and undoes it by applying the inverse operation,
+    so it takes constant memory in the undo history.
+    """
+
+    def __init__(self, name: str, transform: Transform, region: Region, angle: int = 0) -> None:
+        """Initialize the action for a transform.
+
+        `angle` is the clockwise rotation for `Transform.rotate`, and `region` the affected region for `Transform.invert`.
+        """
+        super().__init__(name, region)
+        self.transform = transform
+        """The operation that was performed."""
+        self.angle = angle
+        """The clockwise rotation in degrees, for `Transform.rotate`."""
+        self.is_full_update = transform != Transform.invert
+
+    def apply(self, document: AnsiArtDocument) -> None:
+        """Perform the transform on the document."""
+        assert self.region is not None
+        if self.transform == Transform.flip_horizontal:
+            document.flip_horizontal()
+        elif self.transform == Transform.flip_vertical:
+            document.flip_vertical()
+        elif self.transform == Transform.rotate:
+            document.rotate(self.angle)
+        elif self.transform == Transform.invert:
+            document.invert_region(self.region)
+
+    def inverted(self, name: str) -> 'TransformAction':
+        """Returns the action for the inverse transform."""
+        assert self.region is not None
+        angle = (360 - self.angle) % 360
+        region = self.region
+        if self.transform == Transform.rotate and angle != 180:
+            region = Region(region.x, region.y, region.height, region.width)
+        return TransformAction(name, self.transform, region, angle)
+
+    def update(self, document: AnsiArtDocument) -> None:
+        """No image data is needed to undo a transform."""
+
+    def undo(self, target_document: AnsiArtDocument) -> None:
+        """Undo this action by applying the inverse transform. Note that a canvas refresh is not performed here."""
+        self.inverted(self.name).apply(target_document)
+        self.restore_cursor(target_document)
+
+    def inverse(self, document: AnsiArtDocument, name: str) -> 'TransformAction':
+        """Returns an action that reverts undoing this action."""
+        return self.inverted(name)
+
+
+class CompoundAction(Action):
+    """An action made up of sub-actions, each storing only the region it modifies.
+
+    This is used for selections, where cutting out the selection and later melding it into the document
+    (possibly somewhere else, or stamping it several times with Ctrl+drag) are undone together,
+    without storing the whole document.
+    """
+
+    def __init__(self, name: str, sub_actions: list[Action]|None = None) -> None:
+        """Initialize the action, optionally with sub-actions that have already captured their regions."""
+        super().__init__(name)
+        self.sub_actions: list[Action] = []
+        """The parts of the action, in the order they were performed."""
+        for sub_action in sub_actions or []:
+            self.add_sub_action(sub_action)
+
+    def add_sub_action(self, sub_action: Action) -> None:
+        """Add a part of the action, which should have already captured its region of the document."""
+        assert sub_action.region is not None, "sub-action must have a region"
+        self.sub_actions.append(sub_action)
+        self.region = self.region.union(sub_action.region) if self.region else sub_action.region
+
+    def add_region(self, document: AnsiArtDocument, region: Region, mask: list[list[bool]]|None = None) -> None:
+        """Capture a region of the document before it's modified, as part of this action.
+
+        If a mask is given, relative to the region, only those cells are restored when undoing,
+        and the region must be within the document.
+        """
+        if mask is None:
+            region = region.intersection(Region(0, 0, document.width, document.height))
+        if not region.area:
+            return
+        sub_action = Action(self.name, region)
+        sub_action.mask = mask
+        sub_action.update(document)
+        self.add_sub_action(sub_action)
+
+    def update(self, document: AnsiArtDocument) -> None:
+        """Image data is captured by the sub-actions, with `add_region`."""
+
+    def undo(self, target_document: AnsiArtDocument) -> None:
+        """Undo the sub-actions in reverse order. Note that a canvas refresh is not performed here."""
+        for sub_action in reversed(self.sub_actions):
+            sub_action.undo(target_document)
+        self.restore_cursor(target_document)
+
+    def inverse(self, document: AnsiArtDocument, name: str) -> 'CompoundAction':
+        """Returns an action that reverts undoing this action, capturing the current state of each sub-action's region."""
+        return CompoundAction(name, [sub_action.inverse(document, name) for sub_action in self.sub_actions])
+
+
+class RubberBand:
+    """A shape being dragged out, drawn onto the document until it's committed as a single Action.
+
+    As the shape is redrawn, only the cells it covered are restored, from `cells_before`,
+    rather than undoing an Action covering its whole bounding box, and then recording a new one from a copy of the document.
+    """
+
+    def __init__(self, name: str) -> None:
+        """Initialize the rubber band, for the tool with the given name."""
+
+        self.name = name
+        """The name of the tool, for the Action."""
+
+        self.cells_before: dict[tuple[int, int], tuple[str, Style]] = {}
+        """The original contents of the cells covered by the shape, by coordinates."""
+
+        self.region: Region|None = None
+        """The region of the document covered by the shape, as currently drawn."""
+
+    def save_span(self, document: AnsiArtDocument, y: int, x_start: int, x_end: int) -> None:
+        """Remember the contents of a span of cells, which must be within the document, before it's drawn over."""
+        cells_before = self.cells_before
+        ch_row = document.ch[y]
+        st_row = document.st[y]
+        for x in range(x_start, x_end):
+            if (x, y) not in cells_before:
+                cells_before[x, y] = (ch_row[x], st_row[x])
+
+    def restore(self, document: AnsiArtDocument) -> Region|None:
+        """Erase the shape, restoring the cells it covered. Returns the region that it covered."""
+        for (x, y), (ch, st) in self.cells_before.items():
+            document.ch[y][x] = ch
+            document.st[y][x] = st
+        self.cells_before = {}
+        region = self.region
+        self.region = None
+        return region
+
+    def commit(self, document: AnsiArtDocument) -> Action|None:
+        """Create an Action for undoing the shape as currently drawn, or None if nothing was drawn."""
+        if not self.region or not self.cells_before:
+            return None
+        region = self.region.intersection(Region(0, 0, document.width, document.height))
+        action = Action(self.name, region)
+        action.update(document)
+        assert action.sub_image_before is not None
+        for (x, y), (ch, st) in self.cells_before.items():
+            action.sub_image_before.ch[y - region.y][x - region.x] = ch
+            action.sub_image_before.st[y - region.y][x - region.x] = st
+        return action
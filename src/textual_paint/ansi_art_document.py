@@ -1,20 +1,23 @@
 """Provides the AnsiArtDocument and Selection classes (and exceptions.)"""
 import base64
 import io
+import json
 import math
 import os
 import re
+import struct
+import sys
+import zlib
+from array import array
 from random import randint
-from typing import Any, NamedTuple, Optional
+from typing import (TYPE_CHECKING, Any, Callable, Iterable, Literal, NamedTuple,
+                    Optional, TypeVar)
 
-import stransi
-from PIL import Image
 from rich.console import Console
 from rich.segment import Segment
 from rich.style import Style
 from rich.text import Text
 from rich.color import Color as RichColor
-from stransi.instruction import Instruction
 from textual.color import Color, ColorParseError
 from textual.geometry import Offset, Region
 
@@ -22,6 +25,13 @@ from textual_paint.export_templates import (CUSTOM_CONSOLE_HTML_FORMAT,
                                             CUSTOM_CONSOLE_SVG_FORMAT)
 from textual_paint.localization.i18n import get as _
 from textual_paint.palette_data import IRC_PALETTE
+from textual_paint.sauce import (DATA_TYPE_CHARACTER, FILE_TYPE_ANSI,
+                                 FILE_TYPE_ASCII, Sauce, encode_sauce,
+                                 split_sauce)
+
+# Pillow and stransi are imported only when needed, so that opening a text file doesn't load image codecs.
+if TYPE_CHECKING:
+    from stransi.instruction import Instruction
 
 DEBUG_REGION_UPDATES = False
 
@@ -33,6 +43,21 @@ DEBUG_SVG_LOADING = False # writes debug.svg when flexible character grid loader
 # ICNS is disabled because it only supports a limited set of sizes.
 SAVE_DISABLED_FORMATS = ["JPEG", "ICNS"]
 
+NATIVE_MAGIC = b"TPAINT\x1a\x00"
+"""Start of a file in the native format (`.tpaint`)."""
+NATIVE_VERSION = 2
+"""Version of the native format written by this version of the app. Version 2 adds SAUCE metadata to the tables."""
+NATIVE_ROWS_PER_CHUNK = 64
+"""Number of rows compressed together in the native format, the unit of partial reads."""
+NATIVE_HEADER = struct.Struct("<8sHIIHBII")
+"""Magic, version, width, height, rows per chunk, bytes per cell index, byte length of the tables, and number of chunks.
+
+The header is followed by the byte length of each chunk (as little-endian uint32),
+the zlib-compressed JSON tables of distinct characters and styles, along with any SAUCE metadata,
+and the zlib-compressed chunks. Each chunk holds the character indices for its rows,
+followed by the style indices for its rows, as little-endian unsigned integers.
+"""
+
 
 # Detects ANSI escape sequences.
 # ansi_escape_pattern = re.compile(r"(\N{ESC}\[[\d;]*[a-zA-Z])")
@@ -68,6 +93,141 @@ assert ansi_detector_pattern.search("\x7F") is not None, "DEL should be matched
 assert ansi_detector_pattern.search("\x00") is not None, "NUL should be matched by ansi_detector_pattern"
 assert ansi_detector_pattern.search("\x80") is None, "Ç (in CP 437) or € (U+0080) should not be matched by ansi_detector_pattern"
 
+# Detects mIRC formatting codes: color (followed by a color number), bold, italic, underline, reverse, and reset.
+irc_detector_pattern = re.compile(rb'\x03\d|[\x02\x1D\x1F\x16\x0F]')
+
+APP_FORMAT_EXTENSIONS = {
+    ".svg": "SVG",
+    ".html": "HTML",
+    ".htm": "HTML",
+    ".txt": "PLAINTEXT",
+    ".asc": "PLAINTEXT",
+    ".diz": "PLAINTEXT",
+    ".ans": "ANSI",
+    ".irc": "IRC",
+    ".mirc": "IRC",
+    "._rich_console_markup": "RICH_CONSOLE_MARKUP",
+    ".tpaint": "TPAINT",
+}
+"""Format IDs for file extensions handled without Pillow, checked before asking Pillow, which loads all its codecs to answer."""
+
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "PNG"),
+    (b"GIF87a", "GIF"),
+    (b"GIF89a", "GIF"),
+    (b"\xff\xd8\xff", "JPEG"),
+]
+"""Magic bytes at the start of image files, and the Pillow format IDs they indicate. BMP is checked separately."""
+
+BMP_HEADER_SIZES = (12, 40, 52, 56, 64, 108, 124)
+"""Known sizes of the header following the `BM` signature of a BMP file, to tell it apart from text starting with "BM"."""
+
+def sniff_format(content: bytes) -> str | None:
+    """Detect the format of a file from its content, returning a format ID, or None if it's not recognized.
+
+    Binary formats are recognized by their magic bytes.
+    Text formats are recognized by their root element (SVG, HTML) or the presence of control codes (ANSI, IRC).
+    Plain text isn't recognized, since anything could be plain text.
+    """
+    if content.startswith(NATIVE_MAGIC):
+        return "TPAINT"
+    for signature, format_id in IMAGE_SIGNATURES:
+        if content.startswith(signature):
+            return format_id
+    if content.startswith(b"BM") and len(content) >= 18 and struct.unpack_from("<I", content, 14)[0] in BMP_HEADER_SIZES:
+        return "BMP"
+    head = content[:4096].lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if head.startswith(b"<?xml") or head.startswith(b"<!doctype svg") or head.startswith(b"<svg"):
+        if b"<svg" in head:
+            return "SVG"
+    elif head.startswith(b"<!doctype html") or head.startswith(b"<html"):
+        return "HTML"
+    if b"\x1b" in content:
+        return "ANSI"
+    if irc_detector_pattern.search(content):
+        return "IRC"
+    return None
+
+class NativeHeader(NamedTuple):
+    """The fixed-size header of a file in the native format. See `NATIVE_HEADER`."""
+    magic: bytes
+    version: int
+    width: int
+    height: int
+    rows_per_chunk: int
+    index_size: int
+    tables_length: int
+    chunk_count: int
+
+    @property
+    def typecode(self) -> Literal["H", "I"]:
+        """The `array` type code for the cell indices."""
+        return "H" if self.index_size == 2 else "I"
+
+def parse_native_header(content: bytes) -> NativeHeader:
+    """Parse the header of a file in the native format.
+
+    Raises ValueError if the content is not in the native format, or is from a newer version.
+    """
+    try:
+        header = NativeHeader(*NATIVE_HEADER.unpack_from(content))
+    except struct.error as e:
+        raise ValueError("Not a Textual Paint document.") from e
+    if header.magic != NATIVE_MAGIC:
+        raise ValueError("Not a Textual Paint document.")
+    if header.version > NATIVE_VERSION:
+        raise ValueError(f"Textual Paint document version {header.version} is newer than supported ({NATIVE_VERSION}).")
+    if header.rows_per_chunk == 0 or header.index_size not in (2, 4):
+        raise ValueError("Textual Paint document is corrupted.")
+    return header
+
+def parse_native_tables(content: bytes) -> tuple[list[str], list[Style], Sauce | None]:
+    """Parse the compressed tables of distinct characters and styles of a file in the native format, and its SAUCE metadata if any."""
+    try:
+        tables = json.loads(zlib.decompress(content))
+        sauce_fields = tables.get("sauce")
+        sauce = Sauce(**sauce_fields)._replace(comments=tuple(sauce_fields["comments"])) if sauce_fields else None
+        return list(tables["chars"]), [Style.parse(style) for style in tables["styles"]], sauce
+    except (zlib.error, KeyError, TypeError) as e:
+        raise ValueError("Textual Paint document is corrupted.") from e
+
+NO_ATTRIBUTES = Style()
+"""A style without colors or attributes, for comparing against styles with their colors removed."""
+
+class DocumentAnalysis(NamedTuple):
+    """The distinct characters and styles used in a document, for deciding whether a file format would lose any information."""
+    chars: frozenset[str]
+    styles: frozenset[Style]
+
+    @property
+    def has_text(self) -> bool:
+        """Whether any cell has a character other than a space."""
+        return bool(self.chars - {" "})
+
+    @property
+    def has_attributes(self) -> bool:
+        """Whether any cell is bold, italic, underlined, etc."""
+        return any(style.without_color != NO_ATTRIBUTES for style in self.styles)
+
+    @property
+    def foregrounds(self) -> frozenset[str | None]:
+        """The distinct foreground colors, as lowercase hex codes, or None for the terminal default."""
+        return frozenset(style.color.get_truecolor().hex if style.color else None for style in self.styles)
+
+    @property
+    def backgrounds(self) -> frozenset[str | None]:
+        """The distinct background colors, as lowercase hex codes, or None for the terminal default."""
+        return frozenset(style.bgcolor.get_truecolor().hex if style.bgcolor else None for style in self.styles)
+
+    def uses_non_default_colors(self, default_fg: str = "#000000", default_bg: str = "#ffffff") -> bool:
+        """Whether any cell has a foreground or background color other than the given defaults."""
+        return bool(self.foregrounds - {RichColor.parse(default_fg).get_truecolor().hex}) or bool(self.backgrounds - {RichColor.parse(default_bg).get_truecolor().hex})
+
+    def colors_outside(self, palette: Iterable[str]) -> frozenset[str | None]:
+        """The colors used in the document that aren't in the given palette."""
+        palette_hex = {RichColor.parse(color).get_truecolor().hex for color in palette}
+        return (self.foregrounds | self.backgrounds) - palette_hex
+
 class FormatWriteNotSupported(Exception):
     """The format doesn't support writing."""
     def __init__(self, localized_message: str):
@@ -81,6 +241,78 @@ class FormatReadNotSupported(Exception):
         super().__init__(localized_message)
 
 
+T = TypeVar("T")
+
+def rotate_grid(grid: list[list[T]], angle: int) -> list[list[T]]:
+    """Rotate a 2D list clockwise by the given angle, one of 90, 180, or 270."""
+    if angle == 90:
+        # Rows become columns, read from the bottom up.
+        return [list(column) for column in zip(*grid[::-1])]
+    if angle == 180:
+        return [row[::-1] for row in grid[::-1]]
+    if angle == 270:
+        return [list(column) for column in zip(*grid)][::-1]
+    raise ValueError(f"Unsupported angle: {angle}")
+
+def affine_sample_indices(width: int, height: int, matrix: tuple[float, float, float, float]) -> tuple[int, int, list[list[int]]]:
+    """Map each cell of a transformed grid back to the cell of the source grid it samples.
+
+    `matrix` is (a, b, c, d), transforming a source point (x, y) to (a * x + b * y, c * x + d * y).
+    The result is sized to the bounding box of the transformed grid.
+
+    Returns the new width and height, and for each row, a list of indices into the source grid,
+    flattened row by row, or -1 where a cell falls outside the source.
+    """
+    a, b, c, d = matrix
+    corners = [(a * x + b * y, c * x + d * y) for x, y in ((0, 0), (width, 0), (0, height), (width, height))]
+    min_x = min(x for x, _ in corners)
+    min_y = min(y for _, y in corners)
+    new_width = max(1, int(max(x for x, _ in corners) - min_x))
+    new_height = max(1, int(max(y for _, y in corners) - min_y))
+
+    determinant = a * d - b * c
+    if determinant == 0:
+        # The image collapses to a line, which doesn't cover any cells.
+        return new_width, new_height, [[-1] * new_width for _ in range(new_height)]
+
+    # Sample positions are truncated rather than rounded,
+    # since round() causes artifacts where for instance a 200% stretch will result in a 3-1-3-1 pattern instead of 2-2-2-2
+    if b == 0 and c == 0:
+        # Stretching only: each column samples one source column, and each row one source row.
+        source_xs = [math.floor((x + min_x) / a) for x in range(new_width)]
+        source_xs = [source_x if 0 <= source_x < width else -1 for source_x in source_xs]
+        outside = [-1] * new_width
+        indices: list[list[int]] = []
+        for y in range(new_height):
+            source_y = math.floor((y + min_y) / d)
+            if 0 <= source_y < height:
+                offset = source_y * width
+                indices.append([offset + source_x if source_x >= 0 else -1 for source_x in source_xs])
+            else:
+                indices.append(outside)
+        return new_width, new_height, indices
+
+    # Apply the inverse transformation, with the per-column terms computed once.
+    inverse_a, inverse_b, inverse_c, inverse_d = d / determinant, -b / determinant, -c / determinant, a / determinant
+    column_terms = [(inverse_a * (x + min_x), inverse_c * (x + min_x)) for x in range(new_width)]
+    indices = []
+    for y in range(new_height):
+        row_x = inverse_b * (y + min_y)
+        row_y = inverse_d * (y + min_y)
+        row: list[int] = []
+        for column_x, column_y in column_terms:
+            source_x = math.floor(column_x + row_x)
+            source_y = math.floor(column_y + row_y)
+            row.append(source_y * width + source_x if 0 <= source_x < width and 0 <= source_y < height else -1)
+        indices.append(row)
+    return new_width, new_height, indices
+
+def sample_grid(grid: list[list[T]], indices: list[list[int]], fill: T) -> list[list[T]]:
+    """Build a 2D list from indices into the flattened grid, as returned by `affine_sample_indices`."""
+    flat = [cell for row in grid for cell in row]
+    return [[flat[i] if i >= 0 else fill for i in row] for row in indices]
+
+
 class AnsiArtDocument:
     """A document that can be rendered as ANSI."""
 
@@ -102,6 +334,8 @@ class AnsiArtDocument:
         """2D array of styles."""
         self.selection: Optional[Selection] = None
         """The current selection, which can itself contain an ANSI art document."""
+        self.sauce: Optional[Sauce] = None
+        """SAUCE metadata (title, author, etc.) from the file the document was loaded from, written back when saving as ANSI or plain text."""
 
     def copy(self, source: 'AnsiArtDocument') -> None:
         """Copy the image size and data from another document. Does not copy the selection."""
@@ -150,6 +384,64 @@ class AnsiArtDocument:
         self.ch = new_ch
         self.st = new_st
 
+    def flip_horizontal(self) -> None:
+        """Flip the document horizontally, in place."""
+        for row in self.ch:
+            row.reverse()
+        for row in self.st:
+            row.reverse()
+
+    def flip_vertical(self) -> None:
+        """Flip the document vertically, in place."""
+        self.ch.reverse()
+        self.st.reverse()
+
+    def rotate(self, angle: int) -> None:
+        """Rotate the document clockwise by the given angle, one of 90, 180, or 270, in place."""
+        if angle == 180:
+            self.flip_horizontal()
+            self.flip_vertical()
+            return
+        self.ch = rotate_grid(self.ch, angle)
+        self.st = rotate_grid(self.st, angle)
+        self.width, self.height = self.height, self.width
+
+    def flipped(self, horizontal: bool = True) -> 'AnsiArtDocument':
+        """Returns a copy of the document, flipped horizontally or vertically."""
+        document = AnsiArtDocument(0, 0)
+        document.copy(self)
+        if horizontal:
+            document.flip_horizontal()
+        else:
+            document.flip_vertical()
+        return document
+
+    def rotated(self, angle: int) -> 'AnsiArtDocument':
+        """Returns a copy of the document, rotated clockwise by the given angle, one of 90, 180, or 270."""
+        document = AnsiArtDocument(0, 0)
+        document.width, document.height = (self.width, self.height) if angle == 180 else (self.height, self.width)
+        document.ch = rotate_grid(self.ch, angle)
+        document.st = rotate_grid(self.st, angle)
+        return document
+
+    def transformed(self, matrix: tuple[float, float, float, float], default_bg: str = "#ffffff", default_fg: str = "#000000") -> 'AnsiArtDocument':
+        """Returns a copy of the document, transformed by a 2x2 matrix, such as for stretching and skewing.
+
+        See `affine_sample_indices` for the meaning of the matrix.
+        Cells that don't come from the source are filled with spaces in the default colors.
+        """
+        width, height, indices = affine_sample_indices(self.width, self.height, matrix)
+        return self.sampled(width, height, indices, default_bg, default_fg)
+
+    def sampled(self, width: int, height: int, indices: list[list[int]], default_bg: str = "#ffffff", default_fg: str = "#000000") -> 'AnsiArtDocument':
+        """Returns a new document built from indices into this document's cells, as returned by `affine_sample_indices`."""
+        document = AnsiArtDocument(0, 0)
+        document.width = width
+        document.height = height
+        document.ch = sample_grid(self.ch, indices, " ")
+        document.st = sample_grid(self.st, indices, Style(color=default_fg, bgcolor=default_bg))
+        return document
+
     def invert(self) -> None:
         """Invert the foreground and background colors."""
         self.invert_region(Region(0, 0, self.width, self.height))
@@ -176,6 +468,33 @@ class AnsiArtDocument:
                 # )
                 self.st[y][x] = style
 
+    def analyze(self) -> DocumentAnalysis:
+        """Collect the distinct characters and styles used in the document, in a single pass."""
+        chars: set[str] = set()
+        styles: set[Style] = set()
+        for y in range(self.height):
+            chars.update(self.ch[y])
+            styles.update(self.st[y])
+        return DocumentAnalysis(frozenset(chars), frozenset(styles))
+
+    def diff_rows(self, other: 'AnsiArtDocument') -> list[Region] | None:
+        """Returns full-width regions spanning each run of rows that differ from another document.
+
+        Returns None if the documents differ in size, in which case everything should be considered changed.
+        """
+        if self.width != other.width or self.height != other.height:
+            return None
+        regions: list[Region] = []
+        run_start: int | None = None
+        for y in range(self.height + 1):
+            changed = y < self.height and (self.ch[y] != other.ch[y] or self.st[y] != other.st[y])
+            if changed and run_start is None:
+                run_start = y
+            elif not changed and run_start is not None:
+                regions.append(Region(0, run_start, self.width, y - run_start))
+                run_start = None
+        return regions
+
     @staticmethod
     def format_from_extension(file_path: str) -> str | None:
         """Get the format ID from the file extension of the given path.
@@ -187,22 +506,13 @@ class AnsiArtDocument:
         # Alternative: pathlib.Path.suffix
         file_ext_with_dot = os.path.splitext(file_path)[1].lower().rstrip("~")
         # print("File extension:", file_ext_with_dot)
+        # Pillow doesn't claim any of these extensions, so checking them first doesn't change the result,
+        # but it avoids initializing all of Pillow's codecs for text files.
+        if file_ext_with_dot in APP_FORMAT_EXTENSIONS:
+            return APP_FORMAT_EXTENSIONS[file_ext_with_dot]
+        from PIL import Image
         ext_to_id = Image.registered_extensions() # maps extension to format ID, e.g. '.jp2': 'JPEG2000'
         # print("Supported image formats by extension:", Image.EXTENSION)
-        if file_ext_with_dot in ext_to_id:
-            return ext_to_id[file_ext_with_dot]
-        ext_to_id = {
-            ".svg": "SVG",
-            ".html": "HTML",
-            ".htm": "HTML",
-            ".txt": "PLAINTEXT",
-            ".asc": "PLAINTEXT",
-            ".diz": "PLAINTEXT",
-            ".ans": "ANSI",
-            ".irc": "IRC",
-            ".mirc": "IRC",
-            "._rich_console_markup": "RICH_CONSOLE_MARKUP",
-        }
         if file_ext_with_dot in ext_to_id:
             return ext_to_id[file_ext_with_dot]
         return None
@@ -218,7 +528,7 @@ class AnsiArtDocument:
             raise FormatWriteNotSupported(localized_message=_("Unknown file extension.") + "\n\n" + _("To save your changes, use a different filename."))
         elif format_id == "ANSI":
             # This maybe shouldn't use UTF-8... but there's not a singular encoding for "ANSI art".
-            return self.get_ansi().encode("utf-8")
+            return self.with_sauce(self.get_ansi().encode("utf-8"), FILE_TYPE_ANSI)
         elif format_id == "IRC":
             # Also not sure about UTF-8 here.
             return self.get_irc().encode("utf-8")
@@ -227,16 +537,32 @@ class AnsiArtDocument:
         elif format_id == "HTML":
             return self.get_html().encode("utf-8")
         elif format_id == "PLAINTEXT":
-            return self.get_plain().encode("utf-8")
+            return self.with_sauce(self.get_plain().encode("utf-8"), FILE_TYPE_ASCII)
         elif format_id == "RICH_CONSOLE_MARKUP":
             return self.get_rich_console_markup().encode("utf-8")
-        elif format_id in Image.SAVE and format_id not in SAVE_DISABLED_FORMATS:
+        elif format_id == "TPAINT":
+            return self.get_native()
+        from PIL import Image
+        Image.init()
+        if format_id in Image.SAVE and format_id not in SAVE_DISABLED_FORMATS:
             return self.encode_image_format(format_id)
         else:
             raise FormatWriteNotSupported(localized_message=_("Cannot write files in %1 format.", format_id) + "\n\n" + _("To save your changes, use a different filename."))
 
+    def with_sauce(self, content: bytes, file_type: int) -> bytes:
+        """Append the document's SAUCE metadata to encoded content, if it has any, updated to the document's size."""
+        if self.sauce is None:
+            return content
+        sauce = self.sauce
+        if sauce.data_type != DATA_TYPE_CHARACTER:
+            # The type-dependent fields meant something else.
+            sauce = sauce._replace(data_type=DATA_TYPE_CHARACTER, tinfo3=0, tinfo4=0, flags=0, tinfos="")
+        sauce = sauce._replace(file_type=file_type, tinfo1=min(self.width, 0xFFFF), tinfo2=min(self.height, 0xFFFF))
+        return content + encode_sauce(sauce, len(content))
+
     def encode_image_format(self, pil_format_id: str) -> bytes:
         """Encode the document as an image file."""
+        from PIL import Image
         size = (self.width, self.height)
         image = Image.new("RGB", size, color="#000000")
         pixels = image.load()
@@ -343,6 +669,38 @@ class AnsiArtDocument:
         # `html.escape` leaves control codes, which blows up ET.fromstring, so use base64 instead.
         return svg.replace("%ANSI_GOES_HERE%", base64.b64encode(self.get_ansi().encode("utf-8")).decode("utf-8"))
 
+    def get_native(self) -> bytes:
+        """Get the native binary representation of the document, which is fast to encode and decode, and lossless.
+
+        Characters and styles are each stored once in a table, and cells refer to them by index.
+        """
+        chars: dict[str, int] = {}
+        styles: dict[Style, int] = {}
+        # Rows are visited one at a time, rather than building all the indices up front,
+        # so that memory-mapped documents don't need to be fully resident.
+        for y in range(self.height):
+            for ch in self.ch[y]:
+                chars.setdefault(ch, len(chars))
+            for style in self.st[y]:
+                styles.setdefault(style, len(styles))
+        index_size = 2 if max(len(chars), len(styles)) <= 0x10000 else 4
+        typecode: Literal["H", "I"] = "H" if index_size == 2 else "I"
+        chunks: list[bytes] = []
+        for start in range(0, self.height, NATIVE_ROWS_PER_CHUNK):
+            stop = min(start + NATIVE_ROWS_PER_CHUNK, self.height)
+            indices = array(typecode, [chars[ch] for y in range(start, stop) for ch in self.ch[y]])
+            indices.extend(array(typecode, [styles[style] for y in range(start, stop) for style in self.st[y]]))
+            if sys.byteorder == "big":
+                indices.byteswap()
+            chunks.append(zlib.compress(indices.tobytes()))
+        tables = zlib.compress(json.dumps({
+            "chars": list(chars),
+            "styles": [str(style) for style in styles],
+            "sauce": self.sauce._asdict() if self.sauce else None,
+        }).encode("utf-8"))
+        header = NATIVE_HEADER.pack(NATIVE_MAGIC, NATIVE_VERSION, self.width, self.height, NATIVE_ROWS_PER_CHUNK, index_size, len(tables), len(chunks))
+        return b"".join([header, struct.pack(f"<{len(chunks)}I", *map(len, chunks)), tables, *chunks])
+
     def get_renderable(self) -> Text:
         """Get a Rich renderable for the document."""
         joiner = Text("\n")
@@ -461,7 +819,7 @@ class AnsiArtDocument:
 
     @staticmethod
     def from_ansi(text: str, default_bg: str = "#ffffff", default_fg: str = "#000000", max_width: int = 100000) -> 'AnsiArtDocument':
-        """Creates a document from the given ANSI text."""
+        """Creates a document from the given ANSI text, wrapping lines at `max_width`, such as the width declared in SAUCE metadata."""
 
         # TODO: use Rich API to render ANSI to a virtual screen,
         # and remove dependency on stransi
@@ -483,6 +841,7 @@ class AnsiArtDocument:
         from ochre.spaces import RGB
         RGB.__post_init__ = lambda self: None
 
+        import stransi
 
         ansi = stransi.Ansi(text)
 
@@ -524,6 +883,11 @@ class AnsiArtDocument:
                         # TODO: ignore other unhandled control characters
                         pass
                     else:
+                        # Wrap before writing past the last column, rather than after writing to it,
+                        # like terminals do, so a line break after a full-width line doesn't add a blank line.
+                        if x > max_width - 1:
+                            x = 0
+                            y += 1
                         while len(document.ch) <= y:
                             document.ch.append([])
                             document.st.append([])
@@ -535,9 +899,6 @@ class AnsiArtDocument:
                         width = max(x + 1, width)
                         height = max(y + 1, height)
                         x += 1
-                        if x > max_width - 1:
-                            x = 0
-                            y += 1
             elif isinstance(instruction, stransi.SetColor) and instruction.color is not None:
                 # Color (I'm not sure why instruction.color would be None, but it's typed as Optional[Color])
                 # (maybe just for initial state?)
@@ -638,6 +999,7 @@ class AnsiArtDocument:
 
         Raises UnidentifiedImageError if the format is not detected.
         """
+        from PIL import Image
         image = Image.open(io.BytesIO(content))
         rgb_image = image.convert('RGB') # handles indexed images, etc.
         width, height = rgb_image.size
@@ -648,6 +1010,47 @@ class AnsiArtDocument:
                 document.st[y][x] += Style.from_color(bgcolor=RichColor.from_rgb(r, g, b))  # type: ignore
         return document
 
+    @staticmethod
+    def from_native(content: bytes, row_start: int = 0, row_stop: int | None = None) -> 'AnsiArtDocument':
+        """Creates a document from the native binary format (see `get_native`.)
+
+        If a range of rows is given, the document holds only those rows,
+        and only the chunks containing them are decompressed.
+
+        Raises ValueError if the content is not in the native format, or is corrupted.
+        """
+        header = parse_native_header(content)
+        width, height, rows_per_chunk = header.width, header.height, header.rows_per_chunk
+        try:
+            offset = NATIVE_HEADER.size
+            chunk_lengths = struct.unpack_from(f"<{header.chunk_count}I", content, offset)
+            offset += 4 * header.chunk_count
+            chars, styles, sauce = parse_native_tables(content[offset:offset + header.tables_length])
+            offset += header.tables_length
+            row_stop = height if row_stop is None else max(0, min(row_stop, height))
+            row_start = max(0, min(row_start, row_stop))
+            document = AnsiArtDocument(width, row_stop - row_start)
+            document.sauce = sauce
+            for chunk_index, chunk_length in enumerate(chunk_lengths):
+                chunk_start = chunk_index * rows_per_chunk
+                chunk_stop = min(chunk_start + rows_per_chunk, height)
+                if chunk_start < row_stop and chunk_stop > row_start:
+                    indices = array(header.typecode)
+                    indices.frombytes(zlib.decompress(content[offset:offset + chunk_length]))
+                    if sys.byteorder == "big":
+                        indices.byteswap()
+                    plane_size = (chunk_stop - chunk_start) * width
+                    if len(indices) != plane_size * 2:
+                        raise ValueError("Textual Paint document is corrupted.")
+                    for y in range(max(row_start, chunk_start), min(row_stop, chunk_stop)):
+                        i = (y - chunk_start) * width
+                        document.ch[y - row_start] = [chars[index] for index in indices[i:i + width]]
+                        document.st[y - row_start] = [styles[index] for index in indices[plane_size + i:plane_size + i + width]]
+                offset += chunk_length
+        except (struct.error, zlib.error, IndexError) as e:
+            raise ValueError("Textual Paint document is corrupted.") from e
+        return document
+
     @staticmethod
     def from_svg(svg: str, default_bg: str = "#ffffff", default_fg: str = "#000000") -> 'AnsiArtDocument':
         """Creates a document from an SVG containing a character grid with rects for cell backgrounds.
@@ -1039,27 +1442,71 @@ class AnsiArtDocument:
         Raises UnidentifiedImageError if the format is not detected.
         """
         format_id = AnsiArtDocument.format_from_extension(file_path)
+        # Binary formats are recognized by their content regardless of the file extension, since they can't be text.
+        # Text formats are only detected from content for unknown extensions, since e.g. a .txt file
+        # containing escape sequences may be meant to be viewed as plain text.
+        # SAUCE metadata can be appended to text files, most commonly ANSI art.
+        # Binary formats are left alone, since their data can happen to look like the end of file marker.
+        sauce = None
+        sniffed_format_id = sniff_format(content)
+        if sniffed_format_id not in SNIFFED_BINARY_FORMATS:
+            content, sauce = split_sauce(content)
+            if sauce:
+                sniffed_format_id = sniff_format(content)
+        if sniffed_format_id in SNIFFED_BINARY_FORMATS or format_id is None:
+            format_id = sniffed_format_id or format_id
+        document = AnsiArtDocument.decode_format(format_id, content, default_bg, default_fg, sauce.width if sauce else 0)
+        document.sauce = sauce
+        if sauce and sauce.width > document.width:
+            # Trailing spaces are often left out, but the art is meant to be shown at the declared width.
+            document.resize(sauce.width, document.height, default_bg, default_fg)
+        return document
+
+    @staticmethod
+    def decode_format(format_id: str | None, content: bytes, default_bg: str = "#ffffff", default_fg: str = "#000000", width: int = 0) -> 'AnsiArtDocument':
+        """Creates a document from the given bytes in the given format. If a width is given, ANSI text is wrapped at that width."""
+        if format_id == "ANSI" and width:
+            return AnsiArtDocument.from_ansi(content.decode('utf-8'), default_bg, default_fg, max_width=width)
+        elif format_id in FORMAT_DECODERS:
+            return FORMAT_DECODERS[format_id](content, default_bg, default_fg)
+        elif format_id in ["HTML", "RICH_CONSOLE_MARKUP"]:
+            # This is a write-only format.
+            raise FormatReadNotSupported(localized_message=_("Cannot read files saved as %1 format.", format_id))
+        elif format_id is None:
+            # This is an unknown format.
+            # For now at least, I'm preserving the behavior of loading as ANSI/PLAINTEXT.
+            return AnsiArtDocument.from_text(content.decode('utf-8'), default_bg, default_fg)
+        from PIL import Image
+        Image.init()
         # print("Supported image formats for reading:", Image.OPEN.keys())
-        # TODO: try loading as image first, then as text if that fails with UnidentifiedImageError
-        # That way it can handle images without file extensions.
         if format_id in Image.OPEN:
             return AnsiArtDocument.from_image_format(content)
-        elif format_id == "ANSI":
-            return AnsiArtDocument.from_ansi(content.decode('utf-8'), default_bg, default_fg)
-        elif format_id == "IRC":
-            return AnsiArtDocument.from_irc(content.decode('utf-8'), default_bg, default_fg)
-        elif format_id == "PLAINTEXT":
-            return AnsiArtDocument.from_plain(content.decode('utf-8'), default_bg, default_fg)
-        elif format_id == "SVG":
-            return AnsiArtDocument.from_svg(content.decode('utf-8'), default_bg, default_fg)
-        elif format_id in Image.SAVE or format_id in ["HTML", "RICH_CONSOLE_MARKUP"]:
+        elif format_id in Image.SAVE:
             # This is a write-only format.
             raise FormatReadNotSupported(localized_message=_("Cannot read files saved as %1 format.", format_id))
         else:
-            # This is an unknown format.
-            # For now at least, I'm preserving the behavior of loading as ANSI/PLAINTEXT.
             return AnsiArtDocument.from_text(content.decode('utf-8'), default_bg, default_fg)
 
+FORMAT_DECODERS: dict[str, Callable[[bytes, str, str], AnsiArtDocument]] = {
+    "ANSI": lambda content, default_bg, default_fg: AnsiArtDocument.from_ansi(content.decode('utf-8'), default_bg, default_fg),
+    "IRC": lambda content, default_bg, default_fg: AnsiArtDocument.from_irc(content.decode('utf-8'), default_bg, default_fg),
+    "PLAINTEXT": lambda content, default_bg, default_fg: AnsiArtDocument.from_plain(content.decode('utf-8'), default_bg, default_fg),
+    "SVG": lambda content, default_bg, default_fg: AnsiArtDocument.from_svg(content.decode('utf-8'), default_bg, default_fg),
+    "TPAINT": lambda content, default_bg, default_fg: AnsiArtDocument.from_native(content),
+    "PNG": lambda content, default_bg, default_fg: AnsiArtDocument.from_image_format(content),
+    "GIF": lambda content, default_bg, default_fg: AnsiArtDocument.from_image_format(content),
+    "JPEG": lambda content, default_bg, default_fg: AnsiArtDocument.from_image_format(content),
+    "BMP": lambda content, default_bg, default_fg: AnsiArtDocument.from_image_format(content),
+}
+"""Decoders by format ID, taking the file content and default background and foreground colors.
+
+Each decoder imports what it needs (stransi, ElementTree, Pillow) only when called.
+Other image formats Pillow can read are handled by asking Pillow, which loads all its codecs.
+"""
+
+SNIFFED_BINARY_FORMATS = ("TPAINT", "PNG", "GIF", "JPEG", "BMP")
+"""Formats detected from content that take precedence over the file extension."""
+
 class Selection:
     """
     A selection within an AnsiArtDocument.
@@ -1101,6 +1548,35 @@ class Selection:
         self.mask: Optional[list[list[bool]]] = None
         """A mask of the selection to cut out, used for Free-Form Select tool. Coordinates are relative to the selection region."""
 
+    def flip(self, horizontal: bool = True) -> None:
+        """Flip the selection's image data (and mask) horizontally or vertically."""
+        assert self.contained_image is not None, "Selection must be extracted before flipping"
+        self.contained_image = self.contained_image.flipped(horizontal)
+        if self.mask:
+            self.mask = [row[::-1] for row in self.mask] if horizontal else self.mask[::-1]
+
+    def rotate(self, angle: int) -> None:
+        """Rotate the selection's image data (and mask) clockwise, resizing the selection to fit."""
+        assert self.contained_image is not None, "Selection must be extracted before rotating"
+        self.contained_image = self.contained_image.rotated(angle)
+        if self.mask:
+            self.mask = rotate_grid(self.mask, angle)
+        self.region = Region(self.region.x, self.region.y, self.contained_image.width, self.contained_image.height)
+
+    def transform(self, matrix: tuple[float, float, float, float]) -> None:
+        """Transform the selection's image data by a 2x2 matrix, resizing the selection to fit.
+
+        Cells outside the transformed image (such as the corners, when skewing) are left out of the selection's mask.
+        """
+        image = self.contained_image
+        assert image is not None, "Selection must be extracted before transforming"
+        width, height, indices = affine_sample_indices(image.width, image.height, matrix)
+        self.contained_image = image.sampled(width, height, indices)
+        mask = self.mask or [[True] * image.width for _ in range(image.height)]
+        mask = sample_grid(mask, indices, False)
+        self.mask = None if all(all(row) for row in mask) else mask
+        self.region = Region(self.region.x, self.region.y, width, height)
+
     def copy_from_document(self, document: 'AnsiArtDocument') -> None:
         """Copy the image data from the document into the selection."""
         self.contained_image = AnsiArtDocument(self.region.width, self.region.height)
@@ -16,6 +16,8 @@ parser.add_argument('--language', default='en', help='Language to use', choices=
 parser.add_argument('--ascii-only-icons', action='store_true', help='Use only ASCII characters for tool icons, no emoji or other Unicode symbols')
 parser.add_argument('--ascii-only', action='store_true', help='Use only ASCII characters for the entire UI, for use in older terminals. Implies --ascii-only-icons')
 parser.add_argument('--backup-folder', default=None, metavar="FOLDER", help='Folder to save backups to. By default a backup is saved alongside the edited file.')
+parser.add_argument('--backup-sessions', type=int, default=10, metavar="N", help='Number of backups from previous sessions to keep for each document, for File > Recover Session.')
+parser.add_argument('--backup-sessions-size', type=int, default=50, metavar="MB", help='Total size of backups from previous sessions to keep for each document, in megabytes.')
 
 # TODO: hide development options from help? there's quite a few of them now
 # (...actually, less of them now, and I've grouped them together)
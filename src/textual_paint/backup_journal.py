@@ -0,0 +1,84 @@
+"""Journal of changes to a document since its last backup checkpoint, for crash recovery.
+
+The backup file (`*.ans~`) is a checkpoint of the whole document, saved periodically.
+In between, changed regions are appended to a journal file alongside it, one JSON record per line,
+so that keeping the backup up to date costs in proportion to the edit, rather than the size of the document.
+
+The journal starts with a header naming the hash of the checkpoint it applies to,
+so that a journal left over from an older checkpoint is never replayed onto a newer one.
+Each record holds the current contents of a region, so replaying a record twice is harmless.
+"""
+
+import hashlib
+import json
+import os
+
+from textual.geometry import Region
+
+from textual_paint.ansi_art_document import AnsiArtDocument
+
+JOURNAL_SUFFIX = ".journal"
+"""Appended to the backup file path to get the journal file path."""
+
+
+def journal_header(checkpoint_hash: str) -> str:
+    """Returns the first line of a journal, for the checkpoint with the given content hash (hex)."""
+    return json.dumps({"checkpoint": checkpoint_hash}) + "\n"
+
+
+def journal_record(document: AnsiArtDocument, region: Region) -> str:
+    """Returns a journal line holding the current contents of a region of the document, along with the document's size."""
+    region = region.intersection(Region(0, 0, document.width, document.height))
+    sub_image = AnsiArtDocument(region.width, region.height)
+    sub_image.copy_region(document, source_region=region)
+    return json.dumps({
+        "size": [document.width, document.height],
+        "region": [region.x, region.y, region.width, region.height],
+        "ansi": sub_image.get_ansi(),
+    }) + "\n"
+
+
+def replay_journal(document: AnsiArtDocument, journal: str, checkpoint_hash: str) -> int:
+    """Apply a journal to a document loaded from the checkpoint with the given content hash (hex).
+
+    Returns the number of records applied. Nothing is applied if the journal belongs to a different checkpoint.
+    A record that was cut off, such as by a crash while it was being written, ends the replay.
+    """
+    lines = journal.splitlines()
+    try:
+        header = json.loads(lines[0])
+    except (IndexError, ValueError):
+        return 0
+    if not isinstance(header, dict) or header.get("checkpoint") != checkpoint_hash:
+        return 0
+    applied = 0
+    for line in lines[1:]:
+        try:
+            record = json.loads(line)
+            width, height = record["size"]
+            x, y, region_width, region_height = record["region"]
+            sub_image = AnsiArtDocument.from_text(record["ansi"])
+        except (ValueError, KeyError, TypeError):
+            break
+        document.resize(width, height)
+        target_region = Region(x, y, min(region_width, sub_image.width), min(region_height, sub_image.height))
+        document.copy_region(sub_image, target_region=target_region.intersection(Region(0, 0, width, height)))
+        applied += 1
+    return applied
+
+
+def read_backup(backup_file_path: str) -> tuple[AnsiArtDocument, bytes, int]:
+    """Load a backup file, replaying its journal if there is one.
+
+    Returns the document, the hash of the backup file's content, and the number of journal records applied.
+    """
+    with open(backup_file_path, "rb") as f:
+        backup_bytes = f.read()
+    document = AnsiArtDocument.from_text(backup_bytes.decode("utf-8"))
+    content_hash = hashlib.sha256(backup_bytes).digest()
+    applied = 0
+    journal_file_path = backup_file_path + JOURNAL_SUFFIX
+    if os.path.exists(journal_file_path):
+        with open(journal_file_path, "r", encoding="utf-8") as f:
+            applied = replay_journal(document, f.read(), content_hash.hex())
+    return document, content_hash, applied
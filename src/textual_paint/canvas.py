@@ -6,11 +6,14 @@ from rich.color import Color
 from rich.segment import Segment
 from rich.style import Style
 from textual import events
+from textual.constants import MAX_FPS
 from textual.geometry import Offset, Region, Size
 from textual.message import Message
 from textual.reactive import reactive
 from textual.strip import Strip
+from textual.timer import Timer
 from textual.widget import Widget
+from typing_extensions import Self
 
 from textual_paint.ansi_art_document import AnsiArtDocument, Selection
 from textual_paint.args import args
@@ -21,6 +24,30 @@ def scale_region(region: Region, scale: int) -> Region:
     """Returns the region scaled by the given factor."""
     return Region(region.x * scale, region.y * scale, region.width * scale, region.height * scale)
 
+def merge_regions(regions: list[Region]) -> list[Region]:
+    """Returns a list of regions covering the given regions, where overlapping or adjacent regions are merged together.
+
+    Regions that are far apart are kept separate, since their union could be much larger than the regions themselves.
+    """
+    merged: list[Region] = []
+    for region in regions:
+        if not region:
+            continue
+        # Merging two regions can make the result touch a region that was already checked,
+        # so keep merging until nothing changes.
+        merging = True
+        while merging:
+            merging = False
+            for i, other in enumerate(merged):
+                # Growing by one cell makes adjacent regions count as overlapping.
+                if region.grow((1, 1, 1, 1)).overlaps(other):
+                    region = region.union(other)
+                    del merged[i]
+                    merging = True
+                    break
+        merged.append(region)
+    return merged
+
 
 class Canvas(Widget):
     """The drawing surface widget. Displays an AnsiArtDocument and Selection, and handles mouse events."""
@@ -49,11 +76,21 @@ class Canvas(Widget):
             super().__init__()
 
     class ToolUpdate(Message):
-        """Message when dragging on the canvas."""
+        """Message when dragging on the canvas.
+
+        If the mouse moves again before this message is handled, the movement is folded into this message
+        instead of posting another one, so that a backed up event queue doesn't redraw stale positions.
+        `x` and `y` are always the latest position, and `points` holds every position since the last handled update,
+        for tools that need the whole path (freehand tools and Free-Form Select).
+        """
 
         def __init__(self, mouse_move_event: events.MouseMove) -> None:
             self.x = mouse_move_event.x
             self.y = mouse_move_event.y
+            self.points: list[Offset] = [Offset(mouse_move_event.x, mouse_move_event.y)]
+            """Positions since the last handled update, including the latest position."""
+            self.handled = False
+            """Set by the handler, so that further movement gets a new message."""
             super().__init__()
 
     class ToolStop(Message):
@@ -65,11 +102,16 @@ class Canvas(Widget):
             super().__init__()
 
     class ToolPreviewUpdate(Message):
-        """Message when moving the mouse while the mouse is up."""
+        """Message when moving the mouse while the mouse is up.
+
+        Like `ToolUpdate`, further movement is folded into this message until it's handled.
+        """
 
         def __init__(self, mouse_move_event: events.MouseMove) -> None:
             self.x = mouse_move_event.x
             self.y = mouse_move_event.y
+            self.handled = False
+            """Set by the handler, so that further movement gets a new message."""
             super().__init__()
 
     class ToolPreviewStop(Message):
@@ -78,6 +120,17 @@ class Canvas(Widget):
         def __init__(self) -> None:
             super().__init__()
 
+    class DocumentChanged(Message):
+        """Message when the document's contents change, for other views of the document, like the thumbnail.
+
+        Sent at most once per frame, along with the coalesced canvas refresh.
+        """
+
+        def __init__(self, regions: list[Region] | None) -> None:
+            self.regions = regions
+            """Changed regions in document coordinates, or None if the whole document may have changed."""
+            super().__init__()
+
     def __init__(self, **kwargs: Any) -> None:
         """Initialize the canvas."""
         super().__init__(**kwargs)
@@ -86,6 +139,20 @@ class Canvas(Widget):
         self.magnifier_preview_region: Optional[Region] = None
         self.select_preview_region: Optional[Region] = None
         self.which_button: Optional[int] = None
+        self.pending_tool_update: Canvas.ToolUpdate | Canvas.ToolPreviewUpdate | None = None
+        """The last posted mouse move message, which may still be waiting to be handled."""
+        self.pending_refresh_regions: list[Region] = []
+        """Scaled regions to refresh at the next frame. See `refresh_scaled_region`."""
+        self.pending_refresh_timer: Timer | None = None
+        """Timer for flushing `pending_refresh_regions`, if a flush is scheduled."""
+        self.pending_document_regions: list[Region] = []
+        """Unscaled regions to report in the next `DocumentChanged` message."""
+        self.document_version = 0
+        """Incremented as soon as the document is reported changed, unlike `DocumentChanged`, which is sent at the next frame."""
+        self.refresh_request_count = 0
+        """Number of regions requested to be refreshed, for instrumentation."""
+        self.refresh_flush_count = 0
+        """Number of merged refreshes actually performed, for instrumentation."""
 
     def on_mouse_down(self, event: events.MouseDown) -> None:
         """Called when a mouse button is pressed.
@@ -109,6 +176,7 @@ class Canvas(Widget):
             self.app.stop_action_in_progress()
             return
 
+        self.pending_tool_update = None
         self.post_message(self.ToolStart(event))
         self.pointer_active = True
         self.which_button = event.button
@@ -145,15 +213,27 @@ class Canvas(Widget):
         event.x //= self.magnification
         event.y //= self.magnification
 
+        pending = self.pending_tool_update
         if self.pointer_active:
-            self.post_message(self.ToolUpdate(event))
+            if isinstance(pending, self.ToolUpdate) and not pending.handled:
+                # Coalesce with the update that's still waiting in the queue.
+                pending.x = event.x
+                pending.y = event.y
+                pending.points.append(Offset(event.x, event.y))
+                return
+            self.pending_tool_update = self.ToolUpdate(event)
         else:
             # I put this in the else block just for performance.
             # Hopefully it wouldn't matter much, but
             # the pointer should never be active in View Bitmap mode.
             if self.app.has_class("view_bitmap"):
                 return
-            self.post_message(self.ToolPreviewUpdate(event))
+            if isinstance(pending, self.ToolPreviewUpdate) and not pending.handled:
+                pending.x = event.x
+                pending.y = event.y
+                return
+            self.pending_tool_update = self.ToolPreviewUpdate(event)
+        self.post_message(self.pending_tool_update)
 
     def on_mouse_up(self, event: events.MouseUp) -> None:
         """Called when a mouse button is released. Stop the current tool."""
@@ -161,6 +241,7 @@ class Canvas(Widget):
         event.x //= self.magnification
         event.y //= self.magnification
 
+        self.pending_tool_update = None
         if self.pointer_active:
             self.post_message(self.ToolStop(event))
         self.pointer_active = False
@@ -283,21 +364,63 @@ class Canvas(Widget):
         return Strip(segments, self.size.width)
 
     def refresh_scaled_region(self, region: Region) -> None:
-        """Refresh a region of the widget, scaled by the magnification."""
+        """Refresh a region of the widget, scaled by the magnification.
+
+        Regions are accumulated and refreshed together once per frame,
+        since tools can request many overlapping refreshes for a single mouse event.
+        """
         if self.magnification == 1:
-            self.refresh(region)
+            scaled_region = region
+        else:
+            # TODO: are these offsets needed? I added them because of a problem which I've fixed
+            scaled_region = Region(
+                (region.x - 1) * self.magnification,
+                (region.y - 1) * self.magnification,
+                (region.width + 2) * self.magnification,
+                (region.height + 2) * self.magnification,
+            )
+        self.refresh_request_count += 1
+        self.pending_refresh_regions.append(scaled_region)
+        self.pending_document_regions.append(region)
+        self.document_version += 1
+        if self.pending_refresh_timer is None:
+            self.pending_refresh_timer = self.set_timer(1 / MAX_FPS, self.flush_pending_refreshes, name="canvas_refresh")
+
+    def flush_pending_refreshes(self) -> None:
+        """Refresh the regions accumulated by `refresh_scaled_region`, merging overlapping/adjacent regions."""
+        self.pending_refresh_timer = None
+        if self.pending_document_regions:
+            self.post_message(self.DocumentChanged(merge_regions(self.pending_document_regions)))
+            self.pending_document_regions = []
+        if not self.pending_refresh_regions:
             return
-        # TODO: are these offsets needed? I added them because of a problem which I've fixed
-        self.refresh(Region(
-            (region.x - 1) * self.magnification,
-            (region.y - 1) * self.magnification,
-            (region.width + 2) * self.magnification,
-            (region.height + 2) * self.magnification,
-        ))
+        regions = merge_regions(self.pending_refresh_regions)
+        self.pending_refresh_regions = []
+        self.refresh_flush_count += 1
+        super().refresh(*regions)
+
+    def refresh_document(self, *, layout: bool = False) -> None:
+        """Refresh the whole canvas after the document changed as a whole, or was replaced.
+
+        Unlike `refresh`, which is also used for view changes like the grid, this tells other views to update.
+        """
+        self.pending_document_regions = []
+        self.document_version += 1
+        self.post_message(self.DocumentChanged(None))
+        self.refresh(layout=layout)
+
+    def refresh(self, *regions: Region, repaint: bool = True, layout: bool = False) -> Self:
+        """Refresh the widget. A full repaint supersedes any pending region refreshes."""
+        if repaint and not regions:
+            self.pending_refresh_regions = []
+        return super().refresh(*regions, repaint=repaint, layout=layout)
 
     def watch_magnification(self) -> None:
         """Called when magnification changes."""
         self.active_meta_glyph_font = largest_font_that_fits(self.magnification, self.magnification)
+        if self.active_meta_glyph_font:
+            # Load the glyphs now (from the cache if possible) rather than in the middle of rendering.
+            self.active_meta_glyph_font.ensure_loaded()
 
     def big_ch(self, ch: str, x: int, y: int, magnification: int) -> str:
         """Return a character part of a meta-glyph."""
@@ -0,0 +1,97 @@
+"""Notices when the file being edited is changed by another program, such as a script, another editor, or `git checkout`.
+
+A change is detected by comparing the file's modification time and size against those recorded
+when it was last opened, saved, or reloaded, so the app's own saves aren't mistaken for changes.
+If watchdog is installed, file system events trigger the comparison right away.
+Otherwise, the app polls, which only costs a `stat` call each time.
+"""
+
+from __future__ import annotations
+
+import os
+from typing import TYPE_CHECKING, Any, Callable, NamedTuple
+
+if TYPE_CHECKING:
+    from watchdog.observers.api import BaseObserver, ObservedWatch
+
+POLL_INTERVAL = 2
+"""Seconds between checks for changes to the file, when file system events aren't available."""
+
+
+class FileSignature(NamedTuple):
+    """Properties of a file that change when it's written."""
+
+    mtime_ns: int
+    """Modification time, in nanoseconds since the epoch."""
+    size: int
+    """Size in bytes."""
+
+
+def get_file_signature(file_path: str) -> FileSignature | None:
+    """Returns the modification time and size of a file, or None if it doesn't exist or can't be accessed."""
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return FileSignature(stat.st_mtime_ns, stat.st_size)
+
+
+class FileWatcher:
+    """Calls back when a file may have changed, using file system events, if watchdog is installed.
+
+    The callback is called from watchdog's thread. If `watching` is False, the file must be polled instead.
+    """
+
+    def __init__(self, on_change: Callable[[], None]) -> None:
+        """Start the file system observer, if watchdog is available."""
+        self.on_change = on_change
+        self.file_path: str | None = None
+        self.observer: BaseObserver | None = None
+        self.watch: ObservedWatch | None = None
+        try:
+            from watchdog.observers import Observer
+        except ImportError:
+            return
+        self.observer = Observer()
+        self.observer.daemon = True
+        self.observer.start()
+
+    @property
+    def watching(self) -> bool:
+        """Whether changes to the file are reported by file system events."""
+        return self.watch is not None
+
+    def watch_file(self, file_path: str | None) -> None:
+        """Watch a different file, or none."""
+        self.file_path = file_path = os.path.abspath(file_path) if file_path else None
+        if self.observer is None:
+            return
+        if self.watch is not None:
+            self.observer.unschedule(self.watch)
+            self.watch = None
+        if file_path is None:
+            return
+
+        from watchdog.events import FileSystemEvent, FileSystemEventHandler
+
+        watcher = self
+        class ChangeHandler(FileSystemEventHandler):
+            """Filters events in the folder to those affecting the watched file, including it being replaced by a rename."""
+            def on_any_event(self, event: FileSystemEvent) -> None:
+                paths: list[Any] = [event.src_path, getattr(event, "dest_path", "")]
+                if any(path and os.path.abspath(path) == watcher.file_path for path in paths):
+                    watcher.on_change()
+
+        # Watching the folder rather than the file itself catches editors that save by replacing the file.
+        try:
+            self.watch = self.observer.schedule(ChangeHandler(), os.path.dirname(file_path), recursive=False)
+        except OSError:
+            # For instance, the folder doesn't exist yet, for a new file named on the command line.
+            self.watch = None
+
+    def stop(self) -> None:
+        """Stop the file system observer."""
+        if self.observer is not None:
+            self.observer.stop()
+            self.observer = None
+            self.watch = None
@@ -16,6 +16,7 @@ from textual.widgets import Footer, Header, Static
 from textual_paint.__init__ import __version__
 from textual_paint.ansi_art_document import AnsiArtDocument
 from textual_paint.auto_restart import restart_on_changes, restart_program
+from textual_paint.sauce import split_sauce
 
 parser = argparse.ArgumentParser(description='ANSI art gallery', usage='%(prog)s [path]', prog="python -m src.textual_paint.gallery")
 parser.add_argument('path', nargs='?', default=None, help='Path to a folder containing ANSI art, or an ANSI file.')
@@ -209,10 +210,13 @@ class GalleryApp(App[None]):
     def _load_image(self, path: Path) -> None:
         """Load a file and create a gallery item for it."""
         # with open(path, "r", encoding="cp437") as f:
-        with open(path, "r", encoding="utf8") as f:
-            image = AnsiArtDocument.from_ansi(f.read())
+        with open(path, "rb") as f:
+            content, sauce = split_sauce(f.read())
+        image = AnsiArtDocument.decode_format("ANSI", content, width=sauce.width if sauce else 0)
 
-        gallery_item = GalleryItem(image, caption=path.name)
+        # Show the title and author from SAUCE metadata, if any.
+        caption = " - ".join(part for part in (path.name, sauce and sauce.title, sauce and sauce.author) if part)
+        gallery_item = GalleryItem(image, caption=caption)
         self.container.mount(gallery_item)
         item_index = self.paths.index(path)
         # gallery_item.styles.opacity = 1.0 if item_index == self.path_index else 0.0
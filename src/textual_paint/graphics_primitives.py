@@ -1,6 +1,9 @@
 """Drawing utilities for use with the AnsiArtDocument class."""
 
-from typing import TYPE_CHECKING, Iterator
+from enum import Enum
+from functools import lru_cache
+from math import floor
+from typing import TYPE_CHECKING, Callable, Iterable, Iterator
 
 from rich.color import Color
 from rich.style import Style
@@ -72,20 +75,61 @@ def is_inside_polygon(x: int, y: int, points: list[Offset]) -> bool:
         p1x, p1y = p2x, p2y
     return inside
 
-# def polygon_fill(points: list[Offset]) -> Iterator[tuple[int, int]]:
-#     """Yields points inside a polygon."""
+def polygon_spans(points: list[Offset], clip: Region) -> dict[int, list[tuple[int, int]]]:
+    """Returns the cells inside a polygon, as sorted spans of (x_start, x_end) per row, with x_end exclusive.
 
-#     # Find the bounding box
-#     min_x = min(points, key=lambda p: p[0])[0]
-#     min_y = min(points, key=lambda p: p[1])[1]
-#     max_x = max(points, key=lambda p: p[0])[0]
-#     max_y = max(points, key=lambda p: p[1])[1]
-
-#     # Check each point in the bounding box, and yield any points that are inside the polygon
-#     for x in range(min_x, max_x + 1):
-#         for y in range(min_y, max_y + 1):
-#             if is_inside_polygon(x, y, points):
-#                 yield x, y
+    Uses the even-odd rule, matching `is_inside_polygon` cell for cell,
+    but with a scanline over an edge table, so it's O(edges + area) rather than O(area * edges).
+    Only cells within `clip` are included.
+    """
+    # Bucket edges by the first row they cross. Like in `is_inside_polygon`,
+    # an edge crosses row y if min_y < y <= max_y, so horizontal edges never count.
+    edges_by_row: dict[int, list[tuple[int, int, int, int]]] = {}
+    n = len(points)
+    for i in range(n):
+        x1, y1 = points[i]
+        x2, y2 = points[(i + 1) % n]
+        if y1 != y2:
+            edges_by_row.setdefault(min(y1, y2) + 1, []).append((x1, y1, x2, y2))
+    rows: dict[int, list[tuple[int, int]]] = {}
+    if not edges_by_row:
+        return rows
+    # Start at the clip's top, if it's below the polygon's top, including edges from rows above.
+    first_y = max(min(edges_by_row), clip.y)
+    active: list[tuple[int, int, int, int]] = []
+    for row in [row for row in edges_by_row if row <= first_y]:
+        active.extend(edges_by_row.pop(row))
+    end_y = min(max(p.y for p in points) + 1, clip.bottom)
+    for y in range(first_y, end_y):
+        active.extend(edges_by_row.pop(y, ()))
+        active = [edge for edge in active if max(edge[1], edge[3]) >= y]
+        if not active:
+            continue
+        crossings = sorted(
+            ((y - y1) * (x2 - x1) / (y2 - y1) + x1 for x1, y1, x2, y2 in active),
+            reverse=True,
+        )
+        # A cell is inside if an odd number of crossings are at or to the right of it,
+        # i.e. within (crossings[1], crossings[0]], (crossings[3], crossings[2]], etc.
+        row_spans: list[tuple[int, int]] = []
+        for i in range(0, len(crossings) - 1, 2):
+            x_start = max(floor(crossings[i + 1]) + 1, clip.x)
+            x_end = min(floor(crossings[i]) + 1, clip.right)
+            if x_start < x_end:
+                row_spans.append((x_start, x_end))
+        if row_spans:
+            row_spans.reverse()
+            rows[y] = row_spans
+    return rows
+
+def polygon_mask(points: list[Offset], region: Region) -> list[list[bool]]:
+    """Returns a mask of the cells inside a polygon, within the given region, using the even-odd rule."""
+    mask = [[False] * region.width for _ in range(region.height)]
+    for y, row_spans in polygon_spans(points, region).items():
+        mask_row = mask[y - region.y]
+        for x_start, x_end in row_spans:
+            mask_row[x_start - region.x:x_end - region.x] = [True] * (x_end - x_start)
+    return mask
 
 # adapted from https://github.com/Pomax/bezierjs
 def compute_bezier(t: float, start_x: float, start_y: float, control_1_x: float, control_1_y: float, control_2_x: float, control_2_y: float, end_x: float, end_y: float) -> tuple[float, float]:
@@ -104,24 +148,70 @@ def compute_bezier(t: float, start_x: float, start_y: float, control_1_x: float,
         a * start_y + b * control_1_y + c * control_2_y + d * end_y,
     )
 
-# It's possible to walk a bezier curve more correctly,
-# but is it possible to tell the difference?
 def bezier_curve_walk(start_x: float, start_y: float, control_1_x: float, control_1_y: float, control_2_x: float, control_2_y: float, end_x: float, end_y: float) -> Iterator[tuple[int, int]]:
-    """Yields points along a bezier curve."""
-    steps = 100
-    point_a = (start_x, start_y)
-    # TypeError: 'float' object cannot be interpreted as an integer
-    # for t in range(0, 1, 1 / steps):
-    for i in range(steps):
-        t = i / steps
-        point_b = compute_bezier(t, start_x, start_y, control_1_x, control_1_y, control_2_x, control_2_y, end_x, end_y)
-        yield from bresenham_walk(int(point_a[0]), int(point_a[1]), int(point_b[0]), int(point_b[1]))
-        point_a = point_b
+    """Yields points along a bezier curve, without gaps or repeated points."""
+    yield from bezier_curve_cells(start_x, start_y, control_1_x, control_1_y, control_2_x, control_2_y, end_x, end_y)
 
 def quadratic_curve_walk(start_x: float, start_y: float, control_x: float, control_y: float, end_x: float, end_y: float) -> Iterator[tuple[int, int]]:
     """Yields points along a quadratic curve."""
     return bezier_curve_walk(start_x, start_y, control_x, control_y, control_x, control_y, end_x, end_y)
 
+BEZIER_FLATNESS = 0.25
+"""How far, in cells, a curve segment may stray from a straight line before it's subdivided."""
+BEZIER_MAX_DEPTH = 16
+"""Limit on subdivision, for degenerate input."""
+
+@lru_cache(maxsize=32)
+def bezier_curve_cells(start_x: float, start_y: float, control_1_x: float, control_1_y: float, control_2_x: float, control_2_y: float, end_x: float, end_y: float) -> tuple[tuple[int, int], ...]:
+    """Returns the cells along a bezier curve, in order, without gaps or repeated cells.
+
+    The curve is subdivided adaptively until each piece is within `BEZIER_FLATNESS` of a straight line,
+    so short curves take few steps and long curves don't skip cells, and the pieces are joined with lines.
+    Results are cached, since previews redraw the same curve repeatedly.
+    """
+    vertices: list[tuple[int, int]] = [(floor(start_x + 0.5), floor(start_y + 0.5))]
+    # Depth-first, with the first half on top of the stack, to output vertices in order.
+    stack = [(start_x, start_y, control_1_x, control_1_y, control_2_x, control_2_y, end_x, end_y, 0)]
+    while stack:
+        x0, y0, x1, y1, x2, y2, x3, y3, depth = stack.pop()
+        if depth >= BEZIER_MAX_DEPTH or bezier_is_flat(x0, y0, x1, y1, x2, y2, x3, y3):
+            vertex = (floor(x3 + 0.5), floor(y3 + 0.5))
+            if vertex != vertices[-1]:
+                vertices.append(vertex)
+            continue
+        # De Casteljau subdivision at t = 0.5
+        x01, y01 = (x0 + x1) / 2, (y0 + y1) / 2
+        x12, y12 = (x1 + x2) / 2, (y1 + y2) / 2
+        x23, y23 = (x2 + x3) / 2, (y2 + y3) / 2
+        x012, y012 = (x01 + x12) / 2, (y01 + y12) / 2
+        x123, y123 = (x12 + x23) / 2, (y12 + y23) / 2
+        xm, ym = (x012 + x123) / 2, (y012 + y123) / 2
+        stack.append((xm, ym, x123, y123, x23, y23, x3, y3, depth + 1))
+        stack.append((x0, y0, x01, y01, x012, y012, xm, ym, depth + 1))
+
+    cells: list[tuple[int, int]] = [vertices[0]]
+    for (ax, ay), (bx, by) in zip(vertices, vertices[1:]):
+        for cell in bresenham_walk(ax, ay, bx, by):
+            if cell != cells[-1]:
+                cells.append(cell)
+    return tuple(cells)
+
+def bezier_is_flat(x0: float, y0: float, x1: float, y1: float, x2: float, y2: float, x3: float, y3: float) -> bool:
+    """Returns True if the control points of a bezier curve are within `BEZIER_FLATNESS` of the line between its endpoints."""
+    dx = x3 - x0
+    dy = y3 - y0
+    length_squared = dx * dx + dy * dy
+    if length_squared == 0:
+        return max(abs(x1 - x0), abs(y1 - y0), abs(x2 - x0), abs(y2 - y0)) <= BEZIER_FLATNESS
+    # Control points must not extend past the endpoints, as in a cusp along a straight line.
+    for x, y in ((x1, y1), (x2, y2)):
+        if not (min(x0, x3) - BEZIER_FLATNESS <= x <= max(x0, x3) + BEZIER_FLATNESS and min(y0, y3) - BEZIER_FLATNESS <= y <= max(y0, y3) + BEZIER_FLATNESS):
+            return False
+    # Distance from a point to the line is |cross product| / length; compare squared to avoid sqrt.
+    d1 = (x1 - x0) * dy - (y1 - y0) * dx
+    d2 = (x2 - x0) * dy - (y2 - y0) * dx
+    return max(d1 * d1, d2 * d2) <= BEZIER_FLATNESS * BEZIER_FLATNESS * length_squared
+
 def midpoint_ellipse(xc: int, yc: int, rx: int, ry: int) -> Iterator[tuple[int, int]]:
     """Midpoint ellipse drawing algorithm. Yields points out of order, and thus can't legally be called a "walk", except in Britain."""
     # Source: https://www.geeksforgeeks.org/midpoint-ellipse-drawing-algorithm/
@@ -182,65 +272,254 @@ def midpoint_ellipse(xc: int, yc: int, rx: int, ry: int) -> Iterator[tuple[int,
             dy = dy - (2 * rx * rx)
             d2 = d2 + dx - dy + (rx * rx)
 
-def flood_fill(document: 'AnsiArtDocument', x: int, y: int, fill_ch: str, fill_fg: str, fill_bg: str) -> Region|None:
-    """Flood fill algorithm."""
+class FillMode(Enum):
+    """How a shape is drawn, like the options for shape tools in MS Paint."""
+    outline = 1
+    outline_fill = 2
+    fill = 3
+
+class BrushShape(Enum):
+    """The shape of a brush's tip."""
+    round = 1
+    square = 2
+    slash = 3
+    backslash = 4
+
+@lru_cache(maxsize=None)
+def brush_offsets(diameter: int, shape: BrushShape = BrushShape.round) -> tuple[tuple[int, int], ...]:
+    """Returns the cell offsets covered by a brush, relative to its center. Cached per brush."""
+    radius = diameter // 2
+    offsets: list[tuple[int, int]] = []
+    for j in range(diameter):
+        for i in range(diameter):
+            dx = i - radius
+            dy = j - radius
+            if (
+                shape == BrushShape.square or
+                (shape == BrushShape.round and dx ** 2 + dy ** 2 <= radius ** 2) or
+                (shape == BrushShape.slash and dx == -dy) or
+                (shape == BrushShape.backslash and dx == dy)
+            ):
+                offsets.append((dx, dy))
+    return tuple(offsets)
+
+@lru_cache(maxsize=None)
+def brush_spans(diameter: int, shape: BrushShape = BrushShape.round) -> tuple[tuple[int, int, int], ...]:
+    """Returns the brush as horizontal spans of (dy, dx_start, dx_end), with dx_end exclusive. Cached per brush."""
+    spans: list[tuple[int, int, int]] = []
+    for dx, dy in brush_offsets(diameter, shape):
+        # Offsets are ordered by row, then column.
+        if spans and spans[-1][0] == dy and spans[-1][2] == dx:
+            spans[-1] = (dy, spans[-1][1], dx + 1)
+        else:
+            spans.append((dy, dx, dx + 1))
+    return tuple(spans)
+
+def stroke_spans(points: Iterable[tuple[int, int]], spans: tuple[tuple[int, int, int], ...], width: int, height: int) -> dict[int, list[tuple[int, int]]]:
+    """Returns the cells covered by stamping a brush at each point, as merged spans per row, within the given bounds.
+
+    Maps each row to a sorted list of non-overlapping (x_start, x_end) spans, with x_end exclusive.
+    This is cheaper than `stroke_cells` for large brushes, since overlapping stamps are merged per span rather than per cell.
+    """
+    rows: dict[int, list[tuple[int, int]]] = {}
+    for x, y in points:
+        for dy, dx_start, dx_end in spans:
+            row = y + dy
+            if 0 <= row < height:
+                x_start = max(x + dx_start, 0)
+                x_end = min(x + dx_end, width)
+                if x_start < x_end:
+                    rows.setdefault(row, []).append((x_start, x_end))
+    for row, row_spans in rows.items():
+        rows[row] = merge_spans(row_spans)
+    return rows
+
+def merge_spans(row_spans: list[tuple[int, int]]) -> list[tuple[int, int]]:
+    """Sorts and merges overlapping or adjacent (x_start, x_end) spans of a row."""
+    row_spans = sorted(row_spans)
+    merged = [row_spans[0]]
+    for x_start, x_end in row_spans[1:]:
+        if x_start <= merged[-1][1]:
+            if x_end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], x_end)
+        else:
+            merged.append((x_start, x_end))
+    return merged
+
+def union_spans(*span_rows: dict[int, list[tuple[int, int]]]) -> dict[int, list[tuple[int, int]]]:
+    """Combines spans per row, as from `stroke_spans`, covering the cells covered by any of them."""
+    rows: dict[int, list[tuple[int, int]]] = {}
+    for other_rows in span_rows:
+        for row, row_spans in other_rows.items():
+            rows.setdefault(row, []).extend(row_spans)
+    return {row: merge_spans(row_spans) for row, row_spans in rows.items()}
+
+def outline_fill_spans(points: Iterable[tuple[int, int]], width: int, height: int) -> dict[int, list[tuple[int, int]]]:
+    """Returns spans filling a convex outline, from the leftmost to the rightmost point of each row, within the given bounds.
+
+    This works for shapes where each row crosses the outline at most twice, like rectangles and ellipses,
+    and costs O(perimeter) rather than O(area).
+    """
+    extents: dict[int, tuple[int, int]] = {}
+    for x, y in points:
+        if y in extents:
+            min_x, max_x = extents[y]
+            if x < min_x:
+                extents[y] = (x, max_x)
+            elif x > max_x:
+                extents[y] = (min_x, x)
+        else:
+            extents[y] = (x, x)
+    rows: dict[int, list[tuple[int, int]]] = {}
+    for y, (min_x, max_x) in extents.items():
+        if 0 <= y < height:
+            x_start = max(min_x, 0)
+            x_end = min(max_x + 1, width)
+            if x_start < x_end:
+                rows[y] = [(x_start, x_end)]
+    return rows
+
+def spans_region(rows: dict[int, list[tuple[int, int]]]) -> Region:
+    """Returns the bounding region of spans from `stroke_spans`."""
+    if not rows:
+        return Region()
+    min_x = min(row_spans[0][0] for row_spans in rows.values())
+    max_x = max(row_spans[-1][1] for row_spans in rows.values())
+    return Region(min_x, min(rows), max_x - min_x, max(rows) - min(rows) + 1)
+
+def stroke_cells(points: Iterable[tuple[int, int]], offsets: tuple[tuple[int, int], ...], width: int, height: int) -> dict[tuple[int, int], int]:
+    """Returns the cells covered by stamping a brush at each point, within the given bounds.
+
+    Each cell appears once, mapped to the number of stamps that covered it,
+    so that overlapping stamps along a stroke can be written once.
+    """
+    cells: dict[tuple[int, int], int] = {}
+    get = cells.get
+    for x, y in points:
+        for dx, dy in offsets:
+            cell_x = x + dx
+            cell_y = y + dy
+            if 0 <= cell_x < width and 0 <= cell_y < height:
+                cell = (cell_x, cell_y)
+                cells[cell] = get(cell, 0) + 1
+    return cells
+
+def cells_region_and_mask(cells: Iterable[tuple[int, int]]) -> tuple[Region, list[list[bool]]]:
+    """Returns the bounding region of the given cells, and a mask of the cells relative to the region."""
+    cells = list(cells)
+    if not cells:
+        return Region(), []
+    min_x = min(x for x, _ in cells)
+    max_x = max(x for x, _ in cells)
+    min_y = min(y for _, y in cells)
+    max_y = max(y for _, y in cells)
+    region = Region(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)
+    mask = [[False] * region.width for _ in range(region.height)]
+    for x, y in cells:
+        mask[y - min_y][x - min_x] = True
+    return region, mask
+
+def pack_color(color: Color) -> int:
+    """Returns the color as a 24-bit integer, for fast comparisons."""
+    red, green, blue = color.get_truecolor()
+    return (red << 16) | (green << 8) | blue
+
+def packed_colors_match(a: int, b: int, tolerance: int) -> bool:
+    """Returns true if each channel of the packed colors differs by at most `tolerance`."""
+    if a == b:
+        return True
+    return (
+        abs((a >> 16) - (b >> 16)) <= tolerance and
+        abs(((a >> 8) & 0xff) - ((b >> 8) & 0xff)) <= tolerance and
+        abs((a & 0xff) - (b & 0xff)) <= tolerance
+    )
+
+def flood_fill(
+    document: 'AnsiArtDocument', x: int, y: int, fill_ch: str, fill_fg: str, fill_bg: str, tolerance: int = 4,
+    before_fill: Callable[[Region, list[list[bool]]], None] | None = None,
+) -> tuple[Region, list[list[bool]]]|None:
+    """Flood fill algorithm.
+
+    Replaces the contiguous area of cells matching the cell at (x, y).
+    Colors match if each channel differs by at most `tolerance`.
+    `before_fill` is called with the region and mask before any cells are changed, so they can be saved for undo.
+
+    Returns the affected region and a mask of the filled cells within it, or None if nothing was filled.
+    """
 
     fill_style = Style(color=fill_fg, bgcolor=fill_bg)
+    assert fill_style.color is not None
+    assert fill_style.bgcolor is not None
+    fill_fg_key = pack_color(fill_style.color)
+    fill_bg_key = pack_color(fill_style.bgcolor)
 
     # Get the original value of the cell.
     # This is the color to be replaced.
     original_style = document.st[y][x]
     original_ch = document.ch[y][x]
+    assert original_style.color is not None
+    assert original_style.bgcolor is not None
+    original_fg_key = pack_color(original_style.color)
+    original_bg_key = pack_color(original_style.bgcolor)
 
-    # Track the region affected by the fill.
-    min_x = x
-    min_y = y
-    max_x = x
-    max_y = y
+    # Whether a cell can be filled depends only on its character and style,
+    # and documents tend to reuse a handful of styles, so decide once per combination.
+    fillable_by_cell: dict[tuple[str, Style], bool] = {}
 
-    def colors_match(a: Color, b: Color) -> bool:
-        # Use color comparison instead of string comparison because "#000000" != "rgb(0,0,0)"
-        # and Color("#000000") != Color("rgb(0,0,0)").
-        threshold = 5
-        assert a.triplet is not None
-        assert b.triplet is not None
-        return all(abs(a.triplet[i] - b.triplet[i]) < threshold for i in range(3))
+    def cell_is_fillable(ch: str, style: Style) -> bool:
+        """Returns true if a cell with the given character and style matches the cell to be replaced.
 
-    def inside(x: int, y: int) -> bool:
-        """Returns true if the cell at the given coordinates matches the color to be replaced.
-        
         Ignores foreground color if character is a space, since spaces are transparent.
 
         Compares colors numerically, since names can differ, e.g. "rgb(0,0,0)" != "#000000"
         and Color("rgb(0,0,0)") != Color("#000000").
         """
-        if x < 0 or x >= document.width or y < 0 or y >= document.height:
+        if ch != original_ch:
             return False
-
-        bgcolor = document.st[y][x].bgcolor
-        color = document.st[y][x].color
-        assert bgcolor is not None
-        assert color is not None
-        assert original_style.bgcolor is not None
-        assert original_style.color is not None
-        assert fill_style.color is not None
-        assert fill_style.bgcolor is not None
+        assert style.color is not None
+        assert style.bgcolor is not None
+        fg_key = pack_color(style.color)
+        bg_key = pack_color(style.bgcolor)
         return (
-            document.ch[y][x] == original_ch and
-            colors_match(bgcolor, original_style.bgcolor) and
-            (original_ch == " " or colors_match(color, original_style.color)) and
-            (document.ch[y][x] != fill_ch or (not colors_match(bgcolor, fill_style.bgcolor)) or (not colors_match(color, fill_style.color)))
+            packed_colors_match(bg_key, original_bg_key, tolerance) and
+            (original_ch == " " or packed_colors_match(fg_key, original_fg_key, tolerance)) and
+            # Avoid an infinite loop (and a no-op) when the fill matches the original.
+            (ch != fill_ch or not packed_colors_match(bg_key, fill_bg_key, tolerance) or not packed_colors_match(fg_key, fill_fg_key, tolerance))
         )
 
+    width = document.width
+    height = document.height
+    # Flat array of cells that remain to be filled. Rows are computed when first reached,
+    # so that a small fill in a large document doesn't need to look at every cell.
+    fillable = bytearray(width * height)
+    row_computed = bytearray(height)
+
+    def compute_row(y: int) -> None:
+        """Computes which cells in the row can be filled."""
+        row_computed[y] = 1
+        offset = y * width
+        for x, key in enumerate(zip(document.ch[y], document.st[y])):
+            is_fillable = fillable_by_cell.get(key)
+            if is_fillable is None:
+                is_fillable = fillable_by_cell[key] = cell_is_fillable(*key)
+            if is_fillable:
+                fillable[offset + x] = 1
+
+    def inside(x: int, y: int) -> bool:
+        """Returns true if the cell at the given coordinates is yet to be filled."""
+        if x < 0 or x >= width or y < 0 or y >= height:
+            return False
+        if not row_computed[y]:
+            compute_row(y)
+        return fillable[y * width + x] == 1
+
+    filled: list[int] = []
+
     def set_cell(x: int, y: int) -> None:
-        """Sets the cell at the given coordinates to the fill color, and updates the region bounds."""
-        document.ch[y][x] = fill_ch
-        document.st[y][x] = fill_style
-        nonlocal min_x, min_y, max_x, max_y
-        min_x = min(min_x, x)
-        min_y = min(min_y, y)
-        max_x = max(max_x, x)
-        max_y = max(max_y, y)
+        """Marks the cell at the given coordinates as filled."""
+        index = y * width + x
+        fillable[index] = 0
+        filled.append(index)
 
     # Simple translation of the "final, combined-scan-and-fill span filler"
     # pseudo-code from https://en.wikipedia.org/wiki/Flood_fill
@@ -260,13 +539,36 @@ def flood_fill(document: 'AnsiArtDocument', x: int, y: int, fill_ch: str, fill_f
             while inside(x1, y):
                 set_cell(x1, y)
                 x1 = x1 + 1
+            # Queue each span once, rather than once per cell filled.
+            if x1 > x:
                 stack.append((x, x1 - 1, y+dy, dy))
-                if x1 - 1 > x2:
-                    stack.append((x2 + 1, x1 - 1, y-dy, -dy))
+            if x1 - 1 > x2:
+                stack.append((x2 + 1, x1 - 1, y-dy, -dy))
             x1 = x1 + 1
             while x1 < x2 and not inside(x1, y):
                 x1 = x1 + 1
             x = x1
 
-    # Return the affected region.
-    return Region(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)
+    # Find the affected region, and the mask of filled cells relative to it.
+    min_x = min_y = max(width, height)
+    max_x = max_y = 0
+    for index in filled:
+        y, x = divmod(index, width)
+        min_x = min(min_x, x)
+        max_x = max(max_x, x)
+        min_y = min(min_y, y)
+        max_y = max(max_y, y)
+    region = Region(min_x, min_y, max_x - min_x + 1, max_y - min_y + 1)
+    mask = [[False] * region.width for _ in range(region.height)]
+    for index in filled:
+        y, x = divmod(index, width)
+        mask[y - min_y][x - min_x] = True
+    if before_fill:
+        before_fill(region, mask)
+
+    # Apply the fill to the document.
+    for index in filled:
+        y, x = divmod(index, width)
+        document.ch[y][x] = fill_ch
+        document.st[y][x] = fill_style
+    return region, mask
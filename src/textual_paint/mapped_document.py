@@ -0,0 +1,236 @@
+"""Memory-mapped storage for documents too large to comfortably hold every cell as Python objects.
+
+Cells are stored as fixed-width records in a scratch file: for each row, the character index of each cell,
+followed by the style index of each cell, as uint32, referring to tables of distinct characters and styles kept in memory.
+Rows are materialized as lists when accessed, and only a limited number are kept resident.
+When a row is evicted, it's written back to the file, so edits are kept.
+"""
+
+import mmap
+import struct
+import sys
+import tempfile
+import zlib
+from array import array
+from collections import OrderedDict
+from typing import IO, Iterator, overload
+
+from rich.style import Style
+
+from textual_paint.ansi_art_document import (NATIVE_HEADER, AnsiArtDocument,
+                                             parse_native_header,
+                                             parse_native_tables)
+
+MAPPED_DOCUMENT_MIN_CELLS = 1000000
+"""Native documents with at least this many cells are opened memory-mapped, rather than loaded fully into memory."""
+RESIDENT_ROWS = 1024
+"""Default number of rows to keep materialized at once."""
+COPY_BLOCK_SIZE = 1024 * 1024
+"""Bytes of cell records to copy at a time, when copying a document."""
+
+
+class MappedCells:
+    """Cells of a document, stored in a memory-mapped file, with recently used rows materialized as lists."""
+
+    def __init__(self, width: int, height: int, chars: list[str], styles: list[Style], file: IO[bytes], resident_rows: int = RESIDENT_ROWS) -> None:
+        """Initialize the store from a file of `width * height` cell records."""
+        self.width = width
+        self.height = height
+        self.chars = chars
+        """Table of distinct characters, indexed by the cell records."""
+        self.char_indices = {ch: index for index, ch in enumerate(chars)}
+        self.styles = styles
+        """Table of distinct styles, indexed by the cell records."""
+        self.style_indices = {style: index for index, style in enumerate(styles)}
+        self.file = file
+        self.map = mmap.mmap(file.fileno(), 0) if width * height else None
+        self.row_size = width * 2 * 4
+        self.resident_rows = resident_rows
+        self.resident: OrderedDict[int, tuple[list[str], list[Style]]] = OrderedDict()
+        """Materialized rows, least recently used first."""
+
+    def row(self, y: int) -> tuple[list[str], list[Style]]:
+        """Returns the characters and styles of a row, materializing it if needed."""
+        entry = self.resident.get(y)
+        if entry is not None:
+            self.resident.move_to_end(y)
+            return entry
+        if not 0 <= y < self.height:
+            raise IndexError("row index out of range")
+        entry = self.read_row(y)
+        self.resident[y] = entry
+        if len(self.resident) > self.resident_rows:
+            self.write_row(*self.resident.popitem(last=False))
+        return entry
+
+    def replace_row(self, y: int, plane: int, row: list[str] | list[Style]) -> None:
+        """Replace the characters (plane 0) or styles (plane 1) of a row."""
+        ch_row, st_row = self.row(y)
+        self.resident[y] = (row, st_row) if plane == 0 else (ch_row, row)  # type: ignore
+
+    def read_row(self, y: int) -> tuple[list[str], list[Style]]:
+        """Materialize a row from the file."""
+        assert self.map is not None
+        indices = array("I")
+        indices.frombytes(self.map[y * self.row_size:(y + 1) * self.row_size])
+        if sys.byteorder == "big":
+            indices.byteswap()
+        return [self.chars[index] for index in indices[:self.width]], [self.styles[index] for index in indices[self.width:]]
+
+    def write_row(self, y: int, entry: tuple[list[str], list[Style]]) -> None:
+        """Write a row back to the file, adding any new characters or styles to the tables."""
+        assert self.map is not None
+        ch_row, st_row = entry
+        indices = array("I", [self.intern_char(ch) for ch in ch_row])
+        indices.extend(array("I", [self.intern_style(style) for style in st_row]))
+        if sys.byteorder == "big":
+            indices.byteswap()
+        self.map[y * self.row_size:(y + 1) * self.row_size] = indices.tobytes()
+
+    def intern_char(self, ch: str) -> int:
+        """Returns the index of a character in the table, adding it if needed."""
+        index = self.char_indices.get(ch)
+        if index is None:
+            index = self.char_indices[ch] = len(self.chars)
+            self.chars.append(ch)
+        return index
+
+    def intern_style(self, style: Style) -> int:
+        """Returns the index of a style in the table, adding it if needed."""
+        index = self.style_indices.get(style)
+        if index is None:
+            index = self.style_indices[style] = len(self.styles)
+            self.styles.append(style)
+        return index
+
+    def copy(self) -> "MappedCells":
+        """Returns an independent copy of the cells, copying the file a block at a time rather than materializing rows."""
+        for y, entry in self.resident.items():
+            self.write_row(y, entry)
+        scratch = tempfile.TemporaryFile()
+        if self.map is not None:
+            for offset in range(0, len(self.map), COPY_BLOCK_SIZE):
+                scratch.write(self.map[offset:offset + COPY_BLOCK_SIZE])
+            scratch.flush()
+        return MappedCells(self.width, self.height, list(self.chars), list(self.styles), scratch, self.resident_rows)
+
+    def close(self) -> None:
+        """Release the memory map and delete the scratch file."""
+        self.resident.clear()
+        if self.map is not None:
+            self.map.close()
+        self.file.close()
+
+
+class MappedRows:
+    """The `ch` or `st` grid of a memory-mapped document, as a sequence of rows."""
+
+    def __init__(self, cells: MappedCells, plane: int) -> None:
+        """Initialize a view of the characters (plane 0) or styles (plane 1) of the cells."""
+        self.cells = cells
+        self.plane = plane
+
+    def __len__(self) -> int:
+        return self.cells.height
+
+    @overload
+    def __getitem__(self, index: int) -> list[str] | list[Style]: ...
+    @overload
+    def __getitem__(self, index: slice) -> list[list[str] | list[Style]]: ...
+    def __getitem__(self, index: int | slice) -> list[str] | list[Style] | list[list[str] | list[Style]]:
+        if isinstance(index, slice):
+            return [self[y] for y in range(*index.indices(self.cells.height))]
+        if index < 0:
+            index += self.cells.height
+        return self.cells.row(index)[self.plane]
+
+    def __setitem__(self, index: int, row: list[str] | list[Style]) -> None:
+        if index < 0:
+            index += self.cells.height
+        self.cells.replace_row(index, self.plane, row)
+
+    def __iter__(self) -> Iterator[list[str] | list[Style]]:
+        for y in range(self.cells.height):
+            yield self[y]
+
+
+def is_mapped(document: AnsiArtDocument) -> bool:
+    """Returns whether the document's cells are memory-mapped, rather than all in memory."""
+    return isinstance(document.ch, MappedRows)
+
+
+def mapped_document(cells: MappedCells) -> AnsiArtDocument:
+    """Create a document backed by memory-mapped cells."""
+    document = AnsiArtDocument(cells.width, 0)
+    document.height = cells.height
+    document.ch = MappedRows(cells, 0)  # type: ignore
+    document.st = MappedRows(cells, 1)  # type: ignore
+    return document
+
+
+def copy_mapped(document: AnsiArtDocument) -> AnsiArtDocument:
+    """Copy a memory-mapped document without loading it into memory. Close the copy with `close_mapped` when done."""
+    assert isinstance(document.ch, MappedRows), "Expected a memory-mapped document"
+    return mapped_document(document.ch.cells.copy())
+
+
+def close_mapped(document: AnsiArtDocument) -> None:
+    """Release the memory map and scratch file of a document, if it's memory-mapped. The document can't be used afterward."""
+    if isinstance(document.ch, MappedRows):
+        document.ch.cells.close()
+
+
+def read_native_size(file_path: str) -> tuple[int, int]:
+    """Returns the width and height of a document in the native format, reading only its header."""
+    with open(file_path, "rb") as f:
+        header = parse_native_header(f.read(NATIVE_HEADER.size))
+    return header.width, header.height
+
+
+def open_native_mapped(file_path: str, resident_rows: int = RESIDENT_ROWS) -> AnsiArtDocument:
+    """Open a document in the native format, memory-mapped, decompressing it into a scratch file a chunk at a time.
+
+    Raises ValueError if the file is not in the native format, or is corrupted.
+    """
+    with open(file_path, "rb") as f:
+        header = parse_native_header(f.read(NATIVE_HEADER.size))
+        width, height = header.width, header.height
+        try:
+            chunk_lengths = struct.unpack(f"<{header.chunk_count}I", f.read(4 * header.chunk_count))
+        except struct.error as e:
+            raise ValueError("Textual Paint document is corrupted.") from e
+        chars, styles, sauce = parse_native_tables(f.read(header.tables_length))
+        scratch = tempfile.TemporaryFile()
+        try:
+            for chunk_index, chunk_length in enumerate(chunk_lengths):
+                chunk_start = chunk_index * header.rows_per_chunk
+                rows = min(header.rows_per_chunk, height - chunk_start)
+                indices = array(header.typecode)
+                indices.frombytes(zlib.decompress(f.read(chunk_length)))
+                if sys.byteorder == "big":
+                    indices.byteswap()
+                plane_size = rows * width
+                if rows <= 0 or len(indices) != plane_size * 2 or (
+                    plane_size and (max(indices[:plane_size]) >= len(chars) or max(indices[plane_size:]) >= len(styles))
+                ):
+                    raise ValueError("Textual Paint document is corrupted.")
+                records = array("I")
+                for row in range(rows):
+                    records.fromlist(indices[row * width:(row + 1) * width].tolist())
+                    records.fromlist(indices[plane_size + row * width:plane_size + (row + 1) * width].tolist())
+                if sys.byteorder == "big":
+                    records.byteswap()
+                scratch.write(records.tobytes())
+            if scratch.tell() != width * height * 2 * 4:
+                raise ValueError("Textual Paint document is corrupted.")
+            scratch.flush()
+            cells = MappedCells(width, height, chars, styles, scratch, resident_rows)
+        except zlib.error as e:
+            scratch.close()
+            raise ValueError("Textual Paint document is corrupted.") from e
+        except Exception:
+            scratch.close()
+            raise
+    document = mapped_document(cells)
+    document.sauce = sauce
+    return document
@@ -1,18 +1,27 @@
 """Drawing large text characters with smaller characters."""
 
+import json
 import os
 
-from pyfiglet import Figlet, FigletFont  # type: ignore
+from textual_paint.wallpaper import get_cache_dir
+
+GLYPH_CACHE_VERSION = 1
+"""Increment when changing the glyph cache format, or how glyphs are rendered, to invalidate existing caches."""
 
 
 class MetaGlyphFont:
-    """A font where each character is drawn with sub-characters."""
+    """A font where each character is drawn with sub-characters.
+
+    Glyphs are loaded lazily, the first time they're needed, since most users never zoom in.
+    Rendered glyphs are cached in the user cache directory, so FIGlet parsing only happens
+    when the font file changes.
+    """
 
     def __init__(self, file_path: str, width: int, height: int, covered_characters: str):
         self.file_path = file_path
         """The path to the font file."""
-        self.glyphs: dict[str, list[str]] = {}
-        """Maps characters to meta-glyphs, where each meta-glyph is a list of rows of characters."""
+        self._glyphs: dict[str, list[str]] | None = None
+        """Maps characters to meta-glyphs, or None if not loaded yet."""
         self.width = width
         """The width in characters of a meta-glyph."""
         self.height = height
@@ -24,15 +33,70 @@ class MetaGlyphFont:
         for ch in " ░▒▓██▔🮂🮃▀🮄🮅🮆▇▆▅▄▃▂▁▏▎▍▌▋▊▉███🮋🮊🮉▐🮈🮇▕":
             self.covered_characters = self.covered_characters.replace(ch, "")
 
-        self.load()
+    @property
+    def glyphs(self) -> dict[str, list[str]]:
+        """Maps characters to meta-glyphs, where each meta-glyph is a list of rows of characters."""
+        return self.ensure_loaded()
+
+    def ensure_loaded(self) -> dict[str, list[str]]:
+        """Load the glyphs if they aren't loaded yet, from the cache if it's up to date, and return them."""
+        if self._glyphs is None:
+            self._glyphs = self.load_cached()
+            if self._glyphs is None:
+                self._glyphs = self.load()
+                self.save_cache(self._glyphs)
+        return self._glyphs
+
+    def get_cache_file_path(self) -> str:
+        """Returns the path to the compiled glyph table for this font."""
+        file_name = os.path.splitext(os.path.basename(self.file_path))[0] + ".json"
+        return os.path.join(get_cache_dir("textual-paint"), "meta_glyph_fonts", file_name)
 
-    def load(self):
+    def get_cache_key(self) -> dict[str, object]:
+        """Returns the information that must match for the cached glyph table to be valid."""
+        stat = os.stat(self.file_path)
+        return {
+            "version": GLYPH_CACHE_VERSION,
+            "source_mtime_ns": stat.st_mtime_ns,
+            "source_size": stat.st_size,
+            "covered_characters": self.covered_characters,
+        }
+
+    def load_cached(self) -> dict[str, list[str]] | None:
+        """Load the glyphs from the cache, if it's up to date with the font file."""
+        try:
+            with open(self.get_cache_file_path(), encoding="utf-8") as f:
+                cache = json.load(f)
+            if cache["key"] != self.get_cache_key():
+                return None
+            return {char: lines for char, lines in cache["glyphs"].items()}
+        except (OSError, ValueError, KeyError, TypeError, AttributeError):
+            # Missing or corrupt cache; it will be regenerated.
+            return None
+
+    def save_cache(self, glyphs: dict[str, list[str]]) -> None:
+        """Save the glyphs to the cache, ignoring errors, since the cache is only an optimization."""
+        cache_file_path = self.get_cache_file_path()
+        try:
+            os.makedirs(os.path.dirname(cache_file_path), exist_ok=True)
+            temp_file_path = cache_file_path + ".tmp"
+            with open(temp_file_path, "w", encoding="utf-8") as f:
+                json.dump({"key": self.get_cache_key(), "glyphs": glyphs}, f, ensure_ascii=False)
+            os.replace(temp_file_path, cache_file_path)
+        except OSError as e:
+            print("Failed to save meta-glyph font cache:", e)
+
+    def load(self) -> dict[str, list[str]]:
         """Load the font from the .flf FIGlet font file."""
+        # pyfiglet is only needed when the cache is missing or outdated.
+        from pyfiglet import Figlet, FigletFont  # type: ignore
+
         # fig = Figlet(font=self.file_path) # gives FontNotFound error!
         # Figlet constructor only supports looking for installed fonts.
         # I could install the font, with FigletFont.installFonts,
         # maybe with some prefixed name, but I don't want to do that.
 
+        glyphs: dict[str, list[str]] = {}
         with open(self.file_path, encoding="utf-8") as f:
             flf = f.read()
             fig_font = FigletFont()
@@ -44,7 +108,8 @@ class MetaGlyphFont:
             fig.Font = fig_font  # this feels so wrong
             for char in self.covered_characters:
                 meta_glyph = fig.renderText(char)
-                self.glyphs[char] = meta_glyph.split("\n")
+                glyphs[char] = meta_glyph.split("\n")
+        return glyphs
 
 covered_characters = R""" !"#$%&'()*+,-./0123456789:;<=>?@ABCDEFGHIJKLMNOPQRSTUVWXYZ[\]^_`abcdefghijklmnopqrstuvwxyz{|}~"""
 meta_glyph_fonts: dict[int, MetaGlyphFont] = {
@@ -55,10 +120,12 @@ meta_glyph_fonts: dict[int, MetaGlyphFont] = {
 }
 
 def largest_font_that_fits(max_width: int, max_height: int) -> MetaGlyphFont | None:
-    """Get the largest font with glyphs that can all fit in the given dimensions."""
+    """Get the largest font with glyphs that can all fit in the given dimensions.
+
+    This doesn't load the font; its glyphs are loaded when first accessed.
+    """
     for font_size in sorted(meta_glyph_fonts.keys(), reverse=True):
         font = meta_glyph_fonts[font_size]
         if font.width <= max_width and font.height <= max_height:
             return font
     return None
-
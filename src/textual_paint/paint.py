@@ -3,13 +3,17 @@
 """Textual Paint is a detailed MS Paint clone that runs in the terminal."""
 
 import asyncio
+import hashlib
 import math
 import os
 import re
 import shlex
 import sys
+import tempfile
+import time
+from functools import partial
 from random import random
-from typing import Any, Callable, Iterator, Optional
+from typing import Any, Callable, Iterable, Iterator, Optional, cast
 from uuid import uuid4
 
 from PIL import Image, UnidentifiedImageError
@@ -29,44 +33,79 @@ from textual.widget import Widget
 from textual.widgets import (Button, Header, Input, RadioButton, RadioSet,
                              Static)
 from textual.widgets._header import HeaderIcon
-from textual.worker import get_current_worker  # type: ignore
+from textual.worker import (Worker, WorkerCancelled, WorkerFailed,
+                            get_current_worker)  # type: ignore
 
 from textual_paint.__init__ import PYTEST, __version__
-from textual_paint.action import Action
+from textual_paint.action import (Action, CompoundAction, RubberBand, Transform,
+                                  TransformAction)
 from textual_paint.ansi_art_document import (SAVE_DISABLED_FORMATS,
                                              AnsiArtDocument,
+                                             DocumentAnalysis,
                                              FormatReadNotSupported,
                                              FormatWriteNotSupported,
                                              Selection)
 from textual_paint.args import args, get_help_text
 from textual_paint.ascii_mode import set_ascii_only_mode
 from textual_paint.auto_restart import restart_on_changes, restart_program
-from textual_paint.canvas import Canvas
+from textual_paint.backup_journal import (JOURNAL_SUFFIX, journal_header,
+                                          journal_record, read_backup)
+from textual_paint.canvas import Canvas, merge_regions
 from textual_paint.char_input import CharInput
 from textual_paint.character_picker import CharacterSelectorDialogWindow
 from textual_paint.colors_box import ColorsBox
 from textual_paint.edit_colors import EditColorsDialogWindow
 from textual_paint.file_dialogs import OpenDialogWindow, SaveAsDialogWindow
-from textual_paint.graphics_primitives import (bezier_curve_walk,
-                                               bresenham_walk, flood_fill,
-                                               is_inside_polygon,
-                                               midpoint_ellipse, polygon_walk,
-                                               polyline_walk,
-                                               quadratic_curve_walk)
+from textual_paint.file_watcher import (POLL_INTERVAL, FileSignature,
+                                        FileWatcher, get_file_signature)
+from textual_paint.graphics_primitives import (BrushShape, FillMode,
+                                               bezier_curve_walk,
+                                               bresenham_walk, brush_offsets,
+                                               brush_spans,
+                                               cells_region_and_mask,
+                                               flood_fill, midpoint_ellipse,
+                                               outline_fill_spans,
+                                               polygon_mask, polygon_spans,
+                                               polygon_walk, polyline_walk,
+                                               quadratic_curve_walk,
+                                               spans_region, stroke_cells,
+                                               stroke_spans, union_spans)
 from textual_paint.icons import (get_help_icon_markup, get_paint_icon,
                                  get_question_icon, get_warning_icon,
                                  get_windows_icon_markup, header_icon_text)
 from textual_paint.localization.i18n import get as _
 from textual_paint.localization.i18n import load_language, remove_hotkey
+from textual_paint.mapped_document import (MAPPED_DOCUMENT_MIN_CELLS,
+                                           close_mapped, copy_mapped,
+                                           is_mapped, open_native_mapped,
+                                           read_native_size)
 from textual_paint.menus import Menu, MenuBar, MenuItem, Separator
 from textual_paint.palette_data import DEFAULT_PALETTE, IRC_PALETTE
 from textual_paint.rasterize_ansi_art import rasterize
+from textual_paint.session_backups import (MAX_SESSIONS, MAX_SESSIONS_SIZE,
+                                            SessionBackup, archive_backup,
+                                            get_session_file_path,
+                                            get_sessions_folder,
+                                            mark_session_used, read_index)
+from textual_paint.thumbnail import Thumbnail
 from textual_paint.tool import Tool
+from textual_paint.tool_options import ToolOptions
 from textual_paint.toolbox import ToolsBox
 from textual_paint.wallpaper import get_config_dir, set_wallpaper
 from textual_paint.windows import DialogWindow, MessageBox, Window
 
 MAX_FILE_SIZE = 500000 # 500 KB
+SAVE_PROGRESS_BLOCK_SIZE = 1024 * 1024
+"""Bytes written at a time when saving, between progress updates."""
+
+BACKUP_INTERVAL_MIN = 10
+"""Seconds between backup saves for small documents."""
+BACKUP_INTERVAL_MAX = 60
+"""Seconds between backup saves for the largest documents."""
+BACKUP_CELLS_PER_SECOND = 20000
+"""Document size, in cells, per second of backup interval, before clamping to BACKUP_INTERVAL_MIN/MAX, so large documents are encoded less often."""
+JOURNAL_INTERVAL = 2
+"""Seconds between writes of changed regions to the backup journal, in between backup saves."""
 
 # Most arguments are handled at the end of the file,
 # but it may be important to do this one early.
@@ -191,7 +230,19 @@ class PaintApp(App[None]):
     """The currently selected foreground (text) color."""
     selected_char = var(" ")
     """The character to draw with."""
-    file_path = var(None)
+    brush_size = var(3)
+    """The diameter of the Brush tool, in cells."""
+    brush_shape = var(BrushShape.round)
+    """The shape of the Brush tool."""
+    eraser_size = var(3)
+    """The width of the Eraser/Color Eraser tool, in cells."""
+    airbrush_size = var(3)
+    """The diameter of the Airbrush tool, in cells."""
+    airbrush_density = var(0.3)
+    """The chance of each stamp of the Airbrush tool painting a given cell."""
+    fill_mode = var(FillMode.outline)
+    """Whether shapes are drawn as outlines, filled, or both."""
+    file_path: var[Optional[str]] = var(None)
     """The path to the file being edited."""
 
     image = var(AnsiArtDocument.from_text("Not Loaded"))
@@ -216,10 +267,24 @@ class PaintApp(App[None]):
     """Future actions that can be redone"""
     preview_action: Optional[Action] = None
     """A temporary undo state for tool previews"""
+    selection_action: Optional[CompoundAction] = None
+    """The undo state for the current selection, which records each region of the document the selection modifies"""
+    rubber_band: Optional[RubberBand] = None
+    """The shape being dragged out with the Line, Rectangle, Ellipse, or Rounded Rectangle tool, added to the undo history on release"""
+    recording_action: Optional[CompoundAction] = None
+    """The undo state that records each region of the document before it's drawn over, while drawing with `draw_for_undo`"""
     saved_undo_count = 0
     """Used to determine if the document has been modified since the last save, in is_document_modified()"""
     backup_saved_undo_count = 0
     """Used to determine if the document has been modified since the last backup save"""
+    backup_content_hash: Optional[tuple[str, bytes]] = None
+    """The backup file path and a hash of the content last written to it, to skip writing unchanged content"""
+    backup_generation = 0
+    """Incremented for each backup save, and when the backup is discarded, to drop a save that completes after either"""
+    journal_checkpoint_hash: Optional[bytes] = None
+    """The hash of the backup that the journal file on disk applies to, if any"""
+    journal_whole_document = False
+    """Whether the whole document may have changed since the journal was last written, such as by resizing"""
     save_backup_after_cancel_preview = False
     """Flag to postpone saving the backup until a tool preview action is reverted, so as not to save it into the backup file"""
     backup_folder: Optional[str] = None
@@ -229,8 +294,25 @@ class PaintApp(App[None]):
 
     This is tracked to prevent discarding Untitled.ans~ when loading a document on startup.
     Indicates that the file path either was loaded (recovered) or was not found.
-    Not set when failing to load a backup, since the file maybe shouldn't be discarded in that case.
+    Not set when failing to load a backup, since the file maybe shouldn't be discarded in that case,
+    unless it was moved into the session backups.
     """
+    document_analysis: Optional[tuple[tuple[Any, ...], DocumentAnalysis]] = None
+    """The last analysis of the document, and the document version it was for"""
+    save_worker: Optional[Worker[Any]] = None
+    """The worker encoding and writing a file, if a save is in progress. Cancelled with Escape, until it starts writing."""
+    save_writing = False
+    """Whether the save in progress has started writing the file, after which it can't be cancelled"""
+    file_watcher: Optional[FileWatcher] = None
+    """Reports changes to the file being edited by other programs, if file system events are available"""
+    file_signature: Optional[FileSignature] = None
+    """The modification time and size of the file when it was last opened, saved, or reloaded, to notice changes by other programs"""
+    file_change_prompted_for: Optional[FileSignature] = None
+    """The file signature last asked about reloading, so as not to ask again until it changes again"""
+    max_backup_sessions = MAX_SESSIONS
+    """The number of backups from previous sessions to keep for each document"""
+    max_backup_sessions_size = MAX_SESSIONS_SIZE
+    """The total size in bytes of backups from previous sessions to keep for each document"""
 
     mouse_gesture_cancelled = False
     """For Undo/Redo, to interrupt the current action"""
@@ -261,6 +343,12 @@ class PaintApp(App[None]):
     def __init__(self, **kwargs: Any) -> None:
         super().__init__(**kwargs)
         set_ascii_only_mode(args.ascii_only)
+        self.journal_regions: list[Region] = []
+        """Regions of the document changed since the journal was last written"""
+        self.journal_records_since_backup: list[str] = []
+        """Journal records written since the document was copied for the latest backup save"""
+        self.save_queue = asyncio.Lock()
+        """Held by the save in progress, so further saves wait their turn, rather than writing the same file at once"""
 
     def watch_file_path(self, file_path: Optional[str]) -> None:
         """Called when file_path changes."""
@@ -268,6 +356,9 @@ class PaintApp(App[None]):
             self.sub_title = _("Untitled")
         else:
             self.sub_title = os.path.basename(file_path)
+        self.remember_file_signature()
+        if self.file_watcher:
+            self.file_watcher.watch_file(file_path)
 
     def watch_show_tools_box(self, show_tools_box: bool) -> None:
         """Called when show_tools_box changes."""
@@ -284,6 +375,7 @@ class PaintApp(App[None]):
     def watch_selected_tool(self, selected_tool: Tool) -> None:
         """Called when selected_tool changes."""
         self.query_one("ToolsBox", ToolsBox).show_selected_tool(selected_tool)
+        self.query_one("#tool_options", ToolOptions).show_options(selected_tool)
 
     def watch_palette(self, palette: tuple[str, ...]) -> None:
         """Called when palette changes."""
@@ -340,28 +432,99 @@ class PaintApp(App[None]):
                     self.image.selection.contained_image.st[y][x] += style
             self.canvas.refresh_scaled_region(self.image.selection.region)
 
+    def get_brush(self) -> tuple[int, BrushShape]:
+        """Returns the diameter and shape of the current tool's brush."""
+        if self.selected_tool == Tool.brush:
+            return self.brush_size, self.brush_shape
+        if self.selected_tool == Tool.eraser:
+            return self.eraser_size, BrushShape.square
+        if self.selected_tool == Tool.airbrush:
+            return self.airbrush_size, BrushShape.round
+        return 1, BrushShape.square
+
     def stamp_brush(self, x: int, y: int, affected_region_base: Optional[Region] = None) -> Region:
         """Draws the current brush at the given coordinates, with special handling for different tools."""
-        brush_diameter = 1
-        square = self.selected_tool == Tool.eraser
-        if self.selected_tool == Tool.brush or self.selected_tool == Tool.airbrush or self.selected_tool == Tool.eraser:
-            brush_diameter = 3
-        if brush_diameter == 1:
-            self.stamp_char(x, y)
+        return self.stamp_brush_stroke([(x, y)], affected_region_base)
+
+    def stamp_brush_stroke(self, points: Iterable[tuple[int, int]], affected_region_base: Optional[Region] = None) -> Region:
+        """Draws the current brush at each of the given points, with special handling for different tools.
+
+        Cells covered by several stamps are only written once.
+        Returns the region containing the modified cells, unioned with `affected_region_base` if given.
+        """
+        diameter, shape = self.get_brush()
+        if (
+            self.selected_tool == Tool.airbrush or
+            (self.selected_tool == Tool.eraser and self.color_eraser_mode) or
+            self.selected_tool == Tool.free_form_select
+        ):
+            # These tools need to visit cells individually.
+            cells = stroke_cells(points, brush_offsets(diameter, shape), self.image.width, self.image.height)
+            affected_region, mask = cells_region_and_mask(cells)
+            if self.recording_action:
+                # Only the visited cells are restored when undoing, since the rest of the region may change independently.
+                self.recording_action.add_region(self.image, affected_region, mask)
+            self.stamp_cells(cells)
         else:
-            # plot points within a circle (or square)
-            for i in range(brush_diameter):
-                for j in range(brush_diameter):
-                    if square or (i - brush_diameter // 2) ** 2 + (j - brush_diameter // 2) ** 2 <= (brush_diameter // 2) ** 2:
-                        self.stamp_char(x + i - brush_diameter // 2, y + j - brush_diameter // 2)
-        # expand the affected region to include the brush
-        brush_diameter += 2  # safety margin
-        affected_region = Region(x - brush_diameter // 2, y - brush_diameter // 2, brush_diameter, brush_diameter)
+            rows = stroke_spans(points, brush_spans(diameter, shape), self.image.width, self.image.height)
+            self.stamp_spans(rows)
+            affected_region = spans_region(rows)
         if affected_region_base:
-            return affected_region_base.union(affected_region)
+            return affected_region_base.union(affected_region) if affected_region else affected_region_base
         else:
             return affected_region
 
+    def get_brush_char_and_style(self) -> tuple[str, Style]:
+        """Returns the character and style that the current tool draws with, if it doesn't depend on existing cells."""
+        if self.selected_tool == Tool.eraser:
+            return " ", Style(color="#000000", bgcolor="#ffffff")
+        return self.selected_char, Style(color=self.selected_fg_color, bgcolor=self.selected_bg_color)
+
+    def stamp_spans(self, rows: dict[int, list[tuple[int, int]]]) -> None:
+        """Fills the given spans from `stroke_spans` with the current tool's character and style."""
+        char, style = self.get_brush_char_and_style()
+        self.fill_spans(rows, char, style)
+
+    def fill_spans(self, rows: dict[int, list[tuple[int, int]]], char: str, style: Style) -> None:
+        """Fills the given spans, which must be within the document, with a character and style, a row slice at a time.
+
+        While dragging out a shape, the cells are first saved in the rubber band, so the shape can be redrawn.
+        Otherwise, while drawing with `draw_for_undo`, their region is first saved in the undo state.
+        """
+        if self.recording_action:
+            self.recording_action.add_region(self.image, spans_region(rows))
+        rubber_band = self.rubber_band
+        for y, row_spans in rows.items():
+            ch_row = self.image.ch[y]
+            st_row = self.image.st[y]
+            for x_start, x_end in row_spans:
+                if rubber_band:
+                    rubber_band.save_span(self.image, y, x_start, x_end)
+                ch_row[x_start:x_end] = [char] * (x_end - x_start)
+                st_row[x_start:x_end] = [style] * (x_end - x_start)
+
+    def stamp_cells(self, cells: dict[tuple[int, int], int]) -> None:
+        """Modifies the given cells, which must be within the document, with special handling for different tools.
+
+        `cells` maps coordinates to the number of brush stamps covering the cell, which affects the Airbrush tool.
+        """
+        if (self.selected_tool == Tool.eraser and self.color_eraser_mode) or self.selected_tool == Tool.free_form_select:
+            # These depend on the existing contents of each cell.
+            for x, y in cells:
+                self.stamp_char(x, y)
+            return
+        char, style = self.get_brush_char_and_style()
+        airbrush = self.selected_tool == Tool.airbrush
+        miss_chance = 1 - self.airbrush_density
+        ch = self.image.ch
+        st = self.image.st
+        for (x, y), stamp_count in cells.items():
+            # Each stamp of the airbrush has a chance of painting a cell, according to the density.
+            if airbrush and random() < miss_chance ** stamp_count:
+                continue
+            ch[y][x] = char
+            st[y][x] = style
+
     def stamp_char(self, x: int, y: int) -> None:
         """Modifies the cell at the given coordinates, with special handling for different tools."""
         if x >= self.image.width or y >= self.image.height or x < 0 or y < 0:
@@ -392,7 +555,7 @@ class PaintApp(App[None]):
                 fg_color = self.selected_bg_color if fg_matches else style.color.triplet.hex
                 bg_color = self.selected_bg_color if bg_matches else style.bgcolor.triplet.hex
         if self.selected_tool == Tool.airbrush:
-            if random() < 0.7:
+            if random() >= self.airbrush_density:
                 return
         if self.selected_tool == Tool.free_form_select:
             # Invert the underlying colors
@@ -429,32 +592,40 @@ class PaintApp(App[None]):
         # TODO: DRY with draw_current_curve/draw_current_polygon/draw_current_polyline
         # Also (although this may be counter to DRYING (Deduplicating Repetitive Yet Individually Nimble Generators)),
         # could optimize to not use stamp_brush, since it's always a single character here.
-        gen = polyline_walk(self.tool_points)
-        affected_region = Region()
-        already_inverted: set[tuple[int, int]] = set()
-        for x, y in gen:
-            if (x, y) not in already_inverted:
-                affected_region = affected_region.union(self.stamp_brush(x, y, affected_region))
-                already_inverted.add((x, y))
-        return affected_region
+        # Each cell is only inverted once, since stamp_brush_stroke visits unique cells.
+        return self.stamp_brush_stroke(polyline_walk(self.tool_points), Region())
 
     def draw_current_polyline(self) -> Region:
         """Draws a polyline from tool_points, for Polygon tool preview."""
         # TODO: DRY with draw_current_curve/draw_current_polygon
-        gen = polyline_walk(self.tool_points)
-        affected_region = Region()
-        for x, y in gen:
-            affected_region = affected_region.union(self.stamp_brush(x, y, affected_region))
-        return affected_region
+        return self.stamp_brush_stroke(polyline_walk(self.tool_points), Region())
 
     def draw_current_polygon(self) -> Region:
         """Draws a polygon from tool_points, for Polygon tool."""
         # TODO: DRY with draw_current_curve/draw_current_polyline
-        gen = polygon_walk(self.tool_points)
-        affected_region = Region()
-        for x, y in gen:
-            affected_region = affected_region.union(self.stamp_brush(x, y, affected_region))
-        return affected_region
+        if self.fill_mode == FillMode.outline:
+            return self.stamp_brush_stroke(polygon_walk(self.tool_points), Region())
+        # Include the outline in the fill, since the even-odd rule leaves out some edge cells.
+        fill_rows = union_spans(
+            polygon_spans(self.tool_points, Region(0, 0, self.image.width, self.image.height)),
+            stroke_spans(polygon_walk(self.tool_points), brush_spans(1), self.image.width, self.image.height),
+        )
+        return self.draw_shape(polygon_walk(self.tool_points), fill_rows)
+
+    def draw_shape(self, outline: Iterable[tuple[int, int]], fill_rows: dict[int, list[tuple[int, int]]]) -> Region:
+        """Draws a shape according to the fill mode, given the points of its outline and the spans of its area.
+
+        The fill is drawn with the current character and colors when filling only,
+        or as blank cells in the foreground color when drawn with an outline,
+        the way MS Paint fills with the secondary color.
+        """
+        if self.fill_mode == FillMode.outline:
+            return self.stamp_brush_stroke(outline)
+        if self.fill_mode == FillMode.fill:
+            self.stamp_spans(fill_rows)
+            return spans_region(fill_rows)
+        self.fill_spans(fill_rows, " ", Style(color=self.selected_fg_color, bgcolor=self.selected_fg_color))
+        return self.stamp_brush_stroke(outline, spans_region(fill_rows))
 
     def draw_current_curve(self) -> Region:
         """Draws a curve (or line) from tool_points, for Curve tool."""
@@ -479,10 +650,7 @@ class PaintApp(App[None]):
             )
         else:
             gen = iter(points)
-        affected_region = Region()
-        for x, y in gen:
-            affected_region = affected_region.union(self.stamp_brush(x, y, affected_region))
-        return affected_region
+        return self.stamp_brush_stroke(gen, Region())
 
     def finalize_polygon_or_curve(self) -> None:
         """Finalizes the polygon or curve shape, creating an undo state."""
@@ -497,25 +665,36 @@ class PaintApp(App[None]):
         if self.selected_tool == Tool.curve and len(self.tool_points) < 2:
             return
 
-        self.image_at_start = AnsiArtDocument(self.image.width, self.image.height)
-        self.image_at_start.copy_region(self.image)
-        action = Action(self.selected_tool.get_name())
+        action = CompoundAction(self.selected_tool.get_name())
         self.add_action(action)
 
         if self.selected_tool == Tool.polygon:
-            affected_region = self.draw_current_polygon()
+            affected_region = self.draw_for_undo(action, self.draw_current_polygon)
         else:
-            affected_region = self.draw_current_curve()
+            affected_region = self.draw_for_undo(action, self.draw_current_curve)
 
-        action.region = affected_region
-        action.region = action.region.intersection(Region(0, 0, self.image.width, self.image.height))
-        action.update(self.image_at_start)
         self.canvas.refresh_scaled_region(affected_region)
 
         self.tool_points = []
 
+    def draw_for_undo(self, action: CompoundAction, draw_proc: Callable[[], Region]) -> Region:
+        """Draw, saving each region of the document in the action before it's drawn over, for undo.
+
+        This avoids copying the whole document for each stroke.
+        """
+        self.recording_action = action
+        try:
+            return draw_proc()
+        finally:
+            self.recording_action = None
+
     def action_cancel(self) -> None:
         """Action to end the current tool activity, via Escape key."""
+        if self.save_worker is not None:
+            # Cancels the save, unless the file is already being written.
+            if not self.save_writing:
+                self.save_worker.cancel()
+            return
         # Also un-focus CharInput when pressing Escape.
         # This is important to avoid getting stuck with the character input field focused, in order to use free typing mode.
         if self.app.focused:
@@ -524,8 +703,9 @@ class PaintApp(App[None]):
         self.stop_action_in_progress()
 
     def stop_action_in_progress(self) -> None:
-        """Finalizes the selection, or cancels other tools."""
+        """Finalizes the selection or shape, or cancels other tools."""
         self.cancel_preview()
+        self.commit_rubber_band()
         self.meld_selection()
         self.tool_points = []
         self.mouse_gesture_cancelled = True
@@ -548,14 +728,11 @@ class PaintApp(App[None]):
 
         if len(self.undos) > 0:
             action = self.undos.pop()
-            redo_region = Region(0, 0, self.image.width, self.image.height) if action.is_full_update else action.region
-            redo_action = Action(_("Undo") + " " + action.name, redo_region)
-            redo_action.is_full_update = action.is_full_update
-            redo_action.update(self.image)
+            redo_action = action.inverse(self.image, _("Undo") + " " + action.name)
             redo_action.cursor_position_before = cursor_position_before
             action.undo(self.image)
             self.redos.append(redo_action)
-            self.canvas.refresh(layout=True)
+            self.canvas.refresh_document(layout=True)
 
     def action_redo(self) -> None:
         """Redoes the last undone action."""
@@ -571,14 +748,11 @@ class PaintApp(App[None]):
 
         if len(self.redos) > 0:
             action = self.redos.pop()
-            undo_region = Region(0, 0, self.image.width, self.image.height) if action.is_full_update else action.region
-            undo_action = Action(_("Undo") + " " + action.name, undo_region)
-            undo_action.is_full_update = action.is_full_update
-            undo_action.update(self.image)
+            undo_action = action.inverse(self.image, _("Undo") + " " + action.name)
             undo_action.cursor_position_before = cursor_position_before
             action.undo(self.image)
             self.undos.append(undo_action)
-            self.canvas.refresh(layout=True)
+            self.canvas.refresh_document(layout=True)
 
     def add_action(self, action: Action) -> None:
         """Adds an action to the undo stack, clearing redos."""
@@ -593,9 +767,114 @@ class PaintApp(App[None]):
             window.close()
 
     def start_backup_interval(self) -> None:
-        """Auto-save a backup file periodically."""
-        self.backup_interval = 10
-        self.set_interval(self.backup_interval, self.save_backup)
+        """Auto-save a backup file periodically, with a journal of changes in between."""
+        if PYTEST:
+            # Like recover_from_backup, this would interfere with snapshot tests,
+            # and leave backup files next to the documents they open.
+            # Tests that cover backups call save_backup directly.
+            print("Skipping start_backup_interval in pytest")
+            return
+        self.set_interval(JOURNAL_INTERVAL, self.save_journal)
+        self.schedule_backup()
+
+    def schedule_backup(self) -> None:
+        """Schedule the next backup save, later for larger documents."""
+        cells = self.image.width * self.image.height
+        self.backup_interval = max(BACKUP_INTERVAL_MIN, min(BACKUP_INTERVAL_MAX, cells / BACKUP_CELLS_PER_SECOND))
+        def save_and_reschedule() -> None:
+            self.save_backup()
+            self.schedule_backup()
+        self.set_timer(self.backup_interval, save_and_reschedule)
+
+    def start_file_watching(self) -> None:
+        """Watch for changes to the file being edited by other programs, polling if file system events aren't available."""
+        def on_change() -> None:
+            # Called from the file system observer's thread.
+            try:
+                self.call_from_thread(self.check_file_changed)
+            except RuntimeError:
+                # The app is exiting.
+                pass
+        self.file_watcher = FileWatcher(on_change)
+        self.file_watcher.watch_file(self.file_path)
+        def poll() -> None:
+            if not (self.file_watcher and self.file_watcher.watching):
+                self.check_file_changed()
+        self.set_interval(POLL_INTERVAL, poll)
+
+    def on_unmount(self) -> None:
+        """Stop watching the file when the app exits."""
+        if self.file_watcher:
+            self.file_watcher.stop()
+
+    def remember_file_signature(self) -> None:
+        """Record the state of the file being edited, as it was opened, saved, or reloaded, so only other changes are noticed."""
+        self.file_signature = get_file_signature(self.file_path) if self.file_path else None
+        self.file_change_prompted_for = None
+
+    def check_file_changed(self) -> None:
+        """Offer to reload the file being edited, if another program changed it since it was opened or saved."""
+        if not self.file_path or self.file_signature is None or self.save_worker is not None:
+            return
+        if is_mapped(self.image):
+            # Comparing with the file would load the whole document into memory.
+            return
+        signature = get_file_signature(self.file_path)
+        # If the file was deleted, there's nothing to reload; saving will recreate it.
+        if signature is None or signature in (self.file_signature, self.file_change_prompted_for):
+            return
+        self.file_change_prompted_for = signature
+        message = _("%1 has been changed by another program.", os.path.basename(self.file_path)) + "\n" + _("Do you want to reload it?")
+        if self.is_document_modified():
+            message += "\n" + _("You can undo the reload to get your changes back.")
+        def handle_button(button: Button) -> None:
+            if button.has_class("yes"):
+                self.reload_changed_file()
+        self.message_box(_("Paint"), message, "yes/no", handle_button)
+
+    def reload_changed_file(self) -> bool:
+        """Reload the file being edited after another program changed it, as a single undoable action.
+
+        Only the rows that changed are replaced, refreshed, and stored in the undo history.
+        """
+        assert self.file_path is not None
+        file_path = self.file_path
+        signature = get_file_signature(file_path)
+        try:
+            if os.path.getsize(file_path) > MAX_FILE_SIZE:
+                self.message_box(_("Open"), _("The file is too large to open."), "ok")
+                return False
+            with open(file_path, "rb") as f:
+                content = f.read()
+            new_image = AnsiArtDocument.decode_based_on_file_extension(content, file_path)
+        except Exception as e:
+            self.show_read_error(file_path, e)
+            return False
+        self.apply_reloaded_document(new_image)
+        self.file_signature = signature
+        return True
+
+    def apply_reloaded_document(self, new_image: AnsiArtDocument) -> None:
+        """Replace the document's content with that of a reloaded file, undoably, updating only the rows that differ."""
+        self.stop_action_in_progress()
+        changed_regions = self.image.diff_rows(new_image)
+        if changed_regions is None:
+            action = Action(_("Reload"), Region(0, 0, self.image.width, self.image.height))
+            action.is_full_update = True
+            action.update(self.image)
+            self.add_action(action)
+            self.image.copy(new_image)
+            self.canvas.refresh_document(layout=True)
+        elif changed_regions:
+            action = CompoundAction(_("Reload"))
+            for region in changed_regions:
+                action.add_region(self.image, region)
+            self.add_action(action)
+            for region in changed_regions:
+                self.image.copy_region(new_image, source_region=region, target_region=region)
+                self.canvas.refresh_scaled_region(region)
+        self.saved_undo_count = len(self.undos)
+        self.image.sauce = new_image.sauce
 
     def get_backup_file_path(self) -> str:
         """Returns the path to the backup file."""
@@ -608,6 +887,10 @@ class PaintApp(App[None]):
 
     def save_backup(self) -> None:
         """Save to the backup file if there have been changes since it was saved."""
+        if is_mapped(self.image):
+            # Copying and encoding the whole document would load it all into memory,
+            # defeating the point of memory-mapping it.
+            return
         if self.backup_saved_undo_count != len(self.undos):
             if self.image_has_preview():
                 # Postpone saving the backup until the preview is reverted, so it's not saved into the backup file.
@@ -616,12 +899,113 @@ class PaintApp(App[None]):
                 # Instead, set a flag to save the backup exactly as soon as the preview action is reverted.
                 self.save_backup_after_cancel_preview = True
                 return
-            ansi = self.image.get_ansi()
-            # This maybe shouldn't use UTF-8...
-            ansi_bytes = ansi.encode("utf-8")
-            self.write_file_path(self.get_backup_file_path(), ansi_bytes, _("Backup Save Failed"))
+            # Encoding is done in a thread, on a copy, so drawing can continue meanwhile.
+            document = AnsiArtDocument(self.image.width, self.image.height)
+            document.copy(self.image)
+            self.backup_generation += 1
+            self.journal_records_since_backup = []
+            self.write_backup(document, self.get_backup_file_path(), self.backup_generation)
             self.backup_saved_undo_count = len(self.undos)
 
+    @work(exclusive=True, thread=True, group="backup")
+    def write_backup(self, document: AnsiArtDocument, backup_file_path: str, generation: int) -> None:
+        """Encode and write the backup file, unless the content is unchanged.
+
+        The content is written to a temporary file, which `backup_written` moves into place on the UI thread,
+        so the backup is never left half-written, and can't be brought back after it's discarded.
+        """
+        # This maybe shouldn't use UTF-8...
+        ansi_bytes = document.get_ansi().encode("utf-8")
+        content_hash = hashlib.sha256(ansi_bytes).digest()
+        if self.backup_content_hash == (backup_file_path, content_hash):
+            self.call_from_thread(self.backup_written, backup_file_path, None, content_hash, generation)
+            return
+        temp_file_path: Optional[str] = None
+        try:
+            fd, temp_file_path = tempfile.mkstemp(prefix=os.path.basename(backup_file_path), suffix=".tmp", dir=os.path.dirname(backup_file_path))
+            with os.fdopen(fd, "wb") as f:
+                f.write(ansi_bytes)
+            if get_current_worker().is_cancelled:
+                os.remove(temp_file_path)
+                return
+            self.call_from_thread(self.backup_written, backup_file_path, temp_file_path, content_hash, generation)
+        except RuntimeError:
+            # The app exited before the backup could be moved into place.
+            if temp_file_path and os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+        except Exception as e:
+            if temp_file_path and os.path.exists(temp_file_path):
+                os.remove(temp_file_path)
+            # Because this is running in a thread, we can't directly access the UI.
+            self.call_from_thread(self.show_write_error, backup_file_path, _("Backup Save Failed"), e)
+
+    def backup_written(self, backup_file_path: str, temp_file_path: Optional[str], content_hash: bytes, generation: int) -> None:
+        """Move a backup written to a temporary file into place, and start a new journal for it, holding only changes made since it was copied.
+
+        If the backup was discarded, or a newer one started, since it was copied, it's dropped instead.
+        Since this runs on the UI thread, it can't interleave with `discard_backup`.
+        `temp_file_path` is None if the backup file already had the content.
+        """
+        if generation != self.backup_generation or backup_file_path != self.get_backup_file_path():
+            # The existing backup and journal still go together, if they weren't discarded.
+            if temp_file_path:
+                os.remove(temp_file_path)
+            return
+        if temp_file_path:
+            try:
+                os.replace(temp_file_path, backup_file_path)
+            except OSError as e:
+                os.remove(temp_file_path)
+                self.show_write_error(backup_file_path, _("Backup Save Failed"), e)
+                return
+        self.backup_content_hash = (backup_file_path, content_hash)
+        self.write_journal(backup_file_path + JOURNAL_SUFFIX, content_hash, "".join(self.journal_records_since_backup), append=False)
+
+    def save_journal(self) -> None:
+        """Append the regions changed since the journal was last written to the journal, so they can be recovered."""
+        if not self.journal_regions and not self.journal_whole_document:
+            return
+        if self.image_has_preview():
+            # Try again next time, so the preview isn't saved.
+            return
+        if self.backup_content_hash is None or self.backup_content_hash[0] != self.get_backup_file_path():
+            # There's no backup to apply changes to. The next backup will include them.
+            self.journal_regions = []
+            self.journal_whole_document = False
+            return
+        if self.journal_whole_document:
+            regions = [Region(0, 0, self.image.width, self.image.height)]
+        else:
+            regions = merge_regions(self.journal_regions)
+        self.journal_regions = []
+        self.journal_whole_document = False
+        records = "".join(journal_record(self.image, region) for region in regions)
+        self.journal_records_since_backup.append(records)
+        backup_file_path, content_hash = self.backup_content_hash
+        if self.journal_checkpoint_hash == content_hash:
+            self.write_journal(backup_file_path + JOURNAL_SUFFIX, content_hash, records, append=True)
+        else:
+            self.write_journal(backup_file_path + JOURNAL_SUFFIX, content_hash, "".join(self.journal_records_since_backup), append=False)
+
+    def write_journal(self, journal_file_path: str, content_hash: bytes, records: str, append: bool) -> None:
+        """Append records to the journal, or start a new journal for the backup with the given hash."""
+        try:
+            if append:
+                with open(journal_file_path, "a", encoding="utf-8") as f:
+                    f.write(records)
+            else:
+                # Replace the old journal all at once, so it's never left with a partial header.
+                fd, temp_file_path = tempfile.mkstemp(prefix=os.path.basename(journal_file_path), suffix=".tmp", dir=os.path.dirname(journal_file_path))
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    f.write(journal_header(content_hash.hex()) + records)
+                os.replace(temp_file_path, journal_file_path)
+            self.journal_checkpoint_hash = content_hash
+        except OSError as e:
+            # Not showing a message box, since this happens every few seconds.
+            # The backup save will report the problem, if it's persistent.
+            print("Failed to write backup journal:", repr(e))
+            self.journal_checkpoint_hash = None
+
     def recover_from_backup(self) -> None:
         """Recover from the backup file, if it exists."""
         if PYTEST:
@@ -636,27 +1020,24 @@ class PaintApp(App[None]):
         if os.path.exists(backup_file_path):
             try:
                 if os.path.getsize(backup_file_path) > MAX_FILE_SIZE:
-                    self.message_box(_("Open"), _("A backup file was found, but was not recovered.") + "\n" + _("The file is too large to open."), "ok")
+                    message = _("A backup file was found, but was not recovered.") + "\n" + _("The file is too large to open.")
+                    self.message_box(_("Open"), message + self.keep_unrecovered_backup(backup_file_path), "ok")
                     return
-                with open(backup_file_path, "r", encoding="utf-8") as f:
-                    backup_content = f.read()
-                    backup_image = AnsiArtDocument.from_text(backup_content)
-                    self.backup_checked_for = backup_file_path
-                    # TODO: make backup use image format when appropriate
+                backup_image, content_hash, journal_records = read_backup(backup_file_path)
+                self.backup_checked_for = backup_file_path
+                # TODO: make backup use image format when appropriate
             except Exception as e:
-                self.message_box(_("Paint"), _("A backup file was found, but was not recovered.") + "\n" + _("An unexpected error occurred while reading %1.", backup_file_path), "ok", error=e)
-                # Don't set self.backup_checked_for, so the backup won't be discarded,
-                # to allow for manual recovery.
-                # Actually, it will be overwritten when saving a new backup...
-                # TODO: numbered session files; I had some plans for this in a commit message
-                # See: 74ffc34de4b789ec1da2ae2e08bf99f1bb4670c9
-                # I could make backup_checked_for into owned_backup_file_path (or a dict if needed)
+                message = _("A backup file was found, but was not recovered.") + "\n" + _("An unexpected error occurred while reading %1.", backup_file_path)
+                self.message_box(_("Paint"), message + self.keep_unrecovered_backup(backup_file_path), "ok", error=e)
                 return
-            # This creates an undo
-            self.resize_document(backup_image.width, backup_image.height)
-            self.undos[-1].name = _("Recover from backup")
-            self.canvas.image = self.image = backup_image
-            self.canvas.refresh(layout=True)
+            # The backup file will be overwritten as this session continues,
+            # so keep a copy of it as it was, as a recovery point.
+            self.keep_session_backup(backup_file_path, readable=True)
+            # Changes made after the backup was saved, up to a few seconds before the crash, were replayed from the journal.
+            if journal_records:
+                self.journal_checkpoint_hash = content_hash
+            self.backup_content_hash = (backup_file_path, content_hash)
+            self.load_recovered_image(backup_image)
             # No point in saving the backup file as-is, so mark it as up-to-date
             self.backup_saved_undo_count = len(self.undos)
             # Don't set self.saved_undo_count, since the recovered contents are not saved to the main file
@@ -671,6 +1052,94 @@ class PaintApp(App[None]):
         else:
             self.backup_checked_for = backup_file_path
 
+    def load_recovered_image(self, backup_image: AnsiArtDocument) -> None:
+        """Replace the document with one recovered from a backup, as an undoable action."""
+        # This creates an undo
+        self.resize_document(backup_image.width, backup_image.height)
+        self.undos[-1].name = _("Recover from backup")
+        self.canvas.image = self.image = backup_image
+        self.canvas.refresh_document(layout=True)
+
+    def keep_session_backup(self, backup_file_path: str, readable: bool, move: bool = False) -> Optional[SessionBackup]:
+        """Add the backup file to the numbered session backups, returning None if it failed."""
+        try:
+            return archive_backup(backup_file_path, readable, move, self.max_backup_sessions, self.max_backup_sessions_size)
+        except OSError as e:
+            print("Failed to keep session backup:", repr(e))
+            return None
+
+    def keep_unrecovered_backup(self, backup_file_path: str) -> str:
+        """Move a backup that couldn't be recovered out of the way, so that it's not overwritten by a new backup.
+
+        Returns a line to add to the error message, saying where it was moved to.
+        """
+        session = self.keep_session_backup(backup_file_path, readable=False, move=True)
+        if session is None:
+            # Don't set self.backup_checked_for, so the backup won't be discarded,
+            # to allow for manual recovery.
+            # It will still be overwritten when saving a new backup, though.
+            return ""
+        # The backup file is free to be used by this session now.
+        self.backup_checked_for = backup_file_path
+        session_file_path = get_session_file_path(get_sessions_folder(backup_file_path), session.number)
+        return "\n" + _("The backup was kept as %1.", session_file_path)
+
+    def action_recover_session(self) -> None:
+        """Show dialog to choose a backup from a previous session to recover."""
+        self.close_windows("#recover_session_dialog")
+        sessions_folder = get_sessions_folder(self.get_backup_file_path())
+        sessions = read_index(sessions_folder)
+        if not sessions:
+            self.message_box(_("Paint"), _("There are no backups from previous sessions of this document."), "ok")
+            return
+        def handle_button(button: Button) -> None:
+            if button.has_class("ok"):
+                radio_button = window.content.query_one(RadioSet).pressed_button
+                if radio_button is not None and radio_button.id is not None:
+                    self.recover_session(sessions_folder, int(radio_button.id.split("_")[1]))
+            window.close()
+        def describe(session: SessionBackup) -> str:
+            description = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(session.saved))
+            description += f"  ({math.ceil(session.size / 1024)} KB)"
+            if not session.readable:
+                description += "  " + _("(not recovered automatically)")
+            return description
+        window = DialogWindow(
+            id="recover_session_dialog",
+            title=_("Recover Session"),
+            handle_button=handle_button,
+        )
+        window.content.mount(
+            RadioSet(
+                *[RadioButton(describe(session), id=f"session_{session.number}", value=index == 0) for index, session in enumerate(sessions)],
+                classes="autofocus",
+            ),
+            Container(
+                Button(_("OK"), classes="ok submit", variant="primary"),
+                Button(_("Cancel"), classes="cancel"),
+                classes="buttons",
+            )
+        )
+        window.content.query_one(RadioSet).border_title = _("Backups from previous sessions")
+        self.mount(window)
+
+    def recover_session(self, sessions_folder: str, number: int) -> None:
+        """Replace the document with a backup from a previous session, as an undoable action."""
+        session_file_path = get_session_file_path(sessions_folder, number)
+        try:
+            if os.path.getsize(session_file_path) > MAX_FILE_SIZE:
+                self.message_box(_("Open"), _("The file is too large to open."), "ok")
+                return
+            backup_image = read_backup(session_file_path)[0]
+        except Exception as e:
+            self.message_box(_("Paint"), _("An unexpected error occurred while reading %1.", session_file_path), "ok", error=e)
+            return
+        try:
+            mark_session_used(sessions_folder, number)
+        except OSError as e:
+            print("Failed to update session backups index:", repr(e))
+        self.load_recovered_image(backup_image)
+
     def action_save(self) -> None:
         """Start the save action, but don't wait for the Save As dialog to close if it's a new file."""
         async def save_ignoring_result() -> None:
@@ -685,19 +1154,116 @@ class PaintApp(App[None]):
             with open(file_path, "wb") as f:
                 f.write(content)
             return True
-        except PermissionError:
+        except Exception as e:
+            self.show_write_error(file_path, dialog_title, e)
+        return False
+
+    def show_write_error(self, file_path: str, dialog_title: str, error: Exception) -> None:
+        """Show an error message for a failure to write a file."""
+        if isinstance(error, PermissionError):
             self.message_box(dialog_title, _("Access denied."), "ok")
-        except FileNotFoundError:
+        elif isinstance(error, FileNotFoundError):
             self.message_box(dialog_title, _("%1 contains an invalid path.", file_path), "ok")
-        except OSError as e:
-            self.message_box(dialog_title, _("Failed to save document."), "ok", error=e)
+        elif isinstance(error, OSError):
+            self.message_box(dialog_title, _("Failed to save document."), "ok", error=error)
+        else:
+            self.message_box(dialog_title, _("An unexpected error occurred while writing %1.", file_path), "ok", error=error)
+
+    def show_save_progress(self, message: str) -> None:
+        """Show the progress of saving a file in the status bar."""
+        self.get_widget_by_id("status_text", Static).update(message)
+
+    def encode_and_write_file(self, encode: Callable[[], bytes], file_path: str, decode: bool) -> tuple[bytes, AnsiArtDocument | Exception | None] | None:
+        """Encode and write a file, and optionally decode what was written, in a worker thread.
+
+        The decoded document (or the error decoding it) is used to show any information lost in the file format.
+        Returns None if cancelled before writing.
+        """
+        file_name = os.path.basename(file_path)
+        self.call_from_thread(self.show_save_progress, _("Saving %1...", file_name))
+        worker = cast("Worker[Any]", get_current_worker())
+        content = encode()
+        # Once writing starts, it can't be cancelled, so the file isn't left half-written,
+        # and the save isn't reported as not done while the file is still changing.
+        if not self.call_from_thread(self.start_save_writing, worker):
+            return None
+        with open(file_path, "wb") as f:
+            for offset in range(0, len(content), SAVE_PROGRESS_BLOCK_SIZE):
+                f.write(content[offset:offset + SAVE_PROGRESS_BLOCK_SIZE])
+                if len(content) > SAVE_PROGRESS_BLOCK_SIZE:
+                    percent = min(100, (offset + SAVE_PROGRESS_BLOCK_SIZE) * 100 // len(content))
+                    self.call_from_thread(self.show_save_progress, _("Saving %1...", file_name) + f" {percent}%")
+        if not decode:
+            return content, None
+        self.call_from_thread(self.show_save_progress, _("Reloading %1...", file_name))
+        try:
+            return content, AnsiArtDocument.decode_based_on_file_extension(content, file_path)
         except Exception as e:
-            self.message_box(dialog_title, _("An unexpected error occurred while writing %1.", file_path), "ok", error=e)
-        return False
+            return content, e
 
-    def reload_after_save(self, content: bytes, file_path: str) -> bool:
+    def start_save_writing(self, worker: Worker[Any]) -> bool:
+        """Called from the save worker once the file is encoded. Returns False if the save was cancelled, otherwise stops it from being cancelled."""
+        if worker.is_cancelled:
+            return False
+        self.save_writing = True
+        return True
+
+    async def save_in_background(self, encode: Callable[[], bytes], file_path: str, dialog_title: str, decode: bool = False) -> tuple[bytes, AnsiArtDocument | Exception | None] | None:
+        """Encode and write a file without blocking input, showing progress in the status bar.
+
+        `encode` is called in a worker thread, so it must not use the document being edited.
+        If `decode` is True, the written content is also decoded, to pass to `reload_after_save`.
+        If another save is in progress, this one starts after it finishes, in order.
+        Returns None if the save failed, after showing an error message, or if it was cancelled with Escape.
+        """
+        async with self.save_queue:
+            worker = self.run_worker(
+                partial(self.encode_and_write_file, encode, file_path, decode),
+                name="save",
+                group="save",
+                exit_on_error=False,
+                thread=True,
+            )
+            self.save_worker = worker
+            self.save_writing = False
+            try:
+                return await worker.wait()
+            except WorkerCancelled:
+                return None
+            except WorkerFailed as e:
+                if isinstance(e.error, FormatWriteNotSupported):
+                    self.message_box(dialog_title, e.error.localized_message, "ok")
+                elif isinstance(e.error, Exception):
+                    self.show_write_error(file_path, dialog_title, e.error)
+                return None
+            finally:
+                self.save_worker = None
+                self.save_writing = False
+                self.show_save_progress(_("For Help, click Help Topics on the Help Menu."))
+
+    def get_image_encoder(self, format_id: str | None) -> Callable[[], bytes]:
+        """Copies the document, and returns a function that encodes the copy, for use in another thread while editing continues.
+
+        A memory-mapped document is copied file to file, rather than loaded into memory, and the copy is closed once encoded.
+        """
+        if is_mapped(self.image):
+            document = copy_mapped(self.image)
+        else:
+            document = AnsiArtDocument(self.image.width, self.image.height)
+            document.copy(self.image)
+        document.sauce = self.image.sauce
+        def encode() -> bytes:
+            try:
+                return document.encode_to_format(format_id)
+            finally:
+                close_mapped(document)
+        return encode
+
+    def reload_after_save(self, content: bytes, file_path: str, new_image: AnsiArtDocument | Exception | None = None) -> bool:
         """Reload the document from saved content, to show information loss from the file format.
 
+        If the content was already decoded, such as in a worker thread, pass the result (or error) as `new_image`.
+
         Unlike `open_from_file_path`, this method:
         - doesn't short circuit when the file path matches the current file path, crucially
         - skips backup management (discarding or checking for a backup)
@@ -706,24 +1272,36 @@ class PaintApp(App[None]):
         """
         # TODO: DRY error handling with open_from_file_path and action_paste_from
         try:
+            if isinstance(new_image, Exception):
+                raise new_image
+            if new_image is None:
+                new_image = AnsiArtDocument.decode_based_on_file_extension(content, file_path)
             self.resize_document(self.image.width, self.image.height) # (hackily) make this undoable
-            new_image = AnsiArtDocument.decode_based_on_file_extension(content, file_path)
             self.canvas.image = self.image = new_image
-            self.canvas.refresh(layout=True)
+            self.canvas.refresh_document(layout=True)
             # awkward to do this in here as well as externally, but this should be updated with the new undo count
             self.saved_undo_count = len(self.undos)
             self.update_palette_from_format_id(AnsiArtDocument.format_from_extension(file_path))
             return True
-        except UnicodeDecodeError:
-            self.message_box(_("Open"), file_path + "\n" + _("Paint cannot read this file.") + "\n" + _("Unexpected file format."), "ok")
-        except UnidentifiedImageError as e:
-            self.message_box(_("Open"), _("This is not a valid bitmap file, or its format is not currently supported."), "ok", error=e)
-        except FormatReadNotSupported as e:
-            self.message_box(_("Open"), e.localized_message, "ok")
         except Exception as e:
-            self.message_box(_("Open"), _("An unexpected error occurred while reading %1.", file_path), "ok", error=e)
+            self.show_read_error(file_path, e)
         return False
 
+    def show_read_error(self, file_path: str, error: Exception) -> None:
+        """Show an error message for a failure to read or decode a file."""
+        if isinstance(error, UnicodeDecodeError):
+            self.message_box(_("Open"), file_path + "\n" + _("Paint cannot read this file.") + "\n" + _("Unexpected file format."), "ok")
+        elif isinstance(error, UnidentifiedImageError):
+            self.message_box(_("Open"), _("This is not a valid bitmap file, or its format is not currently supported."), "ok", error=error)
+        elif isinstance(error, FormatReadNotSupported):
+            self.message_box(_("Open"), error.localized_message, "ok")
+        elif isinstance(error, FileNotFoundError):
+            self.message_box(_("Open"), file_path + "\n" + _("File not found.") + "\n" + _("Please verify that the correct path and file name are given."), "ok")
+        elif isinstance(error, PermissionError):
+            self.message_box(_("Open"), file_path + "\n" + _("Access denied."), "ok")
+        else:
+            self.message_box(_("Open"), _("An unexpected error occurred while reading %1.", file_path), "ok", error=error)
+
     def update_palette_from_format_id(self, format_id: str | None) -> None:
         """Update the palette based on the file format.
 
@@ -750,21 +1328,26 @@ class PaintApp(App[None]):
             # Note: `should_reload` implies information loss, but information loss doesn't imply `should_reload`.
             # In the case of write-only formats, this function should return False.
             should_reload = await self.confirm_information_loss_async(format_id)
-            try:
-                content = self.image.encode_to_format(format_id)
-            except FormatWriteNotSupported as e:
-                self.message_box(_("Save"), e.localized_message, "ok")
+            file_path = self.file_path
+            undo_count = len(self.undos)
+            result = await self.save_in_background(self.get_image_encoder(format_id), file_path, dialog_title, decode=should_reload)
+            if result is None:
                 return False
-            if self.write_file_path(self.file_path, content, dialog_title):
-                self.saved_undo_count = len(self.undos) # also set in reload_after_save
-                if should_reload:
-                    # Note: this fails to preview the lost information in the case
-                    # of saving the old file in prompt_save_changes,
-                    # because the document will be unloaded.
-                    return self.reload_after_save(content, self.file_path)
+            content, new_image = result
+            if file_path == self.file_path:
+                # Don't mistake our own save for a change by another program.
+                self.remember_file_signature()
+            if len(self.undos) != undo_count:
+                # The document was edited while saving, so it's not all saved,
+                # and reloading to show information loss would hide the new changes.
                 return True
-            else:
-                return False
+            self.saved_undo_count = undo_count # also set in reload_after_save
+            if should_reload:
+                # Note: this fails to preview the lost information in the case
+                # of saving the old file in prompt_save_changes,
+                # because the document will be unloaded.
+                return self.reload_after_save(content, file_path, new_image)
+            return True
         else:
             await self.save_as()
             # If the user cancels the Save As dialog, we'll never get here.
@@ -794,20 +1377,22 @@ class PaintApp(App[None]):
             def on_save_confirmed() -> None:
                 async def async_on_save_confirmed() -> None:
                     self.stop_action_in_progress()
-                    try:
-                        content = self.image.encode_to_format(format_id)
-                    except FormatWriteNotSupported as e:
-                        self.message_box(_("Save As"), e.localized_message, "ok")
-                        return
-
-                    success = self.write_file_path(file_path, content, _("Save As"))
-                    if success:
+                    undo_count = len(self.undos)
+                    result = await self.save_in_background(self.get_image_encoder(format_id), file_path, _("Save As"), decode=reload_after_save)
+                    if result is not None:
+                        content, new_image = result
                         self.discard_backup() # for OLD file_path (must be done before changing self.file_path)
                         self.file_path = file_path
-                        self.saved_undo_count = len(self.undos) # also set in reload_after_save
+                        # Also needed if saving over the same file, in which case file_path's watcher isn't called.
+                        self.remember_file_signature()
                         window.close()
-                        if reload_after_save:
-                            if not self.reload_after_save(content, file_path):
+                        # If the document was edited while saving, it's not all saved,
+                        # and reloading to show information loss would hide the new changes.
+                        unchanged = len(self.undos) == undo_count
+                        if unchanged:
+                            self.saved_undo_count = undo_count # also set in reload_after_save
+                        if reload_after_save and unchanged:
+                            if not self.reload_after_save(content, file_path, new_image):
                                 # I'm unsure about this.
                                 # Also, if backup recovery is to happen below,
                                 # it should happen in this case too I think.
@@ -859,16 +1444,12 @@ class PaintApp(App[None]):
 
             def on_save_confirmed():
                 async def async_on_save_confirmed():
-                    try:
-                        content = self.get_selected_content(file_path)
-                    except FormatWriteNotSupported as e:
-                        self.message_box(_("Copy To"), e.localized_message, "ok")
-                        return
-                    if content is None:
+                    encode = self.get_selected_content_encoder(file_path)
+                    if encode is None:
                         # confirm_overwrite dialog isn't modal, so we need to check again
                         self.message_box(_("Copy To"), _("No selection."), "ok")
                         return
-                    if self.write_file_path(file_path, content, _("Copy To")):
+                    if await self.save_in_background(encode, file_path, _("Copy To")) is not None:
                         window.close()
                 # https://textual.textualize.io/blog/2023/02/11/the-heisenbug-lurking-in-your-async-code/
                 task = asyncio.create_task(async_on_save_confirmed())
@@ -968,16 +1549,21 @@ class PaintApp(App[None]):
         It can't be reloaded if it's not openable.
         Some formats like PDF (currently) are color-only and can't be opened.
         """
-        # TODO: don't warn if the information is not present
         # Note: image formats will lose any FOREGROUND color information.
         # This could be considered part of the text information, but could be mentioned.
         # Also, it could be confusing if a file uses a lot of full block characters (█).
         non_openable = format_id in ("HTML", "RICH_CONSOLE_MARKUP") or (format_id in Image.SAVE and not format_id in Image.OPEN)
-        supports_text_and_color = format_id in ("ANSI", "SVG", "HTML", "RICH_CONSOLE_MARKUP", "IRC")
+        supports_text_and_color = format_id in ("ANSI", "SVG", "HTML", "RICH_CONSOLE_MARKUP", "IRC", "TPAINT")
+        # Only warn if the information is actually present in the document.
+        analysis = self.get_document_analysis()
         # Note: "IRC" format supports text and color, but only limited colors,
-        # so it still needs a warning.
-        if format_id in ["PLAINTEXT", "IRC"]:
+        # so it still needs a warning, if colors outside of its palette are used.
+        if format_id == "PLAINTEXT" and (analysis.uses_non_default_colors() or analysis.has_attributes):
+            self.confirm_lose_color_information(lambda: callback(True))
+        elif format_id == "IRC" and (analysis.colors_outside(IRC_PALETTE) or analysis.has_attributes):
             self.confirm_lose_color_information(lambda: callback(True))
+        elif format_id in ["PLAINTEXT", "IRC"]:
+            callback(False)
         elif format_id in SAVE_DISABLED_FORMATS:
             # We will show an error when attempting to encode.
             # Any warning here would just be annoying preamble to the error.
@@ -990,7 +1576,12 @@ class PaintApp(App[None]):
                 callback(False)
         elif format_id in Image.SAVE:
             # Image formats Pillow supports for writing
-            if non_openable:
+            if not analysis.has_text:
+                if non_openable:
+                    self.confirm_save_non_openable_file(lambda: callback(False))
+                else:
+                    callback(False)
+            elif non_openable:
                 self.confirm_save_non_openable_file(lambda: self.confirm_lose_text_information(lambda: callback(False)))
             else:
                 self.confirm_lose_text_information(lambda: callback(True))
@@ -999,6 +1590,13 @@ class PaintApp(App[None]):
             # An error message will be shown when attempting to encode.
             callback(False)
 
+    def get_document_analysis(self) -> DocumentAnalysis:
+        """Returns the characters and styles used in the document, reusing the last analysis if the document hasn't changed."""
+        version = (id(self.image), self.canvas.document_version, len(self.undos), id(self.undos[-1]) if self.undos else None)
+        if self.document_analysis is None or self.document_analysis[0] != version:
+            self.document_analysis = (version, self.image.analyze())
+        return self.document_analysis[1]
+
     async def confirm_information_loss_async(self, format_id: str | None) -> bool:
         """Confirms discarding information when saving as a particular format. Awaitable variant, which uses the callback variant."""
         future = asyncio.get_running_loop().create_future()
@@ -1017,6 +1615,16 @@ class PaintApp(App[None]):
             print(f"Not discarding backup {backup_file_path!r} because it doesn't match the backup file checked for: {self.backup_checked_for!r}")
             return
         print("Discarding backup (if it exists):", backup_file_path)
+        # Don't let a backup that's still being written bring the file back.
+        self.workers.cancel_group(self, "backup")
+        self.backup_generation += 1
+        self.backup_content_hash = None
+        self.journal_checkpoint_hash = None
+        self.journal_records_since_backup = []
+        try:
+            os.remove(backup_file_path + JOURNAL_SUFFIX)
+        except OSError:
+            pass
         # import traceback
         # traceback.print_stack()
         try:
@@ -1137,14 +1745,20 @@ class PaintApp(App[None]):
             if opened:
                 opened_callback()
         try:
-            if os.path.getsize(file_path) > MAX_FILE_SIZE:
+            # Very large native documents are opened memory-mapped, with only the rows in use loaded,
+            # so the file size limit doesn't apply to them.
+            mapped = AnsiArtDocument.format_from_extension(file_path) == "TPAINT" and math.prod(read_native_size(file_path)) >= MAPPED_DOCUMENT_MIN_CELLS
+            if not mapped and os.path.getsize(file_path) > MAX_FILE_SIZE:
                 self.message_box(_("Open"), _("The file is too large to open."), "ok")
                 return
             with open(file_path, "rb") as f:
-                content = f.read()  # f is out of scope in go_ahead()
+                content = b"" if mapped else f.read()  # f is out of scope in go_ahead()
                 def go_ahead():
                     # Note: exceptions handled outside of this function (UnicodeDecodeError, UnidentifiedImageError, FormatReadNotSupported)
-                    new_image = AnsiArtDocument.decode_based_on_file_extension(content, file_path)
+                    if mapped:
+                        new_image = open_native_mapped(file_path)
+                    else:
+                        new_image = AnsiArtDocument.decode_based_on_file_extension(content, file_path)
 
                     # action_new handles discarding the backup, and recovering from Untitled.ans~, by default
                     # but we need to 1. handle the case where the backup is the file to be opened,
@@ -1166,7 +1780,7 @@ class PaintApp(App[None]):
 
                     self.action_new(force=True, manage_backup=False)
                     self.canvas.image = self.image = new_image
-                    self.canvas.refresh(layout=True)
+                    self.canvas.refresh_document(layout=True)
                     self.file_path = file_path
                     self.update_palette_from_format_id(AnsiArtDocument.format_from_extension(file_path))
                     # Should this set self.saved_undo_count?
@@ -1259,9 +1873,11 @@ class PaintApp(App[None]):
         if manage_backup:
             self.discard_backup() # for OLD file_path (must be done before changing self.file_path)
 
+        # The undo history is cleared below, so nothing refers to the old document anymore.
+        close_mapped(self.image)
         self.image = AnsiArtDocument(80, 24)
         self.canvas.image = self.image
-        self.canvas.refresh(layout=True)
+        self.canvas.refresh_document(layout=True)
         self.file_path = None
         self.saved_undo_count = 0
         self.backup_saved_undo_count = 0
@@ -1559,6 +2175,16 @@ Columns: {len(self.palette) // 2}
         Raises FormatWriteNotSupported if the file_path implies a format that can't be encoded.
         Defaults to ANSI if `file_path` is None (or empty string).
         """
+        encode = self.get_selected_content_encoder(file_path)
+        if encode is None:
+            return None
+        return encode()
+
+    def get_selected_content_encoder(self, file_path: str|None = None) -> Callable[[], bytes] | None:
+        """Returns a function that encodes the content of the selection, like `get_selected_content`, or None if there's no selection.
+
+        The selection is copied first, so the function can be called from another thread while editing continues.
+        """
         sel = self.image.selection
         if sel is None:
             return None
@@ -1571,13 +2197,14 @@ Columns: {len(self.palette) // 2}
                 assert sel.contained_image is not None
             if sel.textbox_mode:
                 text = selected_text(sel).encode("utf-8")
-            else:
-                format_id = AnsiArtDocument.format_from_extension(file_path) if file_path else "ANSI"
-                text = sel.contained_image.encode_to_format(format_id)
+                return lambda: text
+            format_id = AnsiArtDocument.format_from_extension(file_path) if file_path else "ANSI"
+            document = AnsiArtDocument(sel.contained_image.width, sel.contained_image.height)
+            document.copy(sel.contained_image)
+            return lambda: document.encode_to_format(format_id)
         finally:
             if not had_contained_image:
                 sel.contained_image = None
-        return text
 
     def action_copy(self, from_ctrl_c: bool = False) -> bool:
         """Copy the selection to the clipboard."""
@@ -1740,7 +2367,16 @@ Columns: {len(self.palette) // 2}
         self.show_grid = not self.show_grid
 
     def action_toggle_thumbnail(self) -> None:
-        self.message_box(_("Paint"), "Not implemented.", "ok")
+        """Show or hide the thumbnail view of the picture."""
+        for window in self.query("#thumbnail_window").results(Window):
+            window.close()
+            return
+        window = Window(
+            title=_("Thumbnail"),
+            id="thumbnail_window",
+        )
+        self.mount(window)
+        window.content.mount(Thumbnail(self.image))
 
     def action_view_bitmap(self) -> None:
         """Shows the image in full-screen, without the UI."""
@@ -1819,62 +2455,44 @@ Columns: {len(self.palette) // 2}
         self.query_one("#angle", RadioSet).disabled = event.pressed.id != "rotate_by_angle"
 
     def action_flip_horizontal(self) -> None:
-        """Flip the image horizontally."""
-
-        action = Action(_("Flip horizontal"), Region(0, 0, self.image.width, self.image.height))
-        action.is_full_update = True
-        action.update(self.image)
-        self.add_action(action)
-
-        source = AnsiArtDocument(self.image.width, self.image.height)
-        source.copy(self.image)
-        for y in range(self.image.height):
-            for x in range(self.image.width):
-                self.image.ch[y][self.image.width - x - 1] = source.ch[y][x]
-                self.image.st[y][self.image.width - x - 1] = source.st[y][x]
-        self.canvas.refresh()
+        """Flip the image or selection horizontally."""
+        if not self.transform_selection(lambda sel: sel.flip(horizontal=True)):
+            self.apply_transform(TransformAction(_("Flip horizontal"), Transform.flip_horizontal, Region(0, 0, self.image.width, self.image.height)))
 
     def action_flip_vertical(self) -> None:
-        """Flip the image vertically."""
-
-        action = Action(_("Flip vertical"), Region(0, 0, self.image.width, self.image.height))
-        action.is_full_update = True
-        action.update(self.image)
-        self.add_action(action)
-
-        source = AnsiArtDocument(self.image.width, self.image.height)
-        source.copy(self.image)
-        for y in range(self.image.height):
-            for x in range(self.image.width):
-                self.image.ch[self.image.height - y - 1][x] = source.ch[y][x]
-                self.image.st[self.image.height - y - 1][x] = source.st[y][x]
-        self.canvas.refresh()
+        """Flip the image or selection vertically."""
+        if not self.transform_selection(lambda sel: sel.flip(horizontal=False)):
+            self.apply_transform(TransformAction(_("Flip vertical"), Transform.flip_vertical, Region(0, 0, self.image.width, self.image.height)))
 
     def action_rotate_by_angle(self, angle: int) -> None:
-        """Rotate the image by the given angle, one of 90, 180, or 270."""
-        action = Action(_("Rotate by angle"), Region(0, 0, self.image.width, self.image.height))
-        action.is_full_update = True
-        action.update(self.image)
-        self.add_action(action)
+        """Rotate the image or selection by the given angle, one of 90, 180, or 270."""
+        if not self.transform_selection(lambda sel: sel.rotate(angle)):
+            self.apply_transform(TransformAction(_("Rotate by angle"), Transform.rotate, Region(0, 0, self.image.width, self.image.height), angle))
 
-        source = AnsiArtDocument(self.image.width, self.image.height)
-        source.copy(self.image)
+    def apply_transform(self, action: TransformAction) -> None:
+        """Perform an invertible transform on the document, adding it to the undo history."""
+        self.add_action(action)
+        action.apply(self.image)
+        self.canvas.refresh_document(layout=action.transform == Transform.rotate)
 
-        if angle != 180:
-            self.image.resize(self.image.height, self.image.width)
+    def transform_selection(self, transform: Callable[[Selection], None]) -> bool:
+        """Transform the selection, if there is one, extracting it first if needed.
 
-        for y in range(self.image.height):
-            for x in range(self.image.width):
-                if angle == 90:
-                    self.image.ch[y][x] = source.ch[self.image.width - x - 1][y]
-                    self.image.st[y][x] = source.st[self.image.width - x - 1][y]
-                elif angle == 180:
-                    self.image.ch[y][x] = source.ch[self.image.height - y - 1][self.image.width - x - 1]
-                    self.image.st[y][x] = source.st[self.image.height - y - 1][self.image.width - x - 1]
-                elif angle == 270:
-                    self.image.ch[y][x] = source.ch[x][self.image.height - y - 1]
-                    self.image.st[y][x] = source.st[x][self.image.height - y - 1]
-        self.canvas.refresh(layout=True)
+        Returns whether there was a selection, in which case the image is left alone.
+        """
+        sel = self.image.selection
+        if sel is None:
+            return False
+        self.cancel_preview()
+        if sel.textbox_mode:
+            return True
+        if sel.contained_image is None:
+            self.extract_to_selection()
+        # Note: no undo state will be created if the selection is already extracted
+        region_before = sel.region
+        transform(sel)
+        self.canvas.refresh_scaled_region(region_before.union(sel.region))
+        return True
 
     def action_stretch_skew(self) -> None:
         """Open the stretch/skew dialog."""
@@ -1956,9 +2574,7 @@ Columns: {len(self.palette) // 2}
         self.mount(window)
 
     def action_stretch_skew_by(self, horizontal_stretch: float, vertical_stretch: float, horizontal_skew: float, vertical_skew: float) -> None:
-        """Stretch/skew the image by the given amounts."""
-
-        default_style = Style(color="#000000", bgcolor="#ffffff")
+        """Stretch/skew the image or selection by the given amounts."""
 
         # Convert units
         horizontal_stretch = horizontal_stretch / 100
@@ -1966,65 +2582,25 @@ Columns: {len(self.palette) // 2}
         horizontal_skew = math.radians(horizontal_skew)
         vertical_skew = math.radians(vertical_skew)
 
+        matrix = (
+            horizontal_stretch, -math.tan(horizontal_skew) * vertical_stretch,
+            -math.tan(vertical_skew) * horizontal_stretch, vertical_stretch,
+        )
+        if self.transform_selection(lambda sel: sel.transform(matrix)):
+            return
+
         # Record original state for undo
         action = Action(_("Stretch/skew"), Region(0, 0, self.image.width, self.image.height))
         action.is_full_update = True
         action.update(self.image)
         self.add_action(action)
 
-        # Record original state for the transform (yes this is a bit inefficient)
-        # (technically we could use action.sub_image_before)
-        source = AnsiArtDocument(self.image.width, self.image.height)
-        source.copy(self.image)
-
-        w = source.width * horizontal_stretch
-        h = source.height * vertical_stretch
-
-        # Find bounds of transformed image, from each corner
-        bb_min_x = float("inf")
-        bb_max_x = float("-inf")
-        bb_min_y = float("inf")
-        bb_max_y = float("-inf")
-        for x01, y01 in ((0, 0), (0, 1), (1, 0), (1, 1)):
-            x = math.tan(-horizontal_skew) * h * x01 + w * y01
-            y = math.tan(-vertical_skew) * w * y01 + h * x01
-            bb_min_x = min(bb_min_x, x)
-            bb_max_x = max(bb_max_x, x)
-            bb_min_y = min(bb_min_y, y)
-            bb_max_y = max(bb_max_y, y)
-
-        bb_x = bb_min_x
-        bb_y = bb_min_y
-        bb_w = bb_max_x - bb_min_x
-        bb_h = bb_max_y - bb_min_y
-
-        # self.image.resize(0, 0) # clear the image
-        self.image.resize(max(1, int(bb_w)), max(1, int(bb_h)))
-
-        # Reverse transformation matrix values
-        x_scale = 1 / horizontal_stretch
-        v_skew = -vertical_skew
-        h_skew = -horizontal_skew
-        y_scale = 1 / vertical_stretch
-
-        for y in range(self.image.height):
-            for x in range(self.image.width):
-                # Apply inverse transformation
-                sample_x = x_scale * x - math.tan(h_skew) * y + bb_x
-                sample_y = -math.tan(v_skew) * x + y_scale * y + bb_y
-
-                # Convert to integer coordinates
-                # round() causes artifacts where for instance a 200% stretch will result in a 3-1-3-1 pattern instead of 2-2-2-2
-                sample_x = int(sample_x)
-                sample_y = int(sample_y)
-
-                if 0 <= sample_x < source.width and 0 <= sample_y < source.height:
-                    self.image.ch[y][x] = source.ch[sample_y][sample_x]
-                    self.image.st[y][x] = source.st[sample_y][sample_x]
-                else:
-                    self.image.ch[y][x] = " "
-                    self.image.st[y][x] = default_style
-        self.canvas.refresh(layout=True)
+        transformed = self.image.transformed(matrix)
+        self.image.width = transformed.width
+        self.image.height = transformed.height
+        self.image.ch = transformed.ch
+        self.image.st = transformed.st
+        self.canvas.refresh_document(layout=True)
 
     def action_invert_colors_unless_should_switch_focus(self) -> None:
         """Try to distinguish between Tab and Ctrl+I scenarios."""
@@ -2062,13 +2638,7 @@ Columns: {len(self.palette) // 2}
             sel.contained_image.invert()
             self.canvas.refresh_scaled_region(sel.region)
         else:
-            # TODO: DRY undo state creation
-            action = Action(_("Invert Colors"), Region(0, 0, self.image.width, self.image.height))
-            action.update(self.image)
-            self.add_action(action)
-
-            self.image.invert()
-            self.canvas.refresh()
+            self.apply_transform(TransformAction(_("Invert Colors"), Transform.invert, Region(0, 0, self.image.width, self.image.height)))
 
     def resize_document(self, width: int, height: int) -> None:
         """Resize the document, creating an undo state, and refresh the canvas."""
@@ -2084,7 +2654,7 @@ Columns: {len(self.palette) // 2}
 
         self.image.resize(width, height, default_bg=self.selected_bg_color, default_fg=self.selected_fg_color)
 
-        self.canvas.refresh(layout=True)
+        self.canvas.refresh_document(layout=True)
 
     def action_attributes(self) -> None:
         """Show dialog to set the image attributes."""
@@ -2146,7 +2716,7 @@ Columns: {len(self.palette) // 2}
                 self.image.ch[y][x] = " "
                 self.image.st[y][x] = default_style
 
-        self.canvas.refresh()
+        self.canvas.refresh_document()
 
     def action_draw_opaque(self) -> None:
         """Toggles opaque/transparent selection mode."""
@@ -2231,6 +2801,7 @@ Columns: {len(self.palette) // 2}
                     MenuItem(_("Set As Wa&llpaper (Centered)"), self.action_set_as_wallpaper_centered, 57675, description=_("Centers this bitmap as the desktop wallpaper.")),
                     Separator(),
                     MenuItem(_("Recent File"), self.action_recent_file, 57616, grayed=True, description=_("Opens this document.")),
+                    MenuItem(_("Re&cover Session..."), self.action_recover_session, description=_("Opens a backup saved in a previous session.")),
                     Separator(),
                     # MenuItem(_("E&xit\tAlt+F4"), self.action_exit, 57665, description=_("Quits Paint.")),
                     MenuItem(_("E&xit\tCtrl+Q"), self.action_exit, 57665, description=_("Quits Paint.")),
@@ -2260,7 +2831,7 @@ Columns: {len(self.palette) // 2}
                         MenuItem(_("C&ustom..."), self.action_custom_zoom, 37672, description=_("Zooms the picture.")),
                         Separator(),
                         MenuItem(_("Show &Grid\tCtrl+G"), self.action_toggle_grid, 37677, description=_("Shows or hides the grid.")),
-                        MenuItem(_("Show T&humbnail"), self.action_toggle_thumbnail, 37676, grayed=True, description=_("Shows or hides the thumbnail view of the picture.")),
+                        MenuItem(_("Show T&humbnail"), self.action_toggle_thumbnail, 37676, description=_("Shows or hides the thumbnail view of the picture.")),
                     ])),
                     MenuItem(_("&View Bitmap\tCtrl+F"), self.action_view_bitmap, 37673, description=_("Displays the entire picture.")),
                 ])),
@@ -2406,33 +2977,28 @@ Columns: {len(self.palette) // 2}
         sel = self.image.selection
         assert sel is not None, "extract_to_selection called without a selection"
         assert sel.contained_image is None, "extract_to_selection called after a selection was already extracted"
-        # TODO: DRY action handling
-        self.image_at_start = AnsiArtDocument(self.image.width, self.image.height)
-        self.image_at_start.copy_region(self.image)
-        action = Action(self.selected_tool.get_name())
-        self.add_action(action)
+        # Only the region being cut out is recorded here.
+        # When the selection is melded into the document, or stamped with Ctrl+drag,
+        # the region it lands on is added to the same action, so it's all undone together.
+        self.selection_action = None
+        self.record_selection_region(sel.region)
         sel.copy_from_document(self.image)
         if erase_underlying:
             self.erase_region(sel.region, sel.mask)
+        self.canvas.refresh_scaled_region(sel.region)
 
-        # TODO: Optimize the region storage for Text, Select, and Free-Form Select tools.
-        # Right now I'm copying the whole image here, because later, when the selection is melded into the canvas,
-        # it _implicitly updates_ the undo action, by changing the document without creating a new Action.
-        # This is the intended behavior, in that it allows the user to undo the
-        # selection and any changes to it as one action. But it's not efficient for large images.
-        # I could:
-        # - Update the region when melding to be the union of the two rectangles.
-        # - Make Action support a list of regions, and add the new region on meld.
-        # - Make Action support a list of sub-actions (or just one), and make meld a sub-action.
-        # - Add a new Action on meld, but mark it for skipping when undoing, and skipping ahead to when redoing.
-
-        # `affected_region = sel.region` doesn't encompass the new region when melding
-        affected_region = Region(0, 0, self.image.width, self.image.height)
-
-        action.region = affected_region
-        action.region = action.region.intersection(Region(0, 0, self.image.width, self.image.height))
-        action.update(self.image_at_start)
-        self.canvas.refresh_scaled_region(affected_region)
+    def record_selection_region(self, region: Region, name: str | None = None) -> None:
+        """Record a region of the document that the selection is about to modify, for undo.
+
+        The region is added to the selection's undo action, or a new action is created
+        if there isn't one, or it's no longer the latest action.
+        """
+        action = self.selection_action
+        if action is None or not self.undos or self.undos[-1] is not action:
+            action = CompoundAction(name or self.selected_tool.get_name())
+            self.add_action(action)
+            self.selection_action = action
+        action.add_region(self.image, region)
 
     def on_canvas_tool_start(self, event: Canvas.ToolStart) -> None:
         """Called when the user starts drawing on the canvas."""
@@ -2490,14 +3056,7 @@ Columns: {len(self.palette) // 2}
                         # Otherwise, one should have been already created.
                         if sel.pasted:
                             sel.pasted = False # don't create undo when melding (TODO: rename flag or refactor)
-
-                            action = Action("Paste")
-                            self.add_action(action)
-                            # The region must be the whole canvas, because when the selection
-                            # is melded with the canvas, it could be anywhere.
-                            # This could be optimized, see extract_to_selection.
-                            action.region = Region(0, 0, self.image.width, self.image.height)
-                            action.update(self.image)
+                        self.record_selection_region(sel.region, "Paste")
                         sel.copy_to_document(self.image)
                         # Don't need to refresh canvas since selection occludes the affected region,
                         # and has the same content anyway, being a stamp.
@@ -2507,28 +3066,30 @@ Columns: {len(self.palette) // 2}
             self.meld_selection()
             return
 
-        self.image_at_start = AnsiArtDocument(self.image.width, self.image.height)
-        self.image_at_start.copy_region(self.image)
-        action = Action(self.selected_tool.get_name())
+        if self.selected_tool in [Tool.line, Tool.rectangle, Tool.ellipse, Tool.rounded_rectangle]:
+            # The shape is drawn as the mouse moves, and added to the undo history when the mouse is released.
+            self.rubber_band = RubberBand(self.selected_tool.get_name())
+            return
+
+        # Each region is saved in the undo state just before it's drawn over, as the stroke continues.
+        action = CompoundAction(self.selected_tool.get_name())
         self.add_action(action)
 
         affected_region = None
         if self.selected_tool == Tool.pencil or self.selected_tool == Tool.brush:
-            affected_region = self.stamp_brush(event.x, event.y)
+            affected_region = self.draw_for_undo(action, lambda: self.stamp_brush(event.x, event.y))
         elif self.selected_tool == Tool.fill:
-            affected_region = flood_fill(self.image, event.x, event.y, self.selected_char, self.selected_fg_color, self.selected_bg_color)
+            fill_result = flood_fill(
+                self.image, event.x, event.y, self.selected_char, self.selected_fg_color, self.selected_bg_color,
+                before_fill=lambda region, mask: action.add_region(self.image, region, mask),
+            )
+            if fill_result:
+                affected_region = fill_result[0]
 
+        # If flood fill didn't affect anything, following MS Paint, we still created an undo action,
+        # but we don't need to refresh the canvas.
         if affected_region:
-            action.region = affected_region
-            action.region = action.region.intersection(Region(0, 0, self.image.width, self.image.height))
-            action.update(self.image_at_start)
             self.canvas.refresh_scaled_region(affected_region)
-        else:
-            # Flood fill didn't affect anything.
-            # Following MS Paint, we still created an undo action.
-            # We need a region to avoid an error/warning when undoing.
-            # But we don't need to refresh the canvas.
-            action.region = Region(0, 0, 0, 0)
 
     def cancel_preview(self) -> None:
         """Revert the currently previewed action."""
@@ -2562,22 +3123,21 @@ Columns: {len(self.palette) // 2}
     def make_preview(self, draw_proc: Callable[[], Region], show_dimensions_in_status_bar: bool = False) -> None:
         """Preview the result of a draw operation, using a temporary action. Optionally preview dimensions in status bar."""
         self.cancel_preview()
-        image_before = AnsiArtDocument(self.image.width, self.image.height)
-        image_before.copy_region(self.image)
-        affected_region = draw_proc()
-        if affected_region:
-            self.preview_action = Action(self.selected_tool.get_name())
-            self.preview_action.region = affected_region.intersection(Region(0, 0, self.image.width, self.image.height))
-            self.preview_action.update(image_before)
-            self.canvas.refresh_scaled_region(affected_region)
+        action = CompoundAction(self.selected_tool.get_name())
+        self.draw_for_undo(action, draw_proc)
+        if action.region:
+            self.preview_action = action
+            self.canvas.refresh_scaled_region(action.region)
             if show_dimensions_in_status_bar:
                 self.get_widget_by_id("status_dimensions", Static).update(
-                    f"{self.preview_action.region.width}x{self.preview_action.region.height}"
+                    f"{action.region.width}x{action.region.height}"
                 )
 
     def on_canvas_tool_preview_update(self, event: Canvas.ToolPreviewUpdate) -> None:
         """Called when the user is hovering over the canvas but not drawing yet."""
         event.stop()
+        # Any further mouse movement will be sent in a new message.
+        event.handled = True
 
         self.get_widget_by_id("status_coords", Static).update(f"{event.x},{event.y}")
 
@@ -2631,6 +3191,16 @@ Columns: {len(self.palette) // 2}
             self.canvas.magnifier_preview_region = Region(rect_x, rect_y, rect_w, rect_h)
             self.canvas.refresh_scaled_region(self.canvas.magnifier_preview_region)
 
+    def on_canvas_document_changed(self, event: Canvas.DocumentChanged) -> None:
+        """Called when the document changes, to update the thumbnail view and the backup journal."""
+        event.stop()
+        if event.regions is None:
+            self.journal_whole_document = True
+        else:
+            self.journal_regions.extend(event.regions)
+        for thumbnail in self.query("#thumbnail_window Thumbnail").results(Thumbnail):
+            thumbnail.invalidate(self.image, event.regions)
+
     def on_canvas_tool_preview_stop(self, event: Canvas.ToolPreviewStop) -> None:
         """Called when the user stops hovering over the canvas (while previewing, not drawing)."""
         event.stop()
@@ -2682,14 +3252,14 @@ Columns: {len(self.palette) // 2}
             # TODO: refactor to a flag that says whether an undo state was already created
             make_undo_state = (self.image.selection.contained_image is None and not meld) or self.image.selection.pasted
 
+        region = self.image.selection.region
         if make_undo_state:
-            # TODO: DRY with other undo state creation
-            self.image_at_start = AnsiArtDocument(self.image.width, self.image.height)
-            self.image_at_start.copy_region(self.image)
-            action = Action(self.selected_tool.get_name())
-            self.add_action(action)
+            self.selection_action = None
+            self.record_selection_region(region)
+        elif meld and self.image.selection.contained_image is not None:
+            # Add the region the selection is melded into to the undo state created when it was cut out.
+            self.record_selection_region(region)
 
-        region = self.image.selection.region
         if meld:
             self.image.selection.copy_to_document(self.image)
         else:
@@ -2697,19 +3267,11 @@ Columns: {len(self.palette) // 2}
                 # It hasn't been cut out yet, so we need to erase it.
                 self.erase_region(region, self.image.selection.mask)
         self.image.selection = None
+        self.selection_action = None
         self.canvas.refresh_scaled_region(region)
         self.selection_drag_offset = None
         self.selecting_text = False
 
-        if make_undo_state:
-            action = action  # type: ignore
-            affected_region = region
-            # TODO: DRY with other undo state creation
-            action.region = affected_region
-            action.region = action.region.intersection(Region(0, 0, self.image.width, self.image.height))
-            action.update(self.image_at_start)
-            self.canvas.refresh_scaled_region(affected_region)
-
     def meld_selection(self) -> None:
         """Draw the selection onto the image and dissolve the selection."""
         self.meld_or_clear_selection(meld=True)
@@ -2730,8 +3292,13 @@ Columns: {len(self.palette) // 2}
 
         Several tools do a preview of sorts here, even though it's not the ToolPreviewUpdate event.
         TODO: rename these events to describe when they occur, ascribe less semantics to them.
+
+        Mouse movement is coalesced while this event waits in the queue (see `Canvas.ToolUpdate`),
+        so shape tools only draw the latest position, while freehand tools follow `event.points`.
         """
         event.stop()
+        # Any further mouse movement will be sent in a new message.
+        event.handled = True
         self.cancel_preview()
 
         if self.mouse_gesture_cancelled:
@@ -2781,7 +3348,7 @@ Columns: {len(self.palette) // 2}
                 # Handles constraints and canvas refresh.
                 self.move_selection_absolute(*offset)
             elif self.selected_tool == Tool.free_form_select:
-                self.tool_points.append(Offset(event.x, event.y))
+                self.tool_points.extend(event.points)
                 self.make_preview(self.draw_current_free_form_select_polyline, show_dimensions_in_status_bar=True)
             else:
                 self.canvas.select_preview_region = self.get_select_region(self.mouse_at_start, Offset(event.x, event.y))
@@ -2803,38 +3370,37 @@ Columns: {len(self.palette) // 2}
                 self.make_preview(self.draw_current_polyline, show_dimensions_in_status_bar=True)
             return
 
-        # The remaining tools work by updating an undo state created on mouse down.
-        assert len(self.undos) > 0, "No undo state to update. The undo state should have been created in on_canvas_tool_start, or if the gesture was canceled, execution shouldn't reach here."
-
-        action = self.undos[-1]
+        # Shape tools redraw the shape over the cells it covered, restoring only those cells first.
+        # The remaining tools add to an undo state created on mouse down.
+        rubber_band = self.rubber_band
+        replaced_region: Optional[Region] = None
+        if rubber_band:
+            replaced_region = rubber_band.restore(self.image)
         affected_region = None
 
-        replace_action = self.selected_tool in [Tool.ellipse, Tool.rectangle, Tool.line, Tool.rounded_rectangle]
-        old_action: Optional[Action] = None  # avoid "possibly unbound"
-        if replace_action:
-            old_action = self.undos.pop()
-            old_action.undo(self.image)
-            action = Action(self.selected_tool.get_name(), affected_region)
-            self.undos.append(action)
-
         if self.selected_tool in [Tool.pencil, Tool.brush, Tool.eraser, Tool.airbrush]:
-            for x, y in bresenham_walk(self.mouse_previous.x, self.mouse_previous.y, event.x, event.y):
-                affected_region = self.stamp_brush(x, y, affected_region)
+            assert len(self.undos) > 0, "No undo state to update. The undo state should have been created in on_canvas_tool_start, or if the gesture was canceled, execution shouldn't reach here."
+            action = self.undos[-1]
+            assert isinstance(action, CompoundAction), "The undo state for a stroke should be a CompoundAction"
+            stroke_points = [self.mouse_previous] + event.points
+            affected_region = self.draw_for_undo(action, lambda: self.stamp_brush_stroke(polyline_walk(stroke_points)))
         elif self.selected_tool == Tool.line:
-            for x, y in bresenham_walk(self.mouse_at_start.x, self.mouse_at_start.y, event.x, event.y):
-                affected_region = self.stamp_brush(x, y, affected_region)
+            affected_region = self.stamp_brush_stroke(bresenham_walk(self.mouse_at_start.x, self.mouse_at_start.y, event.x, event.y))
         elif self.selected_tool == Tool.rectangle:
-            for x in range(min(self.mouse_at_start.x, event.x), max(self.mouse_at_start.x, event.x) + 1):
-                for y in range(min(self.mouse_at_start.y, event.y), max(self.mouse_at_start.y, event.y) + 1):
-                    if x in range(min(self.mouse_at_start.x, event.x) + 1, max(self.mouse_at_start.x, event.x)) and y in range(min(self.mouse_at_start.y, event.y) + 1, max(self.mouse_at_start.y, event.y)):
-                        continue
-                    affected_region = self.stamp_brush(x, y, affected_region)
+            min_x = min(self.mouse_at_start.x, event.x)
+            max_x = max(self.mouse_at_start.x, event.x)
+            min_y = min(self.mouse_at_start.y, event.y)
+            max_y = max(self.mouse_at_start.y, event.y)
+            edges = [(x, y) for x in range(min_x, max_x + 1) for y in (min_y, max_y)]
+            edges += [(x, y) for y in range(min_y + 1, max_y) for x in (min_x, max_x)]
+            affected_region = self.draw_shape(edges, outline_fill_spans(edges, self.image.width, self.image.height))
         elif self.selected_tool == Tool.rounded_rectangle:
             arc_radius = min(2, abs(self.mouse_at_start.x - event.x) // 2, abs(self.mouse_at_start.y - event.y) // 2)
             min_x = min(self.mouse_at_start.x, event.x)
             max_x = max(self.mouse_at_start.x, event.x)
             min_y = min(self.mouse_at_start.y, event.y)
             max_y = max(self.mouse_at_start.y, event.y)
+            points: list[tuple[int, int]] = []
             for x, y in midpoint_ellipse(0, 0, arc_radius, arc_radius):
                 if x < 0:
                     x = min_x + x + arc_radius
@@ -2844,42 +3410,46 @@ Columns: {len(self.palette) // 2}
                     y = min_y + y + arc_radius
                 else:
                     y = max_y + y - arc_radius
-                affected_region = self.stamp_brush(x, y, affected_region)
+                points.append((x, y))
             for x in range(min_x + arc_radius, max_x - arc_radius + 1):
-                affected_region = self.stamp_brush(x, min_y, affected_region)
-                affected_region = self.stamp_brush(x, max_y, affected_region)
+                points.append((x, min_y))
+                points.append((x, max_y))
             for y in range(min_y + arc_radius, max_y - arc_radius + 1):
-                affected_region = self.stamp_brush(min_x, y, affected_region)
-                affected_region = self.stamp_brush(max_x, y, affected_region)
+                points.append((min_x, y))
+                points.append((max_x, y))
+            affected_region = self.draw_shape(points, outline_fill_spans(points, self.image.width, self.image.height))
         elif self.selected_tool == Tool.ellipse:
             center_x = (self.mouse_at_start.x + event.x) // 2
             center_y = (self.mouse_at_start.y + event.y) // 2
             radius_x = abs(self.mouse_at_start.x - event.x) // 2
             radius_y = abs(self.mouse_at_start.y - event.y) // 2
-            for x, y in midpoint_ellipse(center_x, center_y, radius_x, radius_y):
-                affected_region = self.stamp_brush(x, y, affected_region)
+            points = list(midpoint_ellipse(center_x, center_y, radius_x, radius_y))
+            affected_region = self.draw_shape(points, outline_fill_spans(points, self.image.width, self.image.height))
         else:
             raise NotImplementedError
 
-        # Update action region and image data
-        if action.region and affected_region:
-            action.region = action.region.union(affected_region)
-        elif affected_region:
-            action.region = affected_region
-        if action.region:
-            action.region = action.region.intersection(Region(0, 0, self.image.width, self.image.height))
-            action.update(self.image_at_start)
+        if rubber_band:
+            rubber_band.region = affected_region
+            # Only for refreshing, include the region of the erased shape
+            # (The new shape is allowed to shrink compared to the old one)
+            if replaced_region:
+                affected_region = affected_region.union(replaced_region) if affected_region else replaced_region
 
-        # Only for refreshing, include replaced action region
-        # (The new action is allowed to shrink the region compared to the old one)
         if affected_region:
-            if replace_action:
-                assert old_action is not None, "old_action should have been set if replace_action is True"
-                affected_region = affected_region.union(old_action.region)
             self.canvas.refresh_scaled_region(affected_region)
 
         self.mouse_previous = Offset(event.x, event.y)
 
+    def commit_rubber_band(self) -> None:
+        """Add the shape being dragged out, if any, to the undo history."""
+        rubber_band = self.rubber_band
+        if rubber_band is None:
+            return
+        self.rubber_band = None
+        action = rubber_band.commit(self.image)
+        if action:
+            self.add_action(action)
+
     def on_canvas_tool_stop(self, event: Canvas.ToolStop) -> None:
         """Called when releasing the mouse button after drawing/dragging on the canvas."""
         # Clear the selection preview in case the mouse has moved.
@@ -2890,6 +3460,8 @@ Columns: {len(self.palette) // 2}
 
         self.color_eraser_mode = False  # reset for preview
 
+        self.commit_rubber_band()
+
         if self.mouse_gesture_cancelled:
             return
 
@@ -2937,7 +3509,7 @@ Columns: {len(self.palette) // 2}
                     self.image.selection.contained_image = AnsiArtDocument(self.image.selection.region.width, self.image.selection.region.height, default_fg=self.selected_fg_color, default_bg=self.selected_bg_color)
             if self.selected_tool == Tool.free_form_select:
                 # Define the mask for the selection using the polygon
-                self.image.selection.mask = [[is_inside_polygon(x + select_region.x, y + select_region.y, self.tool_points) for x in range(select_region.width)] for y in range(select_region.height)]
+                self.image.selection.mask = polygon_mask(self.tool_points, select_region)
             self.canvas.refresh_scaled_region(select_region)
         elif self.selected_tool == Tool.curve:
             # Maybe finish drawing a curve
@@ -3291,6 +3863,24 @@ Columns: {len(self.palette) // 2}
         if self.selected_tool not in [Tool.magnifier, Tool.pick_color]:
             self.return_to_tool = self.selected_tool
 
+    def on_tool_options_option_selected(self, event: ToolOptions.OptionSelected) -> None:
+        """Called when an option is clicked in the tool options box."""
+        match event.name:
+            case "brush_shape":
+                self.brush_shape = event.value
+            case "brush_size":
+                self.brush_size = event.value
+            case "eraser_size":
+                self.eraser_size = event.value
+            case "airbrush_size":
+                self.airbrush_size = event.value
+            case "airbrush_density":
+                self.airbrush_density = event.value
+            case "fill_mode":
+                self.fill_mode = event.value
+            case _:
+                raise ValueError(f"Unknown tool option: {event.name}")
+
     def on_char_input_char_selected(self, event: CharInput.CharSelected) -> None:
         """Called when a character is entered in the character input."""
         self.selected_char = event.char
@@ -3396,6 +3986,8 @@ if args.backup_folder:
     if not os.path.exists(backup_folder):
         os.makedirs(backup_folder)
     app.backup_folder = backup_folder
+app.max_backup_sessions = args.backup_sessions
+app.max_backup_sessions_size = args.backup_sessions_size * 1024 * 1024
 
 # Active arguments
 # The backup_folder must be set before recover_from_backup() is called below.
@@ -3430,6 +4022,7 @@ if args.clear_screen:
     os.system("cls||clear")
 
 app.call_later(app.start_backup_interval)
+app.call_later(app.start_file_watching)
 
 def main() -> None:
     """Entry point for the textual-paint CLI."""
@@ -0,0 +1,197 @@
+"""SAUCE (Standard Architecture for Universal Comment Extensions) metadata, as commonly appended to ANSI art.
+
+A SAUCE record is the last 128 bytes of a file. It may be preceded by a block of comment lines
+(`COMNT` followed by 64 bytes per line), and usually by an end-of-file character (Ctrl+Z),
+which hides the metadata when the file is printed in DOS.
+
+Since the record is at a fixed offset from the end, it can be read without reading the rest of the file,
+which makes listing metadata for a large collection of files fast.
+
+Specification: https://www.acid.org/info/sauce/sauce.htm
+"""
+
+import os
+import struct
+from typing import NamedTuple
+
+SAUCE_ID = b"SAUCE"
+"""Start of a SAUCE record."""
+COMMENT_ID = b"COMNT"
+"""Start of a SAUCE comment block."""
+COMMENT_LINE_LENGTH = 64
+"""Length in bytes of each comment line, padded with spaces."""
+MAX_COMMENT_LINES = 255
+"""The number of comment lines is stored in one byte."""
+EOF_CHAR = b"\x1a"
+"""End-of-file character (Ctrl+Z) separating the content from its metadata."""
+SAUCE_RECORD = struct.Struct("<5s2s35s20s20s8sIBBHHHHBB22s")
+"""ID, version, title, author, group, date (CCYYMMDD), original file size, data type, file type,
+four type-dependent numbers (TInfo1-4), number of comment lines, flags, and a type-dependent string (TInfoS)."""
+
+DATA_TYPE_CHARACTER = 1
+"""Data type for text-based files, where TInfo1 is the width in characters and TInfo2 the number of lines."""
+FILE_TYPE_ASCII = 0
+"""File type for plain text, with the character data type."""
+FILE_TYPE_ANSI = 1
+"""File type for ANSI art, with the character data type."""
+FLAG_ICE_COLORS = 0x01
+"""Flag for iCE colors: the blink attribute selects bright background colors instead of blinking."""
+
+
+class Sauce(NamedTuple):
+    """Metadata from a SAUCE record."""
+
+    title: str = ""
+    author: str = ""
+    group: str = ""
+    date: str = ""
+    """Creation date, as CCYYMMDD."""
+    file_size: int = 0
+    """Size of the content, not including the metadata. Updated when written."""
+    data_type: int = DATA_TYPE_CHARACTER
+    file_type: int = FILE_TYPE_ANSI
+    tinfo1: int = 0
+    tinfo2: int = 0
+    tinfo3: int = 0
+    tinfo4: int = 0
+    flags: int = 0
+    tinfos: str = ""
+    """Type-dependent string; for character data, the name of the font, such as "IBM VGA"."""
+    comments: tuple[str, ...] = ()
+
+    @property
+    def width(self) -> int:
+        """The declared width in characters, for character data, or 0 if not declared."""
+        return self.tinfo1 if self.data_type == DATA_TYPE_CHARACTER else 0
+
+    @property
+    def height(self) -> int:
+        """The declared number of lines, for character data, or 0 if not declared."""
+        return self.tinfo2 if self.data_type == DATA_TYPE_CHARACTER else 0
+
+    @property
+    def font(self) -> str:
+        """The name of the font, for character data, or an empty string if not declared."""
+        return self.tinfos if self.data_type == DATA_TYPE_CHARACTER else ""
+
+    @property
+    def ice_colors(self) -> bool:
+        """Whether the blink attribute selects bright background colors instead of blinking."""
+        return bool(self.flags & FLAG_ICE_COLORS)
+
+
+def decode_field(field: bytes) -> str:
+    """Decode a fixed-length string field, which is padded with spaces or NULs."""
+    return field.decode("cp437").rstrip(" \x00")
+
+
+def encode_field(text: str, length: int, padding: bytes = b" ") -> bytes:
+    """Encode a fixed-length string field, truncating or padding it."""
+    return text.encode("cp437", errors="replace")[:length].ljust(length, padding)
+
+
+def parse_sauce_record(record: bytes) -> tuple[Sauce, int] | None:
+    """Parse the 128-byte record at the end of a file.
+
+    Returns the metadata (without comments) and the number of comment lines preceding the record,
+    or None if it's not a SAUCE record.
+    """
+    if len(record) != SAUCE_RECORD.size or not record.startswith(SAUCE_ID):
+        return None
+    (_id, _version, title, author, group, date, file_size, data_type, file_type,
+     tinfo1, tinfo2, tinfo3, tinfo4, comment_lines, flags, tinfos) = SAUCE_RECORD.unpack(record)
+    sauce = Sauce(
+        title=decode_field(title),
+        author=decode_field(author),
+        group=decode_field(group),
+        date=decode_field(date),
+        file_size=file_size,
+        data_type=data_type,
+        file_type=file_type,
+        tinfo1=tinfo1,
+        tinfo2=tinfo2,
+        tinfo3=tinfo3,
+        tinfo4=tinfo4,
+        flags=flags,
+        tinfos=decode_field(tinfos),
+    )
+    return sauce, comment_lines
+
+
+def parse_comments(block: bytes, comment_lines: int) -> tuple[str, ...] | None:
+    """Parse a comment block, returning None if it's not one."""
+    if len(block) != len(COMMENT_ID) + comment_lines * COMMENT_LINE_LENGTH or not block.startswith(COMMENT_ID):
+        return None
+    lines = block[len(COMMENT_ID):]
+    return tuple(decode_field(lines[i:i + COMMENT_LINE_LENGTH]) for i in range(0, len(lines), COMMENT_LINE_LENGTH))
+
+
+def get_comment_block_size(comment_lines: int) -> int:
+    """Returns the size in bytes of a comment block with the given number of lines."""
+    return len(COMMENT_ID) + comment_lines * COMMENT_LINE_LENGTH if comment_lines else 0
+
+
+def split_sauce(content: bytes) -> tuple[bytes, Sauce | None]:
+    """Separate SAUCE metadata from the content of a file.
+
+    Returns the content without the metadata, comments, or end-of-file character, and the metadata, if present.
+    Without metadata, the content is returned unchanged, since a trailing end-of-file character may be data.
+    A comment block that isn't where the record says it is, is left in the content.
+    """
+    parsed = parse_sauce_record(content[-SAUCE_RECORD.size:])
+    if parsed is None:
+        return content, None
+    sauce, comment_lines = parsed
+    content = content[:-SAUCE_RECORD.size]
+    block_size = get_comment_block_size(comment_lines)
+    if block_size and len(content) >= block_size:
+        comments = parse_comments(content[-block_size:], comment_lines)
+        if comments is not None:
+            sauce = sauce._replace(comments=comments)
+            content = content[:-block_size]
+    return content.removesuffix(EOF_CHAR), sauce
+
+
+def read_sauce(file_path: str) -> Sauce | None:
+    """Read the SAUCE metadata of a file, if present, reading only the end of the file."""
+    with open(file_path, "rb") as f:
+        size = f.seek(0, os.SEEK_END)
+        if size < SAUCE_RECORD.size:
+            return None
+        f.seek(size - SAUCE_RECORD.size)
+        parsed = parse_sauce_record(f.read(SAUCE_RECORD.size))
+        if parsed is None:
+            return None
+        sauce, comment_lines = parsed
+        block_size = get_comment_block_size(comment_lines)
+        if block_size and size - SAUCE_RECORD.size >= block_size:
+            f.seek(size - SAUCE_RECORD.size - block_size)
+            comments = parse_comments(f.read(block_size), comment_lines)
+            if comments is not None:
+                sauce = sauce._replace(comments=comments)
+    return sauce
+
+
+def encode_sauce(sauce: Sauce, file_size: int) -> bytes:
+    """Encode metadata to append to content of the given size, including the end-of-file character and any comments."""
+    comments = sauce.comments[:MAX_COMMENT_LINES]
+    block = COMMENT_ID + b"".join(encode_field(line, COMMENT_LINE_LENGTH) for line in comments) if comments else b""
+    record = SAUCE_RECORD.pack(
+        SAUCE_ID,
+        b"00",
+        encode_field(sauce.title, 35),
+        encode_field(sauce.author, 20),
+        encode_field(sauce.group, 20),
+        encode_field(sauce.date, 8),
+        min(file_size, 0xFFFFFFFF),
+        sauce.data_type,
+        sauce.file_type,
+        sauce.tinfo1,
+        sauce.tinfo2,
+        sauce.tinfo3,
+        sauce.tinfo4,
+        len(comments),
+        sauce.flags,
+        encode_field(sauce.tinfos, 22, b"\x00"),
+    )
+    return EOF_CHAR + block + record
@@ -0,0 +1,146 @@
+"""Numbered backups from previous sessions, so that a backup is never lost by being overwritten.
+
+A backup file (`*.ans~`) left over when starting up means the previous session didn't end normally.
+Before it's reused, it's copied into a folder alongside it (`FOO.sessions~/1.ans`, `2.ans`, ...),
+along with its journal, and recorded in `index.json` in that folder. The index holds the metadata
+needed to list recovery points, so listing them doesn't require reading the backups themselves.
+
+Sessions are pruned, least recently used first, to stay within a limit on the number kept
+and the total size on disk.
+"""
+
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+from typing import NamedTuple
+
+from textual_paint.backup_journal import JOURNAL_SUFFIX
+
+SESSIONS_FOLDER_SUFFIX = ".sessions~"
+"""Replaces the `.ans~` extension of the backup file path to get the folder of session backups."""
+INDEX_FILE_NAME = "index.json"
+"""Name of the metadata file in a folder of session backups."""
+MAX_SESSIONS = 10
+"""Default number of session backups to keep per document."""
+MAX_SESSIONS_SIZE = 50 * 1024 * 1024
+"""Default total size in bytes of session backups to keep per document."""
+
+
+class SessionBackup(NamedTuple):
+    """Metadata for a backup from a previous session."""
+
+    number: int
+    """Number of the session, naming its files in the folder."""
+    saved: float
+    """Time the backup was last written, in seconds since the epoch."""
+    used: float
+    """Time the backup was archived or last recovered, for pruning the least recently used."""
+    size: int
+    """Size on disk of the backup and its journal, in bytes."""
+    readable: bool
+    """False if the backup couldn't be recovered automatically, such as due to being corrupted."""
+
+
+def get_sessions_folder(backup_file_path: str) -> str:
+    """Returns the folder to keep session backups in, for the given backup file."""
+    return re.sub(r"\.ans~$", "", backup_file_path) + SESSIONS_FOLDER_SUFFIX
+
+
+def get_session_file_path(sessions_folder: str, number: int) -> str:
+    """Returns the path to the backup file of a session."""
+    return os.path.join(sessions_folder, f"{number}.ans")
+
+
+def read_index(sessions_folder: str) -> list[SessionBackup]:
+    """Returns the session backups in the folder, most recently saved first.
+
+    A missing or corrupted index is treated as empty.
+    """
+    try:
+        with open(os.path.join(sessions_folder, INDEX_FILE_NAME), "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        sessions = [SessionBackup(**entry) for entry in entries]
+    except (OSError, ValueError, TypeError):
+        return []
+    sessions.sort(key=lambda session: (session.saved, session.number), reverse=True)
+    return sessions
+
+
+def write_index(sessions_folder: str, sessions: list[SessionBackup]) -> None:
+    """Replace the index in the folder, all at once so it's never left half-written."""
+    fd, temp_file_path = tempfile.mkstemp(prefix=INDEX_FILE_NAME, suffix=".tmp", dir=sessions_folder)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump([session._asdict() for session in sessions], f, indent=1)
+    os.replace(temp_file_path, os.path.join(sessions_folder, INDEX_FILE_NAME))
+
+
+def remove_session_files(sessions_folder: str, number: int) -> None:
+    """Delete the files of a session backup, if they exist."""
+    file_path = get_session_file_path(sessions_folder, number)
+    for path in (file_path, file_path + JOURNAL_SUFFIX):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+def prune_sessions(sessions: list[SessionBackup], max_sessions: int, max_size: int) -> tuple[list[SessionBackup], list[SessionBackup]]:
+    """Split sessions into those to keep and those to remove, removing the least recently used first.
+
+    The most recently used session is always kept, even if it's over the size limit by itself.
+    """
+    keep: list[SessionBackup] = []
+    remove: list[SessionBackup] = []
+    total_size = 0
+    for session in sorted(sessions, key=lambda session: (session.used, session.number), reverse=True):
+        if keep and (len(keep) >= max_sessions or total_size + session.size > max_size):
+            remove.append(session)
+        else:
+            keep.append(session)
+            total_size += session.size
+    return keep, remove
+
+
+def archive_backup(
+    backup_file_path: str,
+    readable: bool,
+    move: bool = False,
+    max_sessions: int = MAX_SESSIONS,
+    max_size: int = MAX_SESSIONS_SIZE,
+) -> SessionBackup:
+    """Add a backup file and its journal to the session backups, and prune old sessions.
+
+    If `move` is True, the backup is moved rather than copied, so that a new backup can't overwrite it.
+    Returns the metadata of the new session backup.
+    """
+    sessions_folder = get_sessions_folder(backup_file_path)
+    os.makedirs(sessions_folder, exist_ok=True)
+    sessions = read_index(sessions_folder)
+    number = max((session.number for session in sessions), default=0) + 1
+    # Don't overwrite files left without an index entry, such as if the index was lost.
+    while os.path.exists(get_session_file_path(sessions_folder, number)):
+        number += 1
+    session_file_path = get_session_file_path(sessions_folder, number)
+    transfer = os.replace if move else shutil.copy2
+    saved = os.path.getmtime(backup_file_path)
+    size = 0
+    for source, destination in ((backup_file_path, session_file_path), (backup_file_path + JOURNAL_SUFFIX, session_file_path + JOURNAL_SUFFIX)):
+        if os.path.exists(source):
+            transfer(source, destination)
+            size += os.path.getsize(destination)
+    session = SessionBackup(number=number, saved=saved, used=time.time(), size=size, readable=readable)
+    sessions, removed = prune_sessions(sessions + [session], max_sessions, max_size)
+    for old_session in removed:
+        remove_session_files(sessions_folder, old_session.number)
+    write_index(sessions_folder, sessions)
+    return session
+
+
+def mark_session_used(sessions_folder: str, number: int) -> None:
+    """Update when a session backup was last used, so it's pruned last."""
+    sessions = read_index(sessions_folder)
+    sessions = [session._replace(used=time.time()) if session.number == number else session for session in sessions]
+    write_index(sessions_folder, sessions)
@@ -0,0 +1,180 @@
+"""The Thumbnail widget, showing the whole document at a reduced scale."""
+
+from math import ceil
+from typing import Any
+
+from rich.color import Color
+from rich.segment import Segment
+from rich.style import Style
+from textual.geometry import Region, Size
+from textual.strip import Strip
+from textual.widget import Widget
+
+from textual_paint.ansi_art_document import AnsiArtDocument
+from textual_paint.args import args
+
+RGB = tuple[int, int, int]
+
+# How much of a cell is covered by the foreground color, for common characters.
+# Other characters are assumed to cover a fraction of the cell, like a typical letter.
+coverage_by_char: dict[str, float] = {
+    " ": 0.0,
+    "░": 0.25,
+    "▒": 0.5,
+    "▓": 0.75,
+    "█": 1.0,
+    "▀": 0.5,
+    "▄": 0.5,
+    "▌": 0.5,
+    "▐": 0.5,
+}
+default_coverage = 0.25
+
+empty_color: RGB = (128, 128, 128)
+"""Color for pixels outside the document, matching the editing area background."""
+
+
+def cell_color(ch: str, style: Style) -> RGB:
+    """Returns an approximate color for a cell, blending its foreground and background colors by how much the character covers."""
+    assert style.bgcolor is not None and style.bgcolor.triplet is not None
+    assert style.color is not None and style.color.triplet is not None
+    bg = style.bgcolor.triplet
+    coverage = coverage_by_char.get(ch, default_coverage)
+    if coverage == 0.0:
+        return (bg.red, bg.green, bg.blue)
+    fg = style.color.triplet
+    if coverage == 1.0:
+        return (fg.red, fg.green, fg.blue)
+    return (
+        round(bg.red + (fg.red - bg.red) * coverage),
+        round(bg.green + (fg.green - bg.green) * coverage),
+        round(bg.blue + (fg.blue - bg.blue) * coverage),
+    )
+
+
+class Thumbnail(Widget):
+    """Displays a downsampled view of a document, using half blocks for double vertical resolution.
+
+    Each character of the thumbnail covers `scale` by `scale` cells of the document;
+    its top and bottom halves are separate pixels, averaging the top and bottom half of those cells.
+
+    Pixels are cached, and updated only within changed regions (see `invalidate`),
+    and rendered lines are cached until their pixels change,
+    so that the thumbnail can stay live while drawing on a large document.
+    """
+
+    DEFAULT_CSS = """
+    Thumbnail {
+        width: auto;
+        height: auto;
+    }
+    """
+
+    def __init__(self, image: AnsiArtDocument, max_size: Size = Size(40, 15), **kwargs: Any) -> None:
+        """Initialize the thumbnail."""
+        super().__init__(**kwargs)
+        self.image = image
+        """The document to display."""
+        self.max_size = max_size
+        """The maximum size of the thumbnail, in characters. The document is scaled down by an integer factor to fit."""
+        self.scale = 1
+        """Number of document cells per thumbnail character, in each dimension."""
+        self.pixels: list[list[RGB]] = []
+        """Downsampled colors, two rows per line of the thumbnail."""
+        self.strips: list[Strip | None] = []
+        """Rendered lines, or None where the line needs to be re-rendered."""
+        self.image_size = Size(0, 0)
+        """The size of the document when the pixels were computed, to detect resizing."""
+        self.pixel_update_count = 0
+        """Number of pixels computed, for instrumentation."""
+        self.rebuild()
+
+    def rebuild(self) -> None:
+        """Recompute the scale and all pixels."""
+        self.image_size = Size(self.image.width, self.image.height)
+        self.scale = max(1, ceil(self.image.width / self.max_size.width), ceil(self.image.height / self.max_size.height))
+        columns = ceil(self.image.width / self.scale)
+        lines = ceil(self.image.height / self.scale)
+        self.pixels = [[empty_color] * columns for _ in range(lines * 2)]
+        self.strips = [None] * lines
+        self.update_pixels(Region(0, 0, columns, lines * 2))
+        self.refresh(layout=True)
+
+    def invalidate(self, image: AnsiArtDocument, regions: list[Region] | None) -> None:
+        """Update the thumbnail for changed regions of the document (in document coordinates), or the whole document if None."""
+        if regions is None or image is not self.image or self.image_size != Size(image.width, image.height):
+            self.image = image
+            self.rebuild()
+            return
+        for region in regions:
+            region = region.intersection(Region(0, 0, image.width, image.height))
+            if not region:
+                continue
+            # Find the pixels that sample from the region.
+            # Top and bottom pixels of a line can share a document row, when the scale is odd,
+            # so include both halves of the lines touched.
+            scale = self.scale
+            first_line = region.y // scale
+            last_line = (region.bottom - 1) // scale
+            first_column = region.x // scale
+            last_column = (region.right - 1) // scale
+            self.update_pixels(Region(first_column, first_line * 2, last_column - first_column + 1, (last_line - first_line + 1) * 2))
+            self.refresh(Region(0, first_line, len(self.pixels[0]), last_line - first_line + 1))
+
+    def update_pixels(self, pixel_region: Region) -> None:
+        """Recompute the pixels in the given region, in pixel coordinates, and mark their lines for re-rendering."""
+        image = self.image
+        scale = self.scale
+        sel = image.selection
+        sel_image = sel.contained_image if sel else None
+        for py in range(pixel_region.y, pixel_region.bottom):
+            line, half = divmod(py, 2)
+            # The top pixel samples the first half of the cells, and the bottom pixel the second half.
+            # At a scale of 1, both pixels sample the same row.
+            y_start = line * scale + (half * scale) // 2
+            y_end = min(line * scale + ((half + 1) * scale + 1) // 2, image.height)
+            pixel_row = self.pixels[py]
+            for px in range(pixel_region.x, pixel_region.right):
+                x_start = px * scale
+                x_end = min(x_start + scale, image.width)
+                r = g = b = n = 0
+                for y in range(y_start, y_end):
+                    ch_row = image.ch[y]
+                    st_row = image.st[y]
+                    for x in range(x_start, x_end):
+                        if sel and sel_image and sel.region.contains(x, y) and (sel.mask is None or sel.mask[y - sel.region.y][x - sel.region.x]):
+                            color = cell_color(sel_image.ch[y - sel.region.y][x - sel.region.x], sel_image.st[y - sel.region.y][x - sel.region.x])
+                        else:
+                            color = cell_color(ch_row[x], st_row[x])
+                        r += color[0]
+                        g += color[1]
+                        b += color[2]
+                        n += 1
+                pixel_row[px] = (r // n, g // n, b // n) if n else empty_color
+            self.pixel_update_count += pixel_region.width
+            self.strips[line] = None
+
+    def get_content_width(self, container: Size, viewport: Size) -> int:
+        """Get the width of the thumbnail."""
+        return len(self.pixels[0]) if self.pixels else 0
+
+    def get_content_height(self, container: Size, viewport: Size, width: int) -> int:
+        """Get the height of the thumbnail."""
+        return len(self.strips)
+
+    def render_line(self, y: int) -> Strip:
+        """Render a line of the thumbnail, from the cache if possible."""
+        if y >= len(self.strips):
+            return Strip.blank(self.size.width)
+        strip = self.strips[y]
+        if strip is None:
+            segments: list[Segment] = []
+            for top, bottom in zip(self.pixels[y * 2], self.pixels[y * 2 + 1]):
+                if args.ascii_only:
+                    average = ((top[0] + bottom[0]) // 2, (top[1] + bottom[1]) // 2, (top[2] + bottom[2]) // 2)
+                    segments.append(Segment(" ", Style(bgcolor=Color.from_rgb(*average))))
+                else:
+                    segments.append(Segment("▀", Style(color=Color.from_rgb(*top), bgcolor=Color.from_rgb(*bottom))))
+            strip = Strip(segments, len(segments)).simplify()
+            self.strips[y] = strip
+        return strip
@@ -0,0 +1,125 @@
+"""Widget for choosing the brush size, shape, and other options of the selected tool."""
+
+from typing import Any, NamedTuple
+
+from rich.style import Style
+from rich.text import Text
+from textual import events
+from textual.message import Message
+from textual.widget import Widget
+
+from textual_paint.args import args
+from textual_paint.graphics_primitives import BrushShape, FillMode
+from textual_paint.tool import Tool
+
+
+class Choice(NamedTuple):
+    """An option value, with its label in Unicode and ASCII-only modes."""
+    value: Any
+    label: str
+    ascii_label: str
+
+
+brush_shape_choices = [
+    Choice(BrushShape.round, "●", "o"),
+    Choice(BrushShape.square, "■", "#"),
+    Choice(BrushShape.slash, "╱", "/"),
+    Choice(BrushShape.backslash, "╲", "\\"),
+]
+brush_size_choices = [Choice(size, str(size), str(size)) for size in (1, 3, 5, 9, 15)]
+airbrush_size_choices = [Choice(size, str(size), str(size)) for size in (3, 5, 9, 15)]
+airbrush_density_choices = [
+    Choice(0.15, "░", "."),
+    Choice(0.3, "▒", "+"),
+    Choice(0.6, "▓", "#"),
+]
+fill_mode_choices = [
+    Choice(FillMode.outline, "□", "o"),
+    Choice(FillMode.outline_fill, "▣", "@"),
+    Choice(FillMode.fill, "■", "#"),
+]
+
+options_by_tool: dict[Tool, list[tuple[str, list[Choice]]]] = {
+    Tool.brush: [("brush_shape", brush_shape_choices), ("brush_size", brush_size_choices)],
+    Tool.eraser: [("eraser_size", brush_size_choices)],
+    Tool.airbrush: [("airbrush_size", airbrush_size_choices), ("airbrush_density", airbrush_density_choices)],
+    Tool.rectangle: [("fill_mode", fill_mode_choices)],
+    Tool.polygon: [("fill_mode", fill_mode_choices)],
+    Tool.ellipse: [("fill_mode", fill_mode_choices)],
+    Tool.rounded_rectangle: [("fill_mode", fill_mode_choices)],
+}
+"""Rows of choices shown for each tool, keyed by the name of the option they set."""
+option_names = list(dict.fromkeys(name for rows in options_by_tool.values() for name, _choices in rows))
+"""Names of all the options, which are PaintApp variables."""
+
+
+class ToolOptions(Widget):
+    """Shows options for the selected tool, like MS Paint's box below the tools.
+
+    Only shown for tools that have options.
+    The current values are read from the app's variables of the same names, and watched to keep the selection up to date.
+    """
+
+    DEFAULT_CSS = """
+    ToolOptions {
+        height: auto;
+        width: 100%;
+    }
+    """
+
+    class OptionSelected(Message):
+        """Message sent when an option is clicked."""
+        def __init__(self, name: str, value: Any) -> None:
+            self.name = name
+            """The name of the option, matching a PaintApp variable."""
+            self.value = value
+            """The chosen value."""
+            super().__init__()
+
+    def __init__(self, **kwargs: Any) -> None:
+        """Initialize the widget."""
+        super().__init__(**kwargs)
+        self.tool = Tool.pencil
+        """The tool whose options are shown."""
+        self.choice_positions: list[tuple[int, int, int, str, Any]] = []
+        """Clickable areas, as (y, x_start, x_end, name, value), with x_end exclusive."""
+        self.display = False
+
+    def on_mount(self) -> None:
+        """Watch the app's variables for the options."""
+        for name in option_names:
+            self.watch(self.app, name, self.option_changed, init=False)
+
+    def option_changed(self) -> None:
+        """Called when an option changes, to show the new value as selected."""
+        self.refresh()
+
+    def show_options(self, tool: Tool) -> None:
+        """Shows the options for the given tool."""
+        self.tool = tool
+        self.display = tool in options_by_tool
+        self.refresh(layout=True)
+
+    def render(self) -> Text:
+        """Render the rows of choices, highlighting the selected ones."""
+        text = Text(no_wrap=True, overflow="crop")
+        self.choice_positions = []
+        for y, (name, choices) in enumerate(options_by_tool.get(self.tool, [])):
+            if y > 0:
+                text.append("\n")
+            x = 0
+            for choice in choices:
+                label = choice.ascii_label if args.ascii_only else choice.label
+                selected = getattr(self.app, name) == choice.value
+                text.append(label, Style(reverse=True) if selected else Style())
+                self.choice_positions.append((y, x, x + len(label), name, choice.value))
+                text.append(" ")
+                x += len(label) + 1
+        return text
+
+    def on_click(self, event: events.Click) -> None:
+        """Select the clicked option."""
+        for y, x_start, x_end, name, value in self.choice_positions:
+            if event.y == y and x_start <= event.x < x_end:
+                self.post_message(self.OptionSelected(name, value))
+                break
@@ -6,6 +6,7 @@ from textual.message import Message
 from textual.widgets import Button
 
 from textual_paint.tool import Tool
+from textual_paint.tool_options import ToolOptions
 
 
 class ToolsBox(Container):
@@ -31,6 +32,7 @@ class ToolsBox(Container):
             button.tooltip = tool.get_name()
             self.tool_by_button[button] = tool
             yield button
+        yield ToolOptions(id="tool_options")
 
     def on_button_pressed(self, event: Button.Pressed) -> None:
         """Called when a button is clicked."""
@@ -245,6 +245,21 @@ def get_config_dir(app_name: str) -> str:
     config_dir = os.path.join(config_home, app_name)
     return config_dir
 
+def get_cache_dir(app_name: str) -> str:
+    """Returns the cache directory for the given application name."""
+    if "XDG_CACHE_HOME" in os.environ:
+        cache_home = os.environ["XDG_CACHE_HOME"]
+    elif "LOCALAPPDATA" in os.environ: # On Windows
+        cache_home = os.environ["LOCALAPPDATA"]
+    else:
+        try:
+            from xdg import BaseDirectory
+            cache_home = BaseDirectory.xdg_cache_home
+        except ImportError: # Most likely a Linux/Unix system anyway
+            cache_home = os.path.join(get_home_dir(), ".cache")
+    cache_dir = os.path.join(cache_home, app_name)
+    return cache_dir
+
 def get_home_dir() -> str:
     """Returns the home directory of the current user."""
     return os.path.expanduser("~")
@@ -0,0 +1,71 @@
+"""Command line handling, sample loading, and JSON reports shared by the benchmark scripts.
+
+textual_paint is imported only inside functions, since `textual_paint.args` parses the command line when imported,
+and `parse_benchmark_args` has to hide the benchmark's arguments from it first.
+"""
+
+import argparse
+import glob
+import json
+import os
+import platform
+import sys
+from typing import TYPE_CHECKING, Any
+
+if TYPE_CHECKING:
+    from textual_paint.ansi_art_document import AnsiArtDocument
+
+repo_root = os.path.join(os.path.dirname(__file__), "..")
+
+
+def parse_benchmark_args(parser: argparse.ArgumentParser) -> argparse.Namespace:
+    """Add the arguments common to all benchmarks, and parse the command line.
+
+    Call this before importing textual_paint.
+    """
+    parser.add_argument("samples", nargs="*", help="Files to load. Defaults to all files in samples/.")
+    parser.add_argument("--output", help="File to write JSON results to. Defaults to stdout.")
+    benchmark_args = parser.parse_args()
+    # textual_paint.args parses the command line when imported, so hide our arguments from it.
+    sys.argv = sys.argv[:1]
+    return benchmark_args
+
+
+def get_sample_paths(samples: list[str]) -> list[str]:
+    """Returns the given files, or all files in samples/ if none are given."""
+    if samples:
+        return samples
+    return sorted(
+        path for path in glob.glob(os.path.join(repo_root, "samples", "**", "*"), recursive=True)
+        if os.path.isfile(path)
+    )
+
+
+def get_sample_name(file_path: str) -> str:
+    """Returns the path of a file relative to the repository, for identifying results."""
+    return os.path.relpath(file_path, repo_root).replace(os.sep, "/")
+
+
+def load_document(file_path: str) -> "AnsiArtDocument":
+    """Load a document the way the app does for opening files."""
+    from textual_paint.ansi_art_document import AnsiArtDocument
+    with open(file_path, "rb") as f:
+        content = f.read()
+    return AnsiArtDocument.decode_based_on_file_extension(content, file_path)
+
+
+def write_report(results: list[dict[str, Any]], output: str | None) -> None:
+    """Write the results as JSON, along with the versions they were measured with, to a file or stdout."""
+    import textual_paint
+    report = {
+        "textual_paint_version": textual_paint.__version__,
+        "python_version": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
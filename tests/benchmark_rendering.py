@@ -0,0 +1,148 @@
+"""Benchmark canvas rendering, to track rendering performance over time.
+
+Loads each file in `samples/` into a headless Canvas, and times `render_line`
+for every row of the canvas, in several scenarios (magnifications, grid, selection, text box).
+Results are written as JSON, for comparing between releases.
+
+Usage:
+    python tests/benchmark_rendering.py [--frames N] [--magnifications 1,2,4,8] [--output results.json] [samples...]
+
+Compare two runs with any JSON tool; each result is keyed by file, magnification, and scenario.
+"""
+
+import argparse
+import asyncio
+import time
+import tracemalloc
+from typing import Any
+
+from benchmark_helpers import (get_sample_name, get_sample_paths,
+                               load_document, parse_benchmark_args,
+                               write_report)
+
+parser = argparse.ArgumentParser(description="Benchmark canvas rendering.")
+parser.add_argument("--frames", type=int, default=3, help="Number of frames to time per scenario.")
+parser.add_argument("--magnifications", default="1,2,4,8", help="Comma-separated list of magnifications.")
+parser.add_argument("--scenarios", default="plain,grid,selection,textbox", help="Comma-separated list of scenarios.")
+benchmark_args = parse_benchmark_args(parser)
+
+from textual.app import App, ComposeResult
+from textual.containers import ScrollableContainer
+from textual.geometry import Offset, Region
+
+from textual_paint.ansi_art_document import AnsiArtDocument, FormatReadNotSupported, Selection
+from textual_paint.canvas import Canvas
+
+
+class BenchmarkApp(App[None]):
+    """A minimal app hosting a Canvas, standing in for PaintApp."""
+
+    CSS = """
+    #editing_area { overflow: auto; }
+    #canvas { width: auto; height: auto; }
+    """
+
+    selection_drag_offset: Offset | None = None
+    """Referenced by Canvas.render_line."""
+
+    def compose(self) -> ComposeResult:
+        """Add the canvas."""
+        self.canvas = Canvas(id="canvas")
+        self.canvas.image = AnsiArtDocument(1, 1)
+        with ScrollableContainer(id="editing_area"):
+            yield self.canvas
+
+
+def set_up_scenario(image: AnsiArtDocument, canvas: Canvas, scenario: str) -> None:
+    """Configure the document and canvas for a scenario."""
+    image.selection = None
+    canvas.show_grid = scenario == "grid"
+    if scenario in ("selection", "textbox"):
+        # Cover the middle of the image, so rows both inside and outside the selection are rendered.
+        region = Region(image.width // 4, image.height // 4, max(1, image.width // 2), max(1, image.height // 2))
+        selection = Selection(region)
+        selection.contained_image = AnsiArtDocument(region.width, region.height)
+        selection.contained_image.copy_region(source=image, source_region=region)
+        if scenario == "textbox":
+            selection.textbox_mode = True
+            selection.text_selection_start = Offset(0, 0)
+            selection.text_selection_end = Offset(region.width - 1, region.height // 2)
+        image.selection = selection
+
+
+def time_frames(canvas: Canvas, frames: int) -> dict[str, Any]:
+    """Render every row of the canvas `frames` times, and measure time and allocations."""
+    rows = canvas.size.height
+    frame_times: list[float] = []
+    for _ in range(frames):
+        start = time.perf_counter()
+        for y in range(rows):
+            canvas.render_line(y)
+        frame_times.append(time.perf_counter() - start)
+
+    # Measure allocations separately, since tracing slows down execution.
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    strips = [canvas.render_line(y) for y in range(rows)]
+    after, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del strips
+
+    return {
+        "rows": rows,
+        "columns": canvas.size.width,
+        "frames": frames,
+        "mean_frame_seconds": sum(frame_times) / len(frame_times),
+        "min_frame_seconds": min(frame_times),
+        "max_frame_seconds": max(frame_times),
+        "frame_retained_bytes": after - before,
+        "frame_peak_bytes": peak - before,
+    }
+
+
+async def run_benchmarks(file_paths: list[str], magnifications: list[int], scenarios: list[str], frames: int) -> list[dict[str, Any]]:
+    """Run all the benchmarks in a headless app."""
+    results: list[dict[str, Any]] = []
+    app = BenchmarkApp()
+    async with app.run_test(size=(80, 24)) as pilot:  # type: ignore
+        canvas = app.canvas
+        for file_path in file_paths:
+            name = get_sample_name(file_path)
+            try:
+                image = load_document(file_path)
+            except (FormatReadNotSupported, OSError, ValueError) as e:
+                results.append({"file": name, "skipped": str(e)})
+                continue
+            canvas.image = image
+            for magnification in magnifications:
+                canvas.magnification = magnification
+                canvas.refresh(layout=True)
+                await pilot.pause()
+                for scenario in scenarios:
+                    set_up_scenario(image, canvas, scenario)
+                    result: dict[str, Any] = {
+                        "file": name,
+                        "width": image.width,
+                        "height": image.height,
+                        "magnification": magnification,
+                        "scenario": scenario,
+                    }
+                    result.update(time_frames(canvas, frames))
+                    results.append(result)
+            image.selection = None
+    return results
+
+
+def main() -> None:
+    """Run the benchmarks and output the results."""
+    file_paths = get_sample_paths(benchmark_args.samples)
+    magnifications = [int(m) for m in benchmark_args.magnifications.split(",")]
+    scenarios = benchmark_args.scenarios.split(",")
+
+    results = asyncio.run(run_benchmarks(file_paths, magnifications, scenarios, benchmark_args.frames))
+    write_report(results, benchmark_args.output)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""Benchmark geometric transforms, to track their performance over time.
+
+Loads each file in `samples/` and times flipping, rotating, stretching, and skewing the document,
+without any UI. Results are written as JSON, for comparing between releases.
+
+Usage:
+    python tests/benchmark_transforms.py [--repeat N] [--output results.json] [samples...]
+"""
+
+import argparse
+import math
+import time
+from typing import Any, Callable
+
+from benchmark_helpers import (get_sample_name, get_sample_paths,
+                               load_document, parse_benchmark_args,
+                               write_report)
+
+parser = argparse.ArgumentParser(description="Benchmark geometric transforms.")
+parser.add_argument("--repeat", type=int, default=5, help="Number of times to time each transform.")
+benchmark_args = parse_benchmark_args(parser)
+
+from textual_paint.ansi_art_document import AnsiArtDocument, FormatReadNotSupported
+
+skew = math.tan(math.radians(30))
+TRANSFORMS: dict[str, Callable[[AnsiArtDocument], AnsiArtDocument]] = {
+    "flip_horizontal": lambda document: document.flipped(horizontal=True),
+    "flip_vertical": lambda document: document.flipped(horizontal=False),
+    "rotate_90": lambda document: document.rotated(90),
+    "rotate_180": lambda document: document.rotated(180),
+    "stretch_200": lambda document: document.transformed((2, 0, 0, 2)),
+    "stretch_50": lambda document: document.transformed((0.5, 0, 0, 0.5)),
+    "skew_30": lambda document: document.transformed((1, -skew, -skew, 1)),
+}
+
+
+def time_transform(document: AnsiArtDocument, transform: Callable[[AnsiArtDocument], AnsiArtDocument], repeat: int) -> dict[str, Any]:
+    """Apply a transform `repeat` times, and measure the time taken."""
+    times: list[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        transform(document)
+        times.append(time.perf_counter() - start)
+    return {
+        "repeat": repeat,
+        "mean_seconds": sum(times) / len(times),
+        "min_seconds": min(times),
+        "max_seconds": max(times),
+    }
+
+
+def main() -> None:
+    """Run the benchmarks and output the results."""
+    results: list[dict[str, Any]] = []
+    for file_path in get_sample_paths(benchmark_args.samples):
+        name = get_sample_name(file_path)
+        try:
+            document = load_document(file_path)
+        except (FormatReadNotSupported, OSError, ValueError) as e:
+            results.append({"file": name, "skipped": str(e)})
+            continue
+        for transform_name, transform in TRANSFORMS.items():
+            result: dict[str, Any] = {
+                "file": name,
+                "width": document.width,
+                "height": document.height,
+                "transform": transform_name,
+            }
+            result.update(time_transform(document, transform, benchmark_args.repeat))
+            results.append(result)
+
+    write_report(results, benchmark_args.output)
+
+
+if __name__ == "__main__":
+    main()
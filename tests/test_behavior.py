@@ -3,12 +3,51 @@
 Run with `pytest tests/test_behavior.py`, or `pytest` to run all tests.
 """
 
+import asyncio
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import cast
+
 from pyfakefs.fake_filesystem import FakeFilesystem
 import pytest
-from textual.events import Paste
+from rich.style import Style
+from textual.events import MouseDown, MouseMove, MouseUp, Paste
+from textual.geometry import Offset, Region, Size
+from textual.widgets import Button
 
+from textual_paint.action import CompoundAction, TransformAction
+from textual_paint.ansi_art_document import AnsiArtDocument, Selection
+from textual_paint.backup_journal import (JOURNAL_SUFFIX, journal_header,
+                                         journal_record, replay_journal)
+from textual_paint.canvas import Canvas
 from textual_paint.char_input import CharInput
+from textual_paint.graphics_primitives import (BrushShape, bezier_curve_walk,
+                                               brush_offsets,
+                                               brush_spans,
+                                               cells_region_and_mask,
+                                               flood_fill, is_inside_polygon,
+                                               midpoint_ellipse,
+                                               outline_fill_spans,
+                                               polygon_mask, spans_region,
+                                               stroke_cells, stroke_spans,
+                                               union_spans)
+from textual_paint import meta_glyph_font
+from textual_paint.mapped_document import (MappedRows, close_mapped,
+                                           is_mapped, open_native_mapped,
+                                           read_native_size)
+from textual_paint.meta_glyph_font import MetaGlyphFont
 from textual_paint.paint import PaintApp
+from textual_paint.palette_data import IRC_PALETTE
+from textual_paint.session_backups import (archive_backup,
+                                           get_session_file_path,
+                                           get_sessions_folder,
+                                           mark_session_used, prune_sessions,
+                                           read_index)
+from textual_paint.thumbnail import Thumbnail
+from textual_paint.tool import Tool
+from textual_paint.tool_options import ToolOptions
 
 
 async def test_char_input_paste():
@@ -42,3 +81,644 @@ async def test_file_drag_and_drop(my_fs: FakeFilesystem):
         # assert char_input.value == " " # default, may become full block (█) in the future
         assert app.query_one("Canvas").render_line(0).text == "Hello, world!"
 
+
+async def test_canvas_refresh_coalescing():
+    app = PaintApp()
+    async with app.run_test() as pilot:  # type: ignore
+        await pilot.pause()
+        canvas = app.canvas
+        flushes_before = canvas.refresh_flush_count
+        for x in range(10):
+            canvas.refresh_scaled_region(Region(x, 0, 3, 3))
+        assert len(canvas.pending_refresh_regions) == 10
+        await pilot.pause()
+        assert canvas.pending_refresh_regions == []
+        assert canvas.refresh_flush_count == flushes_before + 1
+
+async def test_canvas_mouse_move_coalescing():
+    app = PaintApp()
+    async with app.run_test() as pilot:  # type: ignore
+        await pilot.pause()
+        canvas = app.canvas
+        origin = canvas.region.offset
+        def mouse_move(x: int, y: int) -> MouseMove:
+            return MouseMove(x, y, 0, 0, 1, False, False, False, screen_x=origin.x + x, screen_y=origin.y + y)
+        canvas.pointer_active = True
+        # Not testing the tool itself, just the messages.
+        app.mouse_gesture_cancelled = True
+        # Without yielding to the event loop, the first message can't be handled,
+        # so the following moves are folded into it.
+        canvas.on_mouse_move(mouse_move(1, 1))
+        canvas.on_mouse_move(mouse_move(2, 1))
+        canvas.on_mouse_move(mouse_move(3, 2))
+        update = canvas.pending_tool_update
+        assert isinstance(update, Canvas.ToolUpdate)
+        assert (update.x, update.y) == (3, 2)
+        assert update.points == [Offset(1, 1), Offset(2, 1), Offset(3, 2)]
+        update.handled = True
+        canvas.on_mouse_move(mouse_move(4, 2))
+        assert canvas.pending_tool_update is not update
+        canvas.pointer_active = False
+
+async def test_thumbnail_updates_changed_region():
+    app = PaintApp()
+    async with app.run_test() as pilot:  # type: ignore
+        await pilot.pause()
+        app.action_toggle_thumbnail()
+        await pilot.pause()
+        thumbnail = app.query_one("#thumbnail_window Thumbnail", Thumbnail)
+        assert thumbnail.scale == 2
+        assert thumbnail.get_content_width(Size(0, 0), Size(0, 0)) == 40
+        assert len(thumbnail.strips) == 12
+        updates_before = thumbnail.pixel_update_count
+        app.image.ch[5][5] = "█"
+        app.image.st[5][5] = Style.parse("#ff0000 on #ffffff")
+        app.canvas.refresh_scaled_region(Region(5, 5, 1, 1))
+        await pilot.pause()
+        await pilot.pause()
+        # Only the line containing the cell is recomputed, not the whole thumbnail.
+        assert thumbnail.pixel_update_count - updates_before == 2
+        assert thumbnail.pixels[5][2] == (255, 127, 127)
+        assert thumbnail.pixels[4][2] == (255, 255, 255)
+        app.action_toggle_thumbnail()
+        await pilot.pause()
+        assert not app.query("#thumbnail_window")
+
+async def test_backup_written_in_background_only_when_changed(tmp_path: Path):
+    app = PaintApp()
+    async with app.run_test():
+        app.backup_folder = str(tmp_path)
+        backup_file_path = app.get_backup_file_path()
+        app.action_invert_colors()
+        app.save_backup()
+        await app.workers.wait_for_complete()
+        with open(backup_file_path, "rb") as f:
+            assert f.read() == app.image.get_ansi().encode("utf-8")
+        backup_file_name = os.path.basename(backup_file_path)
+        assert sorted(os.listdir(tmp_path)) == [backup_file_name, backup_file_name + JOURNAL_SUFFIX], "temporary files should be replaced"
+        with open(backup_file_path, "wb") as f:
+            f.write(b"stale")
+        # The undo count changes, but the content is the same as what was last written.
+        app.action_invert_colors()
+        app.action_invert_colors()
+        app.save_backup()
+        await app.workers.wait_for_complete()
+        with open(backup_file_path, "rb") as f:
+            assert f.read() == b"stale"
+
+async def test_backup_finished_after_discard_is_dropped(tmp_path: Path):
+    app = PaintApp()
+    async with app.run_test():
+        app.backup_folder = str(tmp_path)
+        backup_file_path = app.get_backup_file_path()
+        app.backup_checked_for = backup_file_path
+        generation = app.backup_generation
+        # As if a worker finished writing the temporary file just as the backup was discarded.
+        temp_file_path = str(tmp_path / "backup.tmp")
+        with open(temp_file_path, "wb") as f:
+            f.write(b"late")
+        app.discard_backup()
+        app.backup_written(backup_file_path, temp_file_path, hashlib.sha256(b"late").digest(), generation)
+        assert os.listdir(tmp_path) == []
+
+async def test_backup_journal_records_changes_since_backup(tmp_path: Path):
+    app = PaintApp()
+    async with app.run_test() as pilot:  # type: ignore
+        app.backup_folder = str(tmp_path)
+        backup_file_path = app.get_backup_file_path()
+        # A backup is only saved once there are changes.
+        app.action_invert_colors()
+        app.save_backup()
+        await app.workers.wait_for_complete()
+        await pilot.pause()
+        app.image.ch[2][3] = "@"
+        app.image.st[2][3] = Style.parse("#ff0000 on #0000ff")
+        app.canvas.refresh_scaled_region(Region(3, 2, 1, 1))
+        await pilot.pause()
+        await pilot.pause()
+        app.save_journal()
+        with open(backup_file_path, "rb") as f:
+            checkpoint = f.read()
+        with open(backup_file_path + JOURNAL_SUFFIX, "r", encoding="utf-8") as f:
+            journal = f.read()
+        # Only the changed cell is journaled, not the whole document.
+        assert len(journal.splitlines()) == 2
+        recovered = AnsiArtDocument.from_text(checkpoint.decode("utf-8"))
+        assert replay_journal(recovered, journal, hashlib.sha256(checkpoint).hexdigest()) == 1
+        assert recovered.get_ansi() == app.image.get_ansi()
+
+def test_meta_glyph_font_cache(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    def get_cache_dir(app_name: str) -> str:
+        return str(tmp_path / "cache")
+    monkeypatch.setattr(meta_glyph_font, "get_cache_dir", get_cache_dir)
+    font_path = tmp_path / "font.flf"
+    font_path.write_bytes(Path(meta_glyph_font.meta_glyph_fonts[2].file_path).read_bytes())
+    glyphs = MetaGlyphFont(str(font_path), 2, 2, "AB").ensure_loaded()
+    assert set(glyphs) == {"A", "B"}
+    assert os.path.exists(tmp_path / "cache" / "meta_glyph_fonts" / "font.json")
+    # Loaded from the cache, without parsing the font.
+    def fail() -> None:
+        raise AssertionError("Font parsed despite the cache")
+    font = MetaGlyphFont(str(font_path), 2, 2, "AB")
+    monkeypatch.setattr(font, "load", fail)
+    assert font.ensure_loaded() == glyphs
+    # A different set of characters, or a changed font file, invalidates the cache.
+    assert MetaGlyphFont(str(font_path), 2, 2, "A").load_cached() is None
+    stat = os.stat(font_path)
+    os.utime(font_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+    assert MetaGlyphFont(str(font_path), 2, 2, "AB").load_cached() is None
+
+def test_replay_journal():
+    document = AnsiArtDocument(4, 2)
+    document.ch[1][2] = "x"
+    journal = journal_header("abc") + journal_record(document, Region(2, 1, 1, 1))
+    document.resize(6, 3)
+    document.ch[2][5] = "y"
+    journal += journal_record(document, Region(5, 2, 1, 1))
+    # A record cut off while being written is ignored.
+    journal += journal_record(document, Region(0, 0, 6, 3))[:20]
+    recovered = AnsiArtDocument(4, 2)
+    assert replay_journal(recovered, journal, "abc") == 2
+    assert (recovered.width, recovered.height) == (6, 3)
+    assert recovered.ch[1][2] == "x"
+    assert recovered.ch[2][5] == "y"
+    # A journal for a different checkpoint is not applied.
+    recovered = AnsiArtDocument(4, 2)
+    assert replay_journal(recovered, journal, "def") == 0
+    assert recovered.ch[1][2] == " "
+
+def test_session_backups_pruned_least_recently_used(tmp_path: Path):
+    backup_file_path = str(tmp_path / "Untitled.ans~")
+    sessions_folder = get_sessions_folder(backup_file_path)
+    assert sessions_folder == str(tmp_path / "Untitled.sessions~")
+    for content in ["one", "two", "three"]:
+        with open(backup_file_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        with open(backup_file_path + JOURNAL_SUFFIX, "w", encoding="utf-8") as f:
+            f.write("journal")
+        archive_backup(backup_file_path, readable=True, max_sessions=2)
+    # Copied, not moved, by default.
+    assert os.path.exists(backup_file_path)
+    sessions = read_index(sessions_folder)
+    assert [session.number for session in sessions] == [3, 2]
+    assert sessions[0].size == len("three") + len("journal")
+    assert sorted(os.listdir(sessions_folder)) == ["2.ans", "2.ans.journal", "3.ans", "3.ans.journal", "index.json"]
+    mark_session_used(sessions_folder, 2)
+    session = archive_backup(backup_file_path, readable=False, move=True, max_sessions=2)
+    assert not os.path.exists(backup_file_path)
+    assert [session.number for session in read_index(sessions_folder)] == [4, 2]
+    with open(get_session_file_path(sessions_folder, session.number), "r", encoding="utf-8") as f:
+        assert f.read() == "three"
+    # The size limit applies too, but always keeps the latest.
+    keep, remove = prune_sessions(read_index(sessions_folder), max_sessions=10, max_size=1)
+    assert [session.number for session in keep] == [4]
+    assert [session.number for session in remove] == [2]
+
+def test_mapped_document_materializes_rows_on_demand(tmp_path: Path):
+    document = AnsiArtDocument(4, 100)
+    for y in range(100):
+        document.ch[y][y % 4] = str(y % 10)
+    file_path = tmp_path / "big.tpaint"
+    file_path.write_bytes(document.get_native())
+    assert read_native_size(str(file_path)) == (4, 100)
+    mapped = open_native_mapped(str(file_path), resident_rows=8)
+    assert is_mapped(mapped)
+    assert not is_mapped(document)
+    assert (mapped.width, mapped.height) == (4, 100)
+    assert [mapped.ch[y] for y in range(100)] == document.ch
+    assert mapped.st[99] == document.st[99]
+    # Edits survive the row being evicted and loaded again.
+    mapped.ch[3][0] = "@"
+    mapped.st[3][0] = Style.parse("bold #ff0000 on #0000ff")
+    mapped.ch[-1] = list("last")
+    for y in range(100):
+        mapped.ch[y]
+    assert len(cast(MappedRows, mapped.ch).cells.resident) == 8
+    assert mapped.ch[3][0] == "@"
+    assert mapped.st[3][0] == Style.parse("bold #ff0000 on #0000ff")
+    assert mapped.ch[99] == list("last")
+    saved = AnsiArtDocument.from_native(mapped.get_native())
+    assert saved.ch[3][0] == "@"
+    assert saved.ch[99] == list("last")
+    assert saved.ch[50] == document.ch[50]
+    close_mapped(mapped)
+    assert cast(MappedRows, mapped.ch).cells.file.closed
+
+async def test_save_in_background(tmp_path: Path):
+    app = PaintApp()
+    async with app.run_test() as pilot:  # type: ignore
+        file_path = str(tmp_path / "saved.ans")
+        app.file_path = file_path
+        app.image.ch[0][0] = "X"
+        app.action_invert_colors()
+        assert await app.save()
+        with open(file_path, "rb") as f:
+            assert f.read() == app.image.get_ansi().encode("utf-8")
+        assert not app.is_document_modified()
+        assert app.save_worker is None
+        # Cancelling with Escape before the file is written
+        release = threading.Event()
+        def slow_encode() -> bytes:
+            release.wait(5)
+            return b"cancelled"
+        task = asyncio.create_task(app.save_in_background(slow_encode, file_path, "Save"))
+        await pilot.pause()
+        assert app.save_worker is not None
+        app.action_cancel()
+        assert await task is None
+        release.set()
+        await asyncio.sleep(0.2)
+        with open(file_path, "rb") as f:
+            assert f.read() == app.image.get_ansi().encode("utf-8")
+        # Saving again while a save is in progress waits for it, rather than cancelling it.
+        release.clear()
+        def first_encode() -> bytes:
+            release.wait(5)
+            return b"first"
+        first = asyncio.create_task(app.save_in_background(first_encode, file_path, "Save"))
+        await pilot.pause()
+        first_worker = app.save_worker
+        second = asyncio.create_task(app.save_in_background(lambda: b"second", file_path, "Save"))
+        await pilot.pause()
+        assert app.save_worker is first_worker
+        release.set()
+        assert await first == (b"first", None)
+        assert await second == (b"second", None)
+        with open(file_path, "rb") as f:
+            assert f.read() == b"second"
+
+async def test_save_not_cancelled_while_writing(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    app = PaintApp()
+    async with app.run_test():
+        file_path = str(tmp_path / "saved.txt")
+        monkeypatch.setattr("textual_paint.paint.SAVE_PROGRESS_BLOCK_SIZE", 4)
+        show_save_progress = app.show_save_progress
+        def cancel_during_progress(message: str) -> None:
+            if message.endswith("%"):
+                assert app.save_writing
+                app.action_cancel()
+            show_save_progress(message)
+        monkeypatch.setattr(app, "show_save_progress", cancel_during_progress)
+        # Escape is ignored once the file is being written, so it's reported as saved once it's done.
+        assert await app.save_in_background(lambda: b"0123456789", file_path, "Save") == (b"0123456789", None)
+        with open(file_path, "rb") as f:
+            assert f.read() == b"0123456789"
+        assert app.save_worker is None and not app.save_writing
+
+async def test_save_mapped_document_without_loading_it(tmp_path: Path, monkeypatch: pytest.MonkeyPatch):
+    document = AnsiArtDocument(4, 100)
+    for y in range(100):
+        document.ch[y][y % 4] = str(y % 10)
+    file_path = tmp_path / "big.tpaint"
+    file_path.write_bytes(document.get_native())
+    app = PaintApp()
+    async with app.run_test():
+        app.image = app.canvas.image = open_native_mapped(str(file_path), resident_rows=8)
+        app.file_path = str(tmp_path / "saved.tpaint")
+        app.image.ch[50][0] = "@"
+        # The document is copied file to file for the worker to encode, rather than into memory.
+        def fail(*args: object) -> None:
+            raise AssertionError("Mapped document copied into memory")
+        monkeypatch.setattr(AnsiArtDocument, "copy", fail)
+        assert await app.save()
+        assert app.image.ch[50][0] == "@"
+        saved = AnsiArtDocument.from_native((tmp_path / "saved.tpaint").read_bytes())
+        assert saved.ch[50][0] == "@"
+        assert saved.ch[99] == document.ch[99]
+
+async def test_brush_stroke_on_mapped_document_loads_only_touched_rows(tmp_path: Path):
+    file_path = tmp_path / "big.tpaint"
+    file_path.write_bytes(AnsiArtDocument(20, 100).get_native())
+    app = PaintApp()
+    async with app.run_test():
+        app.image = app.canvas.image = open_native_mapped(str(file_path), resident_rows=100)
+        cells = cast(MappedRows, app.image.ch).cells
+        app.selected_tool = Tool.pencil
+        app.selected_char = "X"
+        app.on_canvas_tool_start(Canvas.ToolStart(MouseDown(2, 50, 0, 0, 1, False, False, False)))
+        app.on_canvas_tool_update(Canvas.ToolUpdate(MouseMove(5, 52, 0, 0, 1, False, False, False)))
+        app.on_canvas_tool_stop(Canvas.ToolStop(MouseUp(5, 52, 0, 0, 1, False, False, False)))
+        # Only the rows under the stroke are saved for undo, rather than a copy of the whole document.
+        assert sorted(cells.resident) == [50, 51, 52]
+        assert app.image.ch[52][5] == "X"
+        app.action_undo()
+        assert app.image.ch[50][2] == " "
+        assert app.image.ch[52][5] == " "
+        assert sorted(cells.resident) == [50, 51, 52]
+
+def test_document_analysis():
+    document = AnsiArtDocument(3, 2)
+    analysis = document.analyze()
+    assert not analysis.has_text
+    assert not analysis.has_attributes
+    assert not analysis.uses_non_default_colors()
+    assert analysis.colors_outside(IRC_PALETTE) == set()
+    document.ch[1][2] = "é"
+    document.st[0][0] = Style.parse("bold #000000 on #ffffff")
+    document.st[0][1] = Style.parse("#000000 on #123456")
+    analysis = document.analyze()
+    assert analysis.has_text
+    assert analysis.has_attributes
+    assert analysis.uses_non_default_colors()
+    assert analysis.colors_outside(IRC_PALETTE) == {"#123456"}
+
+async def test_save_warns_only_about_information_present(tmp_path: Path):
+    app = PaintApp()
+    async with app.run_test() as pilot:  # type: ignore
+        # The default black on white document can be saved as plain text without losing anything.
+        file_path = str(tmp_path / "plain.txt")
+        app.file_path = file_path
+        app.image.ch[0][0] = "A"
+        app.action_invert_colors()
+        app.action_invert_colors()
+        analysis = app.get_document_analysis()
+        assert not analysis.uses_non_default_colors() and not analysis.has_attributes
+        assert await asyncio.wait_for(app.save(), timeout=5)
+        assert not app.query("MessageBox")
+        assert app.image.ch[0][0] == "A"
+        # Colors only from the IRC palette are kept in IRC format.
+        app.file_path = str(tmp_path / "colors.irc")
+        app.image.st[0][0] = Style.parse("rgb(0,0,127) on rgb(255,0,0)")
+        app.canvas.refresh_scaled_region(Region(0, 0, 1, 1))
+        assert await asyncio.wait_for(app.save(), timeout=5)
+        assert not app.query("MessageBox")
+        with open(app.file_path, "rb") as f:
+            reloaded = AnsiArtDocument.decode_based_on_file_extension(f.read(), app.file_path)
+        assert reloaded.st[0][0] == app.image.st[0][0]
+        # Other colors are lost, so it asks first.
+        assert not app.get_document_analysis().colors_outside(IRC_PALETTE)
+        app.image.st[0][0] = Style.parse("#123456 on #ffffff")
+        app.canvas.refresh_scaled_region(Region(0, 0, 1, 1))
+        # The edit is seen right away, not only once the canvas reports it at its next frame.
+        assert app.get_document_analysis().colors_outside(IRC_PALETTE) == {"#123456"}
+        save_task = asyncio.create_task(app.save())
+        await pilot.pause()
+        assert app.query("MessageBox")
+        save_task.cancel()
+
+async def test_reload_file_changed_by_another_program(tmp_path: Path):
+    app = PaintApp()
+    async with app.run_test() as pilot:  # type: ignore
+        file_path = str(tmp_path / "watched.txt")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("abc\ndef\nghi\njkl\n")
+        # Start from a clean undo history, so opening doesn't prompt to save changes.
+        app.action_new(force=True, manage_backup=False)
+        app.open_from_file_path(file_path, lambda: None)
+        await pilot.pause()
+        app.check_file_changed()
+        assert not app.query("MessageBox")
+        with open(file_path, "w", encoding="utf-8") as f:
+            f.write("abc\nDEF\nghi\nJKL\n")
+        # Make sure the change is noticed even if the file system's timestamps are coarse.
+        stat = os.stat(file_path)
+        os.utime(file_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1000000000))
+        app.check_file_changed()
+        await pilot.pause()
+        message_box = app.query_one("MessageBox")
+        # Only asks once for the same change.
+        app.check_file_changed()
+        await pilot.pause()
+        assert len(app.query("MessageBox")) == 1
+        message_box.query_one("Button.yes", Button).press()
+        await pilot.pause()
+        assert [row[0] for row in app.image.ch[:4]] == ["a", "D", "g", "J"]
+        assert not app.is_document_modified()
+        # Only the changed rows are stored for undo, as one action.
+        assert len(app.undos) == 1
+        action = app.undos[0]
+        assert isinstance(action, CompoundAction)
+        assert [sub_action.region for sub_action in action.sub_actions] == [Region(0, 1, 3, 1), Region(0, 3, 3, 1)]
+        app.action_undo()
+        assert [row[0] for row in app.image.ch[:4]] == ["a", "d", "g", "j"]
+        # Our own saves aren't mistaken for changes.
+        assert await app.save()
+        app.check_file_changed()
+        await pilot.pause()
+        assert not app.query("MessageBox")
+
+def test_diff_rows():
+    document = AnsiArtDocument.from_text("ab\ncd\nef\ngh")
+    other = AnsiArtDocument.from_text("ab\nXd\neY\ngh")
+    assert document.diff_rows(other) == [Region(0, 1, 2, 2)]
+    other.st[3][1] = Style.parse("#ff0000 on #ffffff")
+    assert document.diff_rows(other) == [Region(0, 1, 2, 3)]
+    assert document.diff_rows(document) == []
+    assert document.diff_rows(AnsiArtDocument.from_text("ab\ncd")) is None
+
+def test_flood_fill_returns_mask():
+    document = AnsiArtDocument(5, 3)
+    # A wall of Xs splits the document, with a gap at the bottom.
+    for y in range(2):
+        document.ch[y][2] = "X"
+    # Nearly white counts as white, within the tolerance.
+    document.st[2][4] = Style.parse("#000000 on #fefefe")
+    result = flood_fill(document, 0, 0, " ", "#000000", "#ff0000")
+    assert result is not None
+    region, mask = result
+    assert region == Region(0, 0, 5, 3)
+    assert mask == [
+        [True, True, False, True, True],
+        [True, True, False, True, True],
+        [True, True, True, True, True],
+    ]
+    assert document.ch[0][2] == "X"
+    # Filling with the same color does nothing.
+    assert flood_fill(document, 0, 0, " ", "#000000", "#ff0000") is None
+    # Without tolerance, the nearly white cell is left alone.
+    document = AnsiArtDocument(5, 1)
+    document.st[0][4] = Style.parse("#000000 on #fefefe")
+    result = flood_fill(document, 0, 0, " ", "#000000", "#ff0000", tolerance=0)
+    assert result is not None
+    assert result == (Region(0, 0, 4, 1), [[True, True, True, True]])
+
+def test_brush_stroke_cells():
+    assert brush_offsets(1) == ((0, 0),)
+    assert len(brush_offsets(3)) == 5
+    assert len(brush_offsets(3, BrushShape.square)) == 9
+    # Overlapping stamps are merged, counting how many stamps cover each cell.
+    cells = stroke_cells([(1, 1), (2, 1)], brush_offsets(3), 10, 10)
+    assert len(cells) == 8
+    assert cells[(1, 1)] == 2
+    assert cells[(2, 1)] == 2
+    # Cells outside the document are excluded.
+    cells = stroke_cells([(0, 0)], brush_offsets(3), 10, 10)
+    assert sorted(cells) == [(0, 0), (0, 1), (1, 0)]
+    assert cells_region_and_mask(cells) == (Region(0, 0, 2, 2), [[True, True], [True, False]])
+
+async def test_color_eraser_stroke_undo_mask():
+    app = PaintApp()
+    async with app.run_test():
+        app.selected_tool = Tool.eraser
+        app.eraser_size = 1
+        app.on_canvas_tool_start(Canvas.ToolStart(MouseDown(0, 0, 0, 0, 3, False, False, False)))
+        app.on_canvas_tool_update(Canvas.ToolUpdate(MouseMove(2, 2, 0, 0, 3, False, False, False)))
+        action = app.undos[-1]
+        assert isinstance(action, CompoundAction)
+        # The stroke's cells are saved with a mask, so only they are restored when undoing.
+        assert [(sub_action.region, sub_action.mask) for sub_action in action.sub_actions] == [
+            (Region(0, 0, 3, 3), [[True, False, False], [False, True, False], [False, False, True]]),
+        ]
+        app.action_undo()
+
+def test_brush_shapes_and_spans():
+    assert brush_offsets(3, BrushShape.slash) == ((1, -1), (0, 0), (-1, 1))
+    assert brush_offsets(3, BrushShape.backslash) == ((-1, -1), (0, 0), (1, 1))
+    assert brush_spans(3) == ((-1, 0, 1), (0, -1, 2), (1, 0, 1))
+    # A stroke of a large brush is stored as one merged span per row.
+    rows = stroke_spans([(x, 10) for x in range(5, 20)], brush_spans(15), 100, 100)
+    assert rows[10] == [(0, 27)]
+    assert spans_region(rows) == Region(0, 3, 27, 15)
+    # The spans cover the same cells as stamping each cell.
+    cells = stroke_cells([(x, 10) for x in range(5, 20)], brush_offsets(15), 100, 100)
+    assert sorted(cells) == sorted((x, y) for y, row_spans in rows.items() for x_start, x_end in row_spans for x in range(x_start, x_end))
+
+def test_polygon_mask():
+    # A concave shape, with a notch in the top.
+    points = [Offset(0, 0), Offset(4, 6), Offset(8, 0), Offset(8, 9), Offset(0, 9)]
+    region = Region(-1, -1, 11, 12)
+    expected = [[is_inside_polygon(x, y, points) for x in range(region.x, region.right)] for y in range(region.y, region.bottom)]
+    assert polygon_mask(points, region) == expected
+    # Clipping to a region within the polygon.
+    assert polygon_mask(points, Region(2, 7, 3, 2)) == [[True, True, True], [True, True, True]]
+
+async def test_transform_actions_undo_without_snapshots():
+    app = PaintApp()
+    async with app.run_test():
+        app.image.resize(3, 2)
+        app.image.ch = [["a", "b", "c"], ["d", "e", "f"]]
+        app.image.st[0][0] = Style(color="#ff0000", bgcolor="#00ff00")
+        original = AnsiArtDocument(3, 2)
+        original.copy(app.image)
+        app.action_rotate_by_angle(90)
+        assert app.image.ch == [["d", "a"], ["e", "b"], ["f", "c"]]
+        app.action_flip_horizontal()
+        app.action_flip_vertical()
+        app.action_rotate_by_angle(270)
+        app.action_invert_colors()
+        assert all(isinstance(action, TransformAction) and action.sub_image_before is None for action in app.undos)
+        for _ in range(5):
+            app.action_undo()
+        assert app.image.ch == original.ch
+        assert app.image.st == original.st
+        for _ in range(5):
+            app.action_redo()
+        assert app.image.ch == [["f", "e", "d"], ["c", "b", "a"]]
+        bgcolor = app.image.st[1][2].bgcolor
+        assert bgcolor is not None and bgcolor.triplet is not None
+        assert bgcolor.triplet.hex == "#ff00ff"
+
+def test_document_transforms():
+    document = AnsiArtDocument(3, 2)
+    document.ch = [["a", "b", "c"], ["d", "e", "f"]]
+    assert document.flipped().ch == [["c", "b", "a"], ["f", "e", "d"]]
+    assert document.flipped(horizontal=False).ch == [["d", "e", "f"], ["a", "b", "c"]]
+    rotated = document.rotated(90)
+    assert (rotated.width, rotated.height) == (2, 3)
+    assert rotated.ch == [["d", "a"], ["e", "b"], ["f", "c"]]
+    assert document.ch == [["a", "b", "c"], ["d", "e", "f"]], "original should be unchanged"
+    # A 200% stretch repeats each column twice, rather than a 3-1-3-1 pattern.
+    stretched = document.transformed((2, 0, 0, 1))
+    assert stretched.ch == [["a", "a", "b", "b", "c", "c"], ["d", "d", "e", "e", "f", "f"]]
+    # Skewing 45 degrees horizontally shifts each row left by one cell.
+    skewed = document.transformed((1, -1, 0, 1))
+    assert skewed.ch == [[" ", " ", "a", "b", "c"], [" ", "d", "e", "f", " "]]
+
+def test_selection_transforms():
+    selection = Selection(Region(5, 5, 3, 2))
+    selection.contained_image = AnsiArtDocument(3, 2)
+    selection.rotate(90)
+    assert selection.region == Region(5, 5, 2, 3)
+    # The corners left empty by skewing are masked out of the selection.
+    selection.transform((1, -1, 0, 1))
+    assert selection.region == Region(5, 5, 5, 3)
+    assert selection.mask == [
+        [False, False, False, True, True],
+        [False, False, True, True, False],
+        [False, True, True, False, False],
+    ]
+
+async def test_selection_undo_stores_only_affected_regions():
+    app = PaintApp()
+    async with app.run_test():
+        app.image.resize(20, 10)
+        app.image.ch[1][1] = "x"
+        original = AnsiArtDocument(20, 10)
+        original.copy(app.image)
+        app.image.selection = Selection(Region(1, 1, 2, 2))
+        app.move_selection_absolute(10, 5)
+        app.meld_selection()
+        assert app.image.ch[1][1] == " "
+        assert app.image.ch[5][10] == "x"
+        action = app.undos[-1]
+        assert isinstance(action, CompoundAction)
+        assert [sub_action.region for sub_action in action.sub_actions] == [Region(1, 1, 2, 2), Region(10, 5, 2, 2)]
+        app.action_undo()
+        assert app.image.ch == original.ch
+        app.action_redo()
+        assert app.image.ch[1][1] == " "
+        assert app.image.ch[5][10] == "x"
+
+async def test_shape_drag_commits_one_action():
+    app = PaintApp()
+    async with app.run_test():
+        app.selected_tool = Tool.rectangle
+        app.selected_char = "X"
+        undo_count = len(app.undos)
+        app.on_canvas_tool_start(Canvas.ToolStart(MouseDown(2, 2, 0, 0, 1, False, False, False)))
+        for x, y in [(10, 8), (6, 5)]:
+            app.on_canvas_tool_update(Canvas.ToolUpdate(MouseMove(x, y, 0, 0, 1, False, False, False)))
+            assert len(app.undos) == undo_count
+        # Only the cells under the latest shape are kept for restoring, not a copy of the document.
+        assert app.rubber_band is not None
+        assert len(app.rubber_band.cells_before) == 14
+        assert app.image.ch[8][10] == " "
+        assert app.image.ch[5][6] == "X"
+        app.on_canvas_tool_stop(Canvas.ToolStop(MouseUp(6, 5, 0, 0, 1, False, False, False)))
+        assert app.rubber_band is None
+        assert len(app.undos) == undo_count + 1
+        assert app.undos[-1].region == Region(2, 2, 5, 4)
+        app.action_undo()
+        assert app.image.ch[5][6] == " "
+
+def test_shape_fill_spans():
+    # An ellipse is filled between its outline on each row.
+    points = list(midpoint_ellipse(10, 10, 5, 3))
+    rows = outline_fill_spans(points, 100, 100)
+    assert rows[10] == [(5, 16)]
+    assert rows[7] == [(min(x for x, y in points if y == 7), max(x for x, y in points if y == 7) + 1)]
+    assert spans_region(rows) == Region(5, 7, 11, 7)
+    # Clipped to the document.
+    assert outline_fill_spans(points, 12, 9) == {7: [(8, 12)], 8: [(6, 12)]}
+    assert union_spans({0: [(0, 2)]}, {0: [(2, 4), (6, 7)], 1: [(0, 1)]}) == {0: [(0, 4), (6, 7)], 1: [(0, 1)]}
+
+def test_bezier_curve_walk():
+    cells = list(bezier_curve_walk(0, 0, 50, 40, -20, 30, 60, 5))
+    # The curve includes both endpoints, and steps one cell at a time.
+    assert cells[0] == (0, 0)
+    assert cells[-1] == (60, 5)
+    for (x1, y1), (x2, y2) in zip(cells, cells[1:]):
+        assert max(abs(x2 - x1), abs(y2 - y1)) == 1
+    # A straight curve is just a line.
+    assert list(bezier_curve_walk(0, 0, 1, 0, 2, 0, 3, 0)) == [(0, 0), (1, 0), (2, 0), (3, 0)]
+
+async def test_tool_options():
+    app = PaintApp()
+    async with app.run_test(size=(80, 40)) as pilot:  # type: ignore
+        tool_options = app.query_one("#tool_options", ToolOptions)
+        assert not tool_options.display
+        app.selected_tool = Tool.brush
+        await pilot.pause()
+        assert tool_options.display
+        # Click the square shape, in the first row.
+        await pilot.click("#tool_options", offset=(2, 0))
+        await pilot.pause()
+        assert app.brush_shape == BrushShape.square
+        app.brush_size = 5
+        app.selected_char = "X"
+        assert app.stamp_brush(10, 10) == Region(8, 8, 5, 5)
+        assert all(app.image.ch[y][x] == "X" for y in range(8, 13) for x in range(8, 13))
+        assert app.image.ch[7][10] == " "
+        # The selection follows the app's variables, however they're changed.
+        await pilot.pause()
+        assert [segment.text for segment in tool_options.render_line(1) if segment.style and segment.style.reverse] == ["5"]
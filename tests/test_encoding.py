@@ -5,8 +5,14 @@ Run with `pytest tests/test_encoding.py`, or `pytest` to run all tests.
 
 from pathlib import Path
 import pytest
+from rich.style import Style
 
-from textual_paint.ansi_art_document import AnsiArtDocument
+from textual_paint.ansi_art_document import (NATIVE_MAGIC, AnsiArtDocument,
+                                            FormatReadNotSupported,
+                                            sniff_format)
+from textual_paint.mapped_document import close_mapped, open_native_mapped
+from textual_paint.sauce import (FLAG_ICE_COLORS, Sauce, encode_sauce,
+                                 read_sauce, split_sauce)
 
 ROUND_TRIP_EXCLUSIONS = [
     # These files are generated by a script, not the Textual Paint app, so they naturally change.
@@ -81,3 +87,117 @@ def test_round_trip(file_path: Path) -> None:
         file_content = f.read()
         image = AnsiArtDocument.decode_based_on_file_extension(file_content, str(file_path))
         assert image.encode_based_on_file_extension(str(file_path)) == file_content
+
+def test_native_format_round_trip():
+    document = AnsiArtDocument(3, 150)
+    document.ch[0][1] = "😀"
+    document.st[0][1] = Style.parse("bold #ff0000 on #00ff00")
+    document.ch[149][2] = "\x1b"
+    document.st[149][2] = Style.parse("italic underline blue on #123456")
+    content = document.encode_based_on_file_extension("test.tpaint")
+    assert content.startswith(NATIVE_MAGIC)
+    decoded = AnsiArtDocument.decode_based_on_file_extension(content, "test.tpaint")
+    assert (decoded.width, decoded.height) == (3, 150)
+    assert decoded.ch == document.ch
+    assert decoded.st == document.st
+    # Reading a range of rows
+    rows = AnsiArtDocument.from_native(content, 140, 200)
+    assert (rows.width, rows.height) == (3, 10)
+    assert rows.ch == document.ch[140:]
+    assert rows.st[9][2] == document.st[149][2]
+    with pytest.raises(ValueError):
+        AnsiArtDocument.from_native(content[:-10])
+    with pytest.raises(ValueError):
+        AnsiArtDocument.from_native(b"not a document")
+
+def test_sniff_format():
+    document = AnsiArtDocument.from_text("hi")
+    assert sniff_format(document.get_native()) == "TPAINT"
+    assert sniff_format(document.encode_to_format("PNG")) == "PNG"
+    assert sniff_format(document.encode_to_format("GIF")) == "GIF"
+    assert sniff_format(document.encode_to_format("BMP")) == "BMP"
+    assert sniff_format(b"\xff\xd8\xff\xe0") == "JPEG"
+    assert sniff_format(document.get_svg().encode("utf-8")) == "SVG"
+    assert sniff_format(document.get_html().encode("utf-8")) == "HTML"
+    assert sniff_format(b"\x1b[31mhi") == "ANSI"
+    assert sniff_format(b"\x034,5hi") == "IRC"
+    assert sniff_format(b"BMX was here, with a long enough line") is None
+    assert sniff_format(b"plain text") is None
+
+def test_decode_sniffs_content_without_loading_image_codecs(monkeypatch: pytest.MonkeyPatch):
+    document = AnsiArtDocument.from_text("hi")
+    document.st[0][0] = Style.parse("#000000 on #ff0000")
+    png = document.encode_to_format("PNG")
+    # Images are recognized even with the wrong extension, or none.
+    for file_path in ("picture", "picture.ans"):
+        decoded = AnsiArtDocument.decode_based_on_file_extension(png, file_path)
+        assert decoded.st[0][0].bgcolor == document.st[0][0].bgcolor
+    # Text formats are recognized by content only when the extension is unknown.
+    assert AnsiArtDocument.decode_based_on_file_extension(b"\x034,5hi", "art").ch[0][:2] == ["h", "i"]
+    assert AnsiArtDocument.decode_based_on_file_extension(b"\x034,5hi", "art.txt").ch[0][0] == "\x03"
+    with pytest.raises(FormatReadNotSupported):
+        AnsiArtDocument.decode_based_on_file_extension(document.get_html().encode("utf-8"), "art")
+    # Opening and saving text formats doesn't ask Pillow, which would load all its codecs.
+    from PIL import Image
+    def fail() -> None:
+        raise AssertionError("Pillow codecs initialized")
+    monkeypatch.setattr(Image, "init", fail)
+    monkeypatch.setattr(Image, "registered_extensions", fail)
+    for file_path in ("art.ans", "art.txt", "art.irc", "art.svg", "art.tpaint"):
+        content = document.encode_based_on_file_extension(file_path)
+        assert AnsiArtDocument.decode_based_on_file_extension(content, file_path).ch[0][:2] == ["h", "i"]
+
+def test_sauce_metadata(tmp_path: Path):
+    sauce = Sauce(title="Test Art", author="Artist", group="Group", date="20231019", tinfo1=4, tinfo2=2, flags=FLAG_ICE_COLORS, tinfos="IBM VGA", comments=("First comment", "Second"))
+    # An 8-character line, wrapped at the declared width of 4, and a line break after a full-width line that doesn't add a blank line.
+    body = b"\x1b[31mABCDEFGH\r\nIJKL\r\nM"
+    content = body + encode_sauce(sauce, len(body))
+    file_path = str(tmp_path / "art.ans")
+    with open(file_path, "wb") as f:
+        f.write(content)
+    # Only the end of the file is read.
+    read = read_sauce(file_path)
+    assert read is not None
+    assert read == sauce._replace(file_size=len(body))
+    assert read.width == 4 and read.height == 2 and read.font == "IBM VGA" and read.ice_colors
+    assert split_sauce(content) == (body, read)
+    # Without metadata, a trailing end-of-file character might be data, so it's kept.
+    assert split_sauce(body + b"\x1a") == (body + b"\x1a", None)
+    document = AnsiArtDocument.decode_based_on_file_extension(content, file_path)
+    assert document.sauce == read
+    assert ["".join(row) for row in document.ch[:document.height]] == ["ABCD", "EFGH", "IJKL", "M   "]
+    # Written back on save, updated to the current size.
+    document.resize(5, 4)
+    saved = document.encode_based_on_file_extension(file_path)
+    saved_body, saved_sauce = split_sauce(saved)
+    assert saved_sauce is not None
+    assert saved_sauce == read._replace(tinfo1=5, tinfo2=4, file_size=len(saved_body))
+    assert saved_body == document.get_ansi().encode("utf-8")
+    # Not added to documents without it.
+    assert b"SAUCE" not in AnsiArtDocument(2, 2).encode_based_on_file_extension(file_path)
+
+def test_sauce_not_stripped_from_binary_formats(tmp_path: Path):
+    # The last byte of this BMP's pixel data is the end of file character used before SAUCE metadata.
+    from PIL import Image
+    image = Image.new("RGB", (4, 1), 0x1a1a1a)
+    file_path = tmp_path / "image.bmp"
+    image.save(file_path)
+    content = file_path.read_bytes()
+    assert content.endswith(b"\x1a")
+    document = AnsiArtDocument.decode_based_on_file_extension(content, str(file_path))
+    assert document.sauce is None
+    assert (document.width, document.height) == (4, 1)
+    assert document.st[0][3].bgcolor is not None
+    assert document.st[0][3].bgcolor.triplet is not None
+    assert document.st[0][3].bgcolor.triplet.hex == "#1a1a1a"
+
+def test_sauce_kept_in_native_format(tmp_path: Path):
+    document = AnsiArtDocument(4, 2)
+    document.sauce = Sauce(title="Test Art", author="Artist", date="20231019", tinfo1=4, tinfo2=2, flags=FLAG_ICE_COLORS, tinfos="IBM VGA", comments=("First comment", "Second"))
+    file_path = tmp_path / "art.tpaint"
+    file_path.write_bytes(document.get_native())
+    assert AnsiArtDocument.from_native(file_path.read_bytes()).sauce == document.sauce
+    mapped = open_native_mapped(str(file_path))
+    assert mapped.sauce == document.sauce
+    close_mapped(mapped)
+    assert AnsiArtDocument.from_native(AnsiArtDocument(4, 2).get_native()).sauce is None